@@ -1,6 +1,17 @@
+import logging
+
 from django.apps import AppConfig
 
+logger = logging.getLogger(__name__)
+
 
 class ChatConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'chat'
+
+    def ready(self):
+        # 稱號變動時通知聊天室連線 (chat/signals.py)
+        try:
+            import chat.signals
+        except Exception as e:
+            logger.error(f"Error connecting chat signals: {e}", exc_info=True)
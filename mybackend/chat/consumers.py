@@ -1,23 +1,29 @@
 # D:\bkgg\mybackend\chat\consumers.py (V_Final_Corrected - 使用 'message' 欄位)
 
+import asyncio
 import json
 import logging
+import uuid
 from datetime import timedelta
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 
 from channels.generic.websocket import AsyncWebsocketConsumer
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.db.models import Count, Q # 確保 Q 被導入
 
+from chat.events import broadcast_event, message_saved_event, quote_snippet
+
 # --- 模型和工具函數導入 (修改為你的實際路徑) ---
 try:
     # 假設模型和工具函數都在 'myapp' app 中
-    from myapp.models import Review, StoryReview, UserTitleRule
-    from myapp.utils import get_user_title_from_count
+    from myapp.models import Review, StoryReview, UserTitleRule, UserContributionStats
+    from myapp.utils import get_user_title_from_count, titles_for_counts
     # 導入 ChatMessage 模型
     from chat.models import ChatMessage # 使用你提供的正確路徑
+    from chat.persistence import writer as message_writer, PendingMessage, CHAT_WRITE_BEHIND
     MODELS_IMPORTED = True
     logger = logging.getLogger(__name__)
     logger.info("Successfully imported models and utils for chat consumer.")
@@ -26,11 +32,169 @@ except ImportError as e:
     logger.error(f"FATAL: Error importing models/utils in chat/consumers.py: {e}. Chat functionality might be limited.", exc_info=True)
     MODELS_IMPORTED = False
     def get_user_title_from_count(count): return None
+    def titles_for_counts(counts_by_key): return {key: None for key in counts_by_key}
     ChatMessage = None # Define as None if import fails
+    CHAT_WRITE_BEHIND = False
 # --- ------------------------------------ ---
 
 User = get_user_model()
 
+# --- 群組名稱 ---
+PUBLIC_GROUP_NAME = 'public_chat'
+PENDING_ID_PREFIX = 'pending_' # 尚未寫入資料庫的訊息先以暫時 ID 廣播，寫入後再以 message_saved 通知真正的 ID
+
+def user_group_name(user_id):
+    """每位使用者的連線群組 (稱號變動時通知該使用者的所有連線)。"""
+    return f'chat_user_{user_id}'
+
+# --- ---------- ---
+
+# --- 引用訊息 LRU (同一個 process 的所有連線共用) ---
+CHAT_QUOTE_CACHE_SIZE = getattr(settings, 'CHAT_QUOTE_CACHE_SIZE', 1000)
+
+class RecentMessageCache:
+    """
+    最近訊息的 {message_id: {'username', 'text'}} (text 為引用摘要)，以及暫時 ID -> 資料庫 ID 的對照。
+    只在 event loop 中存取 (不需要鎖)；容量滿時淘汰最久未使用的項目。
+    """
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._quotes = OrderedDict()
+        self._saved_ids = OrderedDict()
+
+    def put(self, message_id, username, text):
+        self.put_quote(message_id, {'username': username, 'text': quote_snippet(text)})
+
+    def put_quote(self, message_id, quote):
+        """quote 的 text 已經是引用摘要 (不再截斷一次)。"""
+        self._quotes[str(message_id)] = quote
+        self._quotes.move_to_end(str(message_id))
+        while len(self._quotes) > self.maxsize: self._quotes.popitem(last=False)
+
+    def get(self, message_id):
+        quote = self._quotes.get(str(message_id))
+        if quote is not None: self._quotes.move_to_end(str(message_id))
+        return quote
+
+    def mark_saved(self, pending_id, message_id):
+        self._saved_ids[pending_id] = message_id
+        while len(self._saved_ids) > self.maxsize: self._saved_ids.popitem(last=False)
+        quote = self._quotes.get(pending_id)
+        if quote is not None: self.put_quote(message_id, quote)
+
+    def resolve(self, message_id):
+        """回覆目標 -> 資料庫 ID (暫時 ID 尚未寫入時回傳 None)。"""
+        if message_id is None: return None
+        if isinstance(message_id, str) and message_id.startswith(PENDING_ID_PREFIX):
+            return self._saved_ids.get(message_id)
+        return message_id
+
+    def __contains__(self, message_id):
+        return str(message_id) in self._quotes
+
+
+recent_messages = RecentMessageCache(CHAT_QUOTE_CACHE_SIZE)
+# --- ------------------------------------ ---
+
+# --- 最近訊息的 ring buffer (連線時送出的 message_history，同一個 process 的所有連線共用) ---
+CHAT_HISTORY_SIZE = getattr(settings, 'CHAT_HISTORY_SIZE', 50)
+
+
+class MessageHistory:
+    """
+    最近 CHAT_HISTORY_SIZE 則格式化訊息 ({message_id: [reply_to_id, JSON text]}，舊到新；text 即廣播時的 text frame)。
+    - 第一次連線時由資料庫載入一次 (同時連線的其他人等待同一次載入)；之後由廣播 (append) 與寫入通知 (mark_saved) 更新。
+    - message_history 的整個 text frame 只在內容變動後重算一次，連線時直接送出。
+    - 尚未載入 (或載入中) 時收到的廣播先放在 _received，載入完成後接在資料庫的訊息之後。
+    - 這個 process 沒有任何連線時收不到廣播，內容視為過期並清空，下一次連線重新載入 (release)。
+    只在 event loop 中存取 (不需要鎖)。
+    """
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.loaded = False
+        self.connections = 0
+        self._entries = OrderedDict()
+        self._received = OrderedDict()
+        self._frame = None
+        self._loading = None
+
+    def append(self, message_id, reply_to_id, text):
+        """新的廣播 (同一則訊息會經過每個連線，只加入一次)；回傳是否為這個 process 第一次收到。"""
+        entries = self._entries if self.loaded else self._received
+        if message_id in entries: return False
+        entries[message_id] = [reply_to_id, text]
+        while len(entries) > self.maxsize: entries.popitem(last=False)
+        self._frame = None
+        return True
+
+    def mark_saved(self, pending_id, message_id):
+        """暫時 ID 換成資料庫 ID (訊息本身與回覆它的訊息；只重新序列化這幾則)。"""
+        if pending_id in self._entries:
+            self._entries = self._rekey(self._entries, pending_id, message_id)
+            self._frame = None
+        if pending_id in self._received:
+            self._received = self._rekey(self._received, pending_id, message_id)
+
+    @staticmethod
+    def _rekey(entries, pending_id, message_id):
+        rekeyed = OrderedDict()
+        for key, (reply_to_id, text) in entries.items():
+            if key == pending_id or reply_to_id == pending_id:
+                data = json.loads(text)
+                if key == pending_id: data['message_id'] = key = message_id
+                if reply_to_id == pending_id: data['reply_to_id'] = reply_to_id = message_id
+                text = json.dumps(data)
+            rekeyed[key] = [reply_to_id, text]
+        return rekeyed
+
+    def frame(self):
+        if self._frame is None:
+            self._frame = '{"type": "message_history", "messages": [' + ', '.join(text for _, text in self._entries.values()) + ']}'
+        return self._frame
+
+    async def ensure_loaded(self, loader):
+        """尚未載入時以 loader() (coroutine，回傳格式化訊息列表，舊到新) 由資料庫載入一次。"""
+        if self.loaded: return
+        loop = asyncio.get_running_loop()
+        if self._loading is None or self._loading.get_loop() is not loop:
+            self._loading = loop.create_task(self._load(loader))
+        await asyncio.shield(self._loading)
+
+    async def _load(self, loader):
+        try:
+            messages = await loader()
+            # 載入前/載入期間收到的廣播 (_received) 接在資料庫的訊息之後 (已寫入資料庫的不重複)
+            received, self._received = self._received, OrderedDict()
+            self._entries = OrderedDict()
+            self.loaded = True
+            for message_data in messages:
+                self.append(message_data['message_id'], message_data['reply_to_id'], json.dumps(message_data))
+                recent_messages.put(message_data['message_id'], message_data['username'], message_data['message'])
+            for key, (reply_to_id, text) in received.items(): self.append(key, reply_to_id, text)
+            # 載入期間所有連線都已離開：之後收不到廣播，不保留
+            if not self.connections: self.invalidate()
+            logger.info(f"Chat history loaded: {len(self._entries)} messages.")
+        finally:
+            self._loading = None
+
+    def invalidate(self):
+        """訊息被刪除等：清空，下一次連線重新載入。"""
+        self._entries = OrderedDict()
+        self._received = OrderedDict()
+        self._frame = None
+        self.loaded = False
+
+    def acquire(self):
+        self.connections += 1
+
+    def release(self):
+        self.connections = max(self.connections - 1, 0)
+        if not self.connections: self.invalidate()
+
+
+history = MessageHistory(CHAT_HISTORY_SIZE)
+# --- ------------------------------------ ---
+
 class ChatConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         self.user = self.scope.get('user')
@@ -39,43 +203,66 @@ class ChatConsumer(AsyncWebsocketConsumer):
             await self.close()
             return
 
-        self.room_group_name = 'public_chat' # Or your group logic
+        self.room_group_name = PUBLIC_GROUP_NAME # Or your group logic
+        self.user_group_name = user_group_name(self.user.id)
         logger.info(f"User {self.user.username} connecting to group '{self.room_group_name}'.")
 
         try:
             await self.channel_layer.group_add(self.room_group_name, self.channel_name)
+            await self.channel_layer.group_add(self.user_group_name, self.channel_name)
         except Exception as e:
              logger.error(f"Error adding user {self.user.username} to group '{self.room_group_name}': {e}", exc_info=True)
              await self.close()
              return
 
+        # 稱號在連線時計算一次，之後只在審核/稱號規則變動時 (refresh_user_title 事件) 重新計算
+        self.user_title = await self._get_user_title(self.user)
         await self.accept()
+        history.acquire(); self.history_acquired = True
         logger.info(f"User {self.user.username} connected successfully.")
         await self.send_recent_messages() # Send history upon connection
 
     async def disconnect(self, close_code):
         logger.info(f"User {self.user.username if hasattr(self, 'user') and self.user else 'Unknown'} disconnecting (Code: {close_code}).")
-        if hasattr(self, 'room_group_name') and self.room_group_name:
+        if getattr(self, 'history_acquired', False): history.release()
+        for group_name in (getattr(self, 'room_group_name', None), getattr(self, 'user_group_name', None)):
+            if not group_name: continue
             try:
-                await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
+                await self.channel_layer.group_discard(group_name, self.channel_name)
             except Exception as e:
-                logger.error(f"Error removing user from group '{self.room_group_name}': {e}", exc_info=True)
+                logger.error(f"Error removing user from group '{group_name}': {e}", exc_info=True)
+
+    async def reset_chat_history(self, event):
+        """訊息被刪除：丟棄 MessageHistory，下一次連線重新載入。"""
+        history.invalidate()
+
+    async def refresh_user_title(self, event):
+        """稱號可能改變 (心得/動態審核、稱號規則變動)：重新計算這個連線的稱號。"""
+        self.user_title = await self._get_user_title(self.user)
+        logger.debug(f"Refreshed chat title for {self.user.username}: {self.user_title}")
 
     # --- 異步獲取用戶稱號 ---
     @sync_to_async
     def _get_user_title(self, user):
         if not MODELS_IMPORTED or not user or not user.is_authenticated: return None
         try:
-            review_count = Review.objects.filter(user=user, approved=True).count()
-            story_review_count = StoryReview.objects.filter(user=user, approved=True).count()
-            total_count = review_count + story_review_count
-            return get_user_title_from_count(total_count)
+            return get_user_title_from_count(UserContributionStats.for_user(user.id).total_reviews)
         except Exception as e:
             logger.error(f"Error calculating title for user {user.username}: {e}", exc_info=True)
             return None
     # --- ------------------- ---
 
-    # --- 異步獲取引用信息 (使用 'message' 欄位) ---
+    # --- 獲取引用信息：先查最近訊息 LRU，沒有時才查資料庫 ---
+    async def _get_quote(self, message_id):
+        if message_id is None: return None
+        quote = recent_messages.get(message_id)
+        if quote is not None: return quote
+        db_id = recent_messages.resolve(message_id)
+        if db_id is None: return None
+        quote = await self._get_quoted_message_info(db_id)
+        if quote: recent_messages.put_quote(db_id, quote)
+        return quote
+
     @sync_to_async
     def _get_quoted_message_info(self, message_id):
         """獲取被引用訊息的用戶名和文本片段"""
@@ -84,10 +271,8 @@ class ChatConsumer(AsyncWebsocketConsumer):
             message = ChatMessage.objects.select_related('user').get(pk=message_id)
             username = message.user.first_name or message.user.username if message.user else '未知用戶'
             # *** 使用正確的 'message' 欄位 ***
-            raw_text = message.message or '' # <--- 使用 'message'
+            text_snippet = quote_snippet(message.message) # <--- 使用 'message'
             # *** ------------------------ ***
-            text_snippet = ' '.join(raw_text.splitlines())
-            text_snippet = (text_snippet[:30] + '...') if len(text_snippet) > 30 else text_snippet
             logger.debug(f"Quote info found: User='{username}', Snippet='{text_snippet}'")
             return {'username': username, 'text': text_snippet}
         except ChatMessage.DoesNotExist:
@@ -100,23 +285,20 @@ class ChatConsumer(AsyncWebsocketConsumer):
 
     # --- 異步保存訊息到數據庫 (使用 'message' 欄位) ---
     @sync_to_async
-    def _save_message_to_db(self, user, content, reply_to_id=None):
-        """保存聊天訊息到數據庫"""
+    def _save_message_to_db(self, user, content, reply_to_id=None, timestamp=None, reply_to_known=False):
+        """保存聊天訊息到數據庫 (reply_to_known: 回覆目標已確定存在，不必再查詢)"""
         if not ChatMessage: return None
         try:
-            reply_to_instance = None
-            if reply_to_id:
-                try:
-                    reply_to_instance = ChatMessage.objects.get(pk=reply_to_id)
-                except ChatMessage.DoesNotExist:
-                    logger.warning(f"Cannot save reply: Original message ID {reply_to_id} not found.")
-                    reply_to_id = None # Option: Save without reply link
+            if reply_to_id and not reply_to_known and not ChatMessage.objects.filter(pk=reply_to_id).exists():
+                logger.warning(f"Cannot save reply: Original message ID {reply_to_id} not found.")
+                reply_to_id = None # Option: Save without reply link
 
             # *** 使用正確的 'message' 欄位名 ***
             message = ChatMessage.objects.create(
                 user=user,
                 message=content, # <--- 使用 'message'
-                reply_to=reply_to_instance
+                reply_to_id=reply_to_id or None,
+                timestamp=timestamp or timezone.now(),
             )
             # *** ------------------------ ***
             logger.info(f"Saved message ID {message.id} for user {user.username}")
@@ -140,43 +322,55 @@ class ChatConsumer(AsyncWebsocketConsumer):
 
             # --- 處理普通聊天訊息 ---
             message_content = text_data_json.get('message', '').strip()
-            reply_to_id = text_data_json.get('reply_to_id')
+            reply_to_id = self._parse_reply_to_id(text_data_json.get('reply_to_id'))
 
             if message_content:
-                user_title = await self._get_user_title(self.user)
-
+                # 稱號已在連線時計算；引用資訊通常在最近訊息 LRU 中，不必查資料庫
                 quoted_username = None; quoted_message_text = None
-                if reply_to_id:
-                    quoted_info = await self._get_quoted_message_info(reply_to_id)
-                    if quoted_info:
-                        quoted_username = quoted_info.get('username')
-                        quoted_message_text = quoted_info.get('text')
-
-                # --- 保存新訊息到數據庫 ---
-                new_message_instance = await self._save_message_to_db(self.user, message_content, reply_to_id)
-                message_id_for_broadcast = new_message_instance.id if new_message_instance else f"live_{timezone.now().timestamp()}"
-                # --- -------------------- ---
-                timestamp_for_broadcast = timezone.now().isoformat()
+                quoted_info = await self._get_quote(reply_to_id)
+                if quoted_info:
+                    quoted_username = quoted_info.get('username')
+                    quoted_message_text = quoted_info.get('text')
 
+                now = timezone.now()
+                pending_id = f"{PENDING_ID_PREFIX}{uuid.uuid4().hex}"
+                username = self.user.first_name or self.user.username
                 message_data = {
                     'type': 'user',
-                    'message_id': message_id_for_broadcast,
+                    'message_id': pending_id,
                     'message': message_content,
-                    'username': self.user.first_name or self.user.username,
+                    'username': username,
                     'user_id': self.user.id,
-                    'timestamp': timestamp_for_broadcast,
-                    'user_title': user_title,
+                    'timestamp': now.isoformat(),
+                    'user_title': self.user_title,
                     'reply_to_id': reply_to_id,
                     'quoted_username': quoted_username,
                     'quoted_message_text': quoted_message_text,
                 }
+                recent_messages.put(pending_id, username, message_content)
 
-                # --- 廣播訊息 ---
+                # --- 先廣播 (一次 group_send)，再寫入資料庫 ---
+                # 在這裡序列化一次，各連線直接轉送 text frame (不再各自 json.dumps)
                 await self.channel_layer.group_send(
                     self.room_group_name,
-                    {'type': 'broadcast_message', 'message_data': message_data}
+                    broadcast_event(message_data)
                 )
                 logger.info(f"Message from {self.user.username} broadcasted.")
+
+                # --- 保存新訊息到數據庫，完成後通知各連線真正的訊息 ID (回覆連結用) ---
+                reply_to_db_id = recent_messages.resolve(reply_to_id)
+                if CHAT_WRITE_BEHIND:
+                    # 放進 write-behind 緩衝區 (chat/persistence.py)，批次寫入後由寫入 task 送出 message_saved
+                    message_writer.submit(PendingMessage(pending_id, self.user.id, message_content, now, reply_to_db_id or reply_to_id,
+                                                         self.room_group_name, self.channel_layer))
+                    return
+                new_message_instance = await self._save_message_to_db(self.user, message_content, reply_to_db_id, now, reply_to_known=reply_to_db_id in recent_messages)
+                if new_message_instance:
+                    recent_messages.mark_saved(pending_id, new_message_instance.id)
+                    await self.channel_layer.group_send(
+                        self.room_group_name,
+                        message_saved_event([{'pending_id': pending_id, 'message_id': new_message_instance.id}])
+                    )
             else:
                  logger.warning(f"Received empty message from {self.user.username}.")
 
@@ -184,18 +378,48 @@ class ChatConsumer(AsyncWebsocketConsumer):
         except KeyError as e: logger.error(f"Missing key in JSON: {e}. Data: {text_data}", exc_info=True)
         except Exception as e: logger.error(f"Error in receive: {e}. Data: {text_data}", exc_info=True)
 
+    @staticmethod
+    def _parse_reply_to_id(value):
+        """回覆目標：資料庫 ID (int) 或尚未寫入的暫時 ID；無效值視為 None。"""
+        if value in (None, ''): return None
+        if isinstance(value, str) and value.startswith(PENDING_ID_PREFIX): return value
+        try:
+            return int(value)
+        except (ValueError, TypeError):
+            logger.warning(f"Ignoring invalid reply_to_id: {value!r}")
+            return None
+
     async def broadcast_message(self, event):
-        message_data = event.get('message_data')
-        if message_data:
+        """
+        轉送發送端已序列化的 text frame (舊格式只有 message_data 時才在這裡序列化)。
+        每個 process 第一次收到時放進引用 LRU：其他 worker 發送的訊息被引用時不必查資料庫，
+        尚未寫入 (暫時 ID) 的訊息也引用得到。
+        """
+        text = event.get('text')
+        if text is None and event.get('message_data'): text = json.dumps(event['message_data'])
+        if text:
+            message_id = event.get('message_id') or event['message_data']['message_id']
+            if history.append(message_id, event.get('reply_to_id'), text) and event.get('username') is not None:
+                recent_messages.put_quote(message_id, {'username': event['username'], 'text': event['quote']})
             try:
-                await self.send(text_data=json.dumps(message_data))
+                await self.send(text_data=text)
             except Exception as e:
                  logger.error(f"Error sending message in broadcast_message: {e}", exc_info=True)
 
+    async def message_saved(self, event):
+        """訊息已寫入資料庫 (可能一次多則)：通知前端把暫時 ID 換成真正的 ID。"""
+        for saved in event['saved']:
+            recent_messages.mark_saved(saved['pending_id'], saved['message_id'])
+            history.mark_saved(saved['pending_id'], saved['message_id'])
+        try:
+            await self.send(text_data=event.get('text') or json.dumps({'type': 'message_saved', 'saved': event['saved']}))
+        except Exception as e:
+            logger.error(f"Error sending message_saved: {e}", exc_info=True)
+
     # --- 獲取歷史訊息 (使用 'message' 欄位) ---
     @sync_to_async
-    def _get_recent_messages_from_db_with_titles(self, limit=50):
-        """獲取最近的聊天記錄，並為每個發言者附加稱號。"""
+    def _get_recent_messages_from_db_with_titles(self, limit=CHAT_HISTORY_SIZE):
+        """獲取最近的聊天記錄，並為每個發言者附加稱號 (MessageHistory 載入時使用；錯誤時拋出，下一次連線重試)。"""
         if not MODELS_IMPORTED or not ChatMessage: return []
         logger.info(f"Fetching recent messages with titles (limit {limit})...")
         try:
@@ -213,14 +437,9 @@ class ChatConsumer(AsyncWebsocketConsumer):
             user_titles_map = {}
             if user_ids:
                 try:
-                    review_counts = Review.objects.filter(user_id__in=user_ids, approved=True).values('user_id').annotate(count=Count('id'))
-                    story_counts = StoryReview.objects.filter(user_id__in=user_ids, approved=True).values('user_id').annotate(count=Count('id'))
-                    user_total_counts = defaultdict(int)
-                    for item in review_counts: user_total_counts[item['user_id']] += item['count']
-                    for item in story_counts: user_total_counts[item['user_id']] += item['count']
-                    for user_id in user_ids:
-                        total_count = user_total_counts.get(user_id, 0)
-                        user_titles_map[user_id] = get_user_title_from_count(total_count)
+                    stats_rows = UserContributionStats.objects.filter(user_id__in=user_ids).values_list('user_id', 'approved_reviews', 'approved_stories')
+                    user_total_counts = {stats_user_id: reviews + stories for stats_user_id, reviews, stories in stats_rows}
+                    user_titles_map = titles_for_counts({user_id: user_total_counts.get(user_id, 0) for user_id in user_ids})
                     logger.debug(f"Bulk calculated titles for history: {user_titles_map}")
                 except Exception as e:
                     logger.error(f"Error calculating titles in bulk for history: {e}", exc_info=True)
@@ -238,10 +457,8 @@ class ChatConsumer(AsyncWebsocketConsumer):
                     reply_to_id = msg.reply_to.id
                     quoted_username = msg.reply_to.user.first_name or msg.reply_to.user.username if msg.reply_to.user else '未知用戶'
                     # *** 使用正確的 'message' 欄位 ***
-                    raw_quote_text = msg.reply_to.message or '' # <--- 使用 'message'
+                    quoted_message_text = quote_snippet(msg.reply_to.message) # <--- 使用 'message'
                     # *** ------------------------ ---
-                    temp_snippet = ' '.join(raw_quote_text.splitlines())
-                    quoted_message_text = (temp_snippet[:30] + '...') if len(temp_snippet) > 30 else temp_snippet
                 # --- --------------------------------- ---
 
                 formatted_messages.append({
@@ -262,19 +479,16 @@ class ChatConsumer(AsyncWebsocketConsumer):
             return formatted_messages
         except Exception as e:
              logger.error(f"Error in _get_recent_messages_from_db_with_titles: {e}", exc_info=True)
-             return []
+             raise
     # --- ---------------------------------------- ---
 
     async def send_recent_messages(self):
-        """異步調用獲取並發送歷史訊息的函數"""
+        """發送歷史訊息 (由 MessageHistory 提供，只有第一次連線時查詢資料庫)"""
         logger.info(f"Sending recent messages to {self.user.username}...")
         try:
-            formatted_messages = await self._get_recent_messages_from_db_with_titles()
-            await self.send(text_data=json.dumps({
-                'type': 'message_history',
-                'messages': formatted_messages
-            }))
-            logger.info(f"Sent message_history ({len(formatted_messages)} messages) to {self.user.username}")
+            await history.ensure_loaded(self._get_recent_messages_from_db_with_titles)
+            await self.send(text_data=history.frame())
+            logger.info(f"Sent message_history to {self.user.username}")
         except Exception as e:
             logger.error(f"Error in send_recent_messages for {self.user.username}: {e}", exc_info=True)
             try:
@@ -0,0 +1,27 @@
+# D:\bkgg\mybackend\chat\events.py
+"""
+聊天室的群組事件 (channel_layer.group_send)。
+text 為送給瀏覽器的 text frame，發送端序列化一次，ChatConsumer 收到後直接轉送 (不必每個連線各自 json.dumps)。
+"""
+import json
+
+
+def quote_snippet(text, limit=30):
+    """引用顯示用的單行摘要。"""
+    snippet = ' '.join((text or '').splitlines())
+    return (snippet[:limit] + '...') if len(snippet) > limit else snippet
+
+
+def broadcast_event(message_data):
+    """
+    broadcast_message 事件：message_id / reply_to_id 供 MessageHistory 使用；
+    username / quote (引用摘要) 讓每個 process 都能把訊息放進引用 LRU (不必 json.loads text)。
+    """
+    return {'type': 'broadcast_message', 'message_id': message_data['message_id'], 'reply_to_id': message_data.get('reply_to_id'),
+            'username': message_data['username'], 'quote': quote_snippet(message_data['message']),
+            'text': json.dumps(message_data)}
+
+
+def message_saved_event(saved):
+    """message_saved 事件 (saved：[{'pending_id', 'message_id'}, ...])。"""
+    return {'type': 'message_saved', 'saved': saved, 'text': json.dumps({'type': 'message_saved', 'saved': saved})}
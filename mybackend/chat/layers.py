@@ -0,0 +1,427 @@
+# D:\bkgg\mybackend\chat\layers.py
+"""
+單機多行程的 channel layer (不需要 Redis 等外部服務)：同一台主機上的多個 Daphne worker 共用一個 SQLite (WAL) 檔案。
+
+- 訊息存在 messages 資料表，target 是一般 channel 名稱，或某個行程 specific channel 的前綴 ("specific.<行程代號>!")。
+  群組訊息對每個行程只寫一列，channels 欄位列出該行程中的成員，由該行程自己展開給各連線。
+- 每個行程有一個接收 task，收到 Unix domain socket (datagram) 的通知後一次取走自己的訊息，分送到各 channel 的本機 queue。
+  沒有 AF_UNIX 的平台 (Windows) 改為每 poll_interval 秒輪詢；有通知時也每 heartbeat_interval 秒檢查一次，以防通知遺失。
+- capacity 限制每個 channel 尚未被 receive() 取走的訊息數：一般 channel 直接計算資料庫中的列數；
+  specific channel 的訊息會被接收 task 搬到本機 queue，改由 queued 資料表計數 (寫入時 +1，receive() 取走或過期後由接收 task 批次 -1)。
+  滿了時 send() 拋出 ChannelFull，group_send 則略過該 channel (記錄 warning)。
+- expiry：訊息超過 expiry 秒就丟棄，本機 queue 中有過期訊息的 channel 視為已離線並移出所有群組。
+  群組成員 group_expiry 秒後失效；行程超過 3 個 heartbeat_interval 沒有更新就視為已結束，清除它的群組成員與訊息。
+資料庫操作在每個 layer 專用的一個 thread 上執行，不會卡住 event loop。訊息以 msgpack 序列化，沒有安裝時改用 JSON。
+資料庫檔案建立時權限為 0600 (WAL / shm 檔案沿用相同權限)；通知 socket 的資料夾必須屬於目前使用者且其他人無法存取，否則改為輪詢。
+"""
+import asyncio
+import functools
+import hashlib
+import json
+import logging
+import os
+import random
+import socket
+import sqlite3
+import stat
+import string
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from channels.exceptions import ChannelFull
+from channels.layers import BaseChannelLayer
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS messages (id INTEGER PRIMARY KEY AUTOINCREMENT, target TEXT NOT NULL, channels TEXT, body BLOB NOT NULL, expires REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS messages_target ON messages (target, id)",
+    "CREATE TABLE IF NOT EXISTS groups (group_name TEXT NOT NULL, channel TEXT NOT NULL, joined REAL NOT NULL, PRIMARY KEY (group_name, channel))",
+    "CREATE TABLE IF NOT EXISTS processes (target TEXT PRIMARY KEY, pid INTEGER NOT NULL, seen REAL NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS queued (channel TEXT PRIMARY KEY, count INTEGER NOT NULL)",
+)
+CLAIM_BATCH = 500 # 接收 task 一次最多取走的訊息列數
+
+
+def serialize(message):
+    if msgpack is not None: return msgpack.packb(message, use_bin_type=True)
+    return json.dumps(message).encode()
+
+
+def deserialize(body):
+    if msgpack is not None: return msgpack.unpackb(body, raw=False)
+    return json.loads(body)
+
+
+def _uid():
+    return os.getuid() if hasattr(os, 'getuid') else 'user'
+
+
+def _private_dir(path):
+    """建立 (0700) 或檢查資料夾：必須是目前使用者擁有、其他人無法存取的真正資料夾 (不是 symlink)，否則拋出 PermissionError。"""
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    if not hasattr(os, 'getuid'): return path # Windows：沒有 uid / 權限位元可以檢查
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+        raise PermissionError(f"{path} must be a directory owned by uid {os.getuid()} with mode 0700")
+    return path
+
+
+class _Doorbell(asyncio.DatagramProtocol):
+    """有新訊息的通知 (內容不重要)：叫醒接收 task。"""
+    def __init__(self, wakeup):
+        self.wakeup = wakeup
+
+    def datagram_received(self, data, addr):
+        self.wakeup.set()
+
+
+class LocalChannelLayer(BaseChannelLayer):
+    extensions = ['groups', 'flush']
+
+    def __init__(self, path=None, expiry=60, group_expiry=86400, capacity=100, channel_capacity=None,
+                 socket_dir=None, poll_interval=0.05, heartbeat_interval=5, **kwargs):
+        super().__init__(expiry=expiry, capacity=capacity, channel_capacity=channel_capacity, **kwargs)
+        self.channel_capacity = self.compile_capacities(channel_capacity or {})
+        self.group_expiry = group_expiry
+        # 沒有指定 path 時放在暫存資料夾中本使用者專用的資料夾 (名稱可預測，所以一定檢查擁有者與權限)
+        self.path = os.path.abspath(str(path or os.path.join(tempfile.gettempdir(), f'channels-local-{_uid()}', 'layer.sqlite3')))
+        self._private_path = path is None
+        # socket 路徑長度有限 (約 100 字元)，預設放在暫存資料夾，以資料庫路徑區分不同專案
+        self.socket_dir = str(socket_dir or os.path.join(tempfile.gettempdir(), f"channels-local-{hashlib.sha1(self.path.encode()).hexdigest()[:12]}"))
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self._pid = None
+        self._check_pid()
+
+    # --- 行程狀態 (fork 之後重新建立) ---
+    def _check_pid(self):
+        if self._pid == os.getpid(): return
+        self._pid = os.getpid()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='channels-local')
+        self._db = None # 只在 executor thread 中使用
+        self._bell = None
+        self.client_prefix = uuid.uuid4().hex[:12] # 不用 random：fork 出來的行程 random 狀態相同
+        self._targets = set()
+        self._queues = {}
+        self._consumed = {} # channel -> 已取走 (或在本機過期) 但還沒從 queued 扣除的訊息數
+        self._receiver = None
+        self._wakeup = None
+        self._doorbell = None
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, functools.partial(func, *args))
+
+    # --- 資料庫 (executor thread) ---
+    def _connection(self):
+        if self._db is None:
+            directory = os.path.dirname(self.path)
+            if self._private_path or not os.path.isdir(directory): _private_dir(directory)
+            os.close(os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)) # 已存在時不改變權限
+            db = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            for statement in SCHEMA: db.execute(statement)
+            self._db = db
+        return self._db
+
+    def _write(self, operation):
+        db = self._connection()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            result = operation(db, time.time())
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+        return result
+
+    @staticmethod
+    def _pending(db, target, now):
+        return db.execute('SELECT COUNT(*) FROM messages WHERE target = ? AND expires > ?', (target, now)).fetchone()[0]
+
+    def _insert(self, db, now, target, channels, body, counts):
+        """寫入 target 的一列訊息，略過已滿的 channel (counts：specific channel 目前的 queued 數)；回傳實際收到的 channels。"""
+        if target.endswith('!'):
+            channels = [channel for channel in channels if counts.get(channel, 0) < self.get_capacity(channel)]
+            if not channels: return []
+            db.executemany('INSERT INTO queued (channel, count) VALUES (?, 1) ON CONFLICT (channel) DO UPDATE SET count = count + 1',
+                           [(channel,) for channel in channels])
+        elif self._pending(db, target, now) >= self.get_capacity(target): return []
+        db.execute('INSERT INTO messages (target, channels, body, expires) VALUES (?, ?, ?, ?)',
+                   (target, json.dumps(channels) if target.endswith('!') else None, body, now + self.expiry))
+        return channels
+
+    @staticmethod
+    def _release(db, counts):
+        """已取走或過期的 specific channel 訊息 {channel: 數量}：從 queued 扣除。"""
+        db.executemany('UPDATE queued SET count = count - ? WHERE channel = ?', [(n, channel) for channel, n in counts.items()])
+
+    def _db_send(self, channel, body):
+        target = self.non_local_name(channel)
+        def operation(db, now):
+            counts = dict(db.execute('SELECT channel, count FROM queued WHERE channel = ?', (channel,))) if target.endswith('!') else {}
+            return self._insert(db, now, target, [channel], body, counts)
+        sent = bool(self._write(operation))
+        if sent: self._ring(target)
+        return sent
+
+    def _db_group_send(self, group, body):
+        def operation(db, now):
+            by_target, counts = {}, {}
+            for channel, count in db.execute('SELECT g.channel, q.count FROM groups g LEFT JOIN queued q ON q.channel = g.channel '
+                                             'WHERE g.group_name = ? AND g.joined > ?', (group, now - self.group_expiry)):
+                by_target.setdefault(self.non_local_name(channel), []).append(channel)
+                if count: counts[channel] = count
+            sent, full = [], []
+            for target, channels in by_target.items():
+                # 一般 channel 的 target 就是 channel 本身 (一列一個)；specific channel 同一個行程合併成一列
+                received = self._insert(db, now, target, channels, body, counts)
+                if received: sent.append(target)
+                if len(received) < len(channels): full += sorted(set(channels) - set(received))
+            return sent, full
+        sent, full = self._write(operation)
+        for channel in full: logger.warning(f"Channel '{channel}' is full, dropping message for group '{group}'.")
+        for target in sent: self._ring(target)
+
+    def _db_claim(self, targets, limit=CLAIM_BATCH, consumed=None):
+        """取走 targets 的訊息 [(channels, body, expires)]，並從 queued 扣除 consumed；沒有要寫入的東西時不取得寫入鎖。"""
+        if not targets: return []
+        placeholders = ', '.join('?' * len(targets))
+        select = f'SELECT id, channels, body, expires FROM messages WHERE target IN ({placeholders}) ORDER BY id LIMIT ?'
+        if not consumed and not self._connection().execute(select, (*targets, limit)).fetchone(): return []
+
+        def operation(db, now):
+            released = dict(consumed or {})
+            rows = db.execute(select, (*targets, limit)).fetchall()
+            if rows: db.execute(f"DELETE FROM messages WHERE id IN ({', '.join(str(row[0]) for row in rows)})")
+            claimed = []
+            for _, channels, body, expires in rows:
+                if expires > now: claimed.append((channels, body, expires))
+                elif channels:
+                    for channel in json.loads(channels): released[channel] = released.get(channel, 0) + 1
+            self._release(db, released)
+            return claimed
+        return self._write(operation)
+
+    @staticmethod
+    def _remove_targets(db, targets):
+        for target in targets:
+            db.execute('DELETE FROM groups WHERE substr(channel, 1, length(?)) = ?', (target, target))
+            db.execute('DELETE FROM messages WHERE target = ?', (target,))
+            db.execute('DELETE FROM queued WHERE substr(channel, 1, length(?)) = ?', (target, target))
+            db.execute('DELETE FROM processes WHERE target = ?', (target,))
+
+    def _db_heartbeat(self, targets):
+        """更新本行程的 heartbeat，並清除過期訊息、群組成員與已結束行程的資料。"""
+        def operation(db, now):
+            db.executemany('INSERT OR REPLACE INTO processes (target, pid, seen) VALUES (?, ?, ?)', [(target, self._pid, now) for target in targets])
+            released = {}
+            for (channels,) in db.execute('SELECT channels FROM messages WHERE expires <= ? AND channels IS NOT NULL', (now,)):
+                for channel in json.loads(channels): released[channel] = released.get(channel, 0) + 1
+            self._release(db, released)
+            db.execute('DELETE FROM queued WHERE count <= 0')
+            db.execute('DELETE FROM messages WHERE expires <= ?', (now,))
+            db.execute('DELETE FROM groups WHERE joined <= ?', (now - self.group_expiry,))
+            dead = [target for (target,) in db.execute('SELECT target FROM processes WHERE seen <= ?', (now - 3 * self.heartbeat_interval,))]
+            self._remove_targets(db, dead)
+            return dead
+        for target in self._write(operation):
+            logger.info(f"Channel layer process '{target}' stopped sending heartbeats, removed its groups and messages.")
+            try:
+                os.unlink(self._socket_path(target))
+            except OSError:
+                pass
+
+    def _db_group_add(self, group, channel):
+        self._write(lambda db, now: db.execute('INSERT OR REPLACE INTO groups (group_name, channel, joined) VALUES (?, ?, ?)', (group, channel, now)))
+
+    def _db_group_discard(self, group, channel):
+        self._write(lambda db, now: db.execute('DELETE FROM groups WHERE group_name = ? AND channel = ?', (group, channel)))
+
+    def _db_discard_channels(self, channels):
+        def operation(db, now):
+            db.executemany('DELETE FROM groups WHERE channel = ?', [(channel,) for channel in channels])
+            db.executemany('DELETE FROM queued WHERE channel = ?', [(channel,) for channel in channels])
+        self._write(operation)
+
+    def _db_flush(self):
+        self._write(lambda db, now: (db.execute('DELETE FROM messages'), db.execute('DELETE FROM groups'), db.execute('DELETE FROM queued')))
+
+    def _db_unregister(self, targets):
+        self._write(lambda db, now: self._remove_targets(db, targets))
+
+    # --- 通知 (Unix domain socket) ---
+    def _socket_path(self, target):
+        return os.path.join(self.socket_dir, hashlib.sha1(target.encode()).hexdigest()[:16] + '.sock')
+
+    def _ring(self, target):
+        """通知 target 所屬的行程 (executor thread)。一般 channel 沒有通知，由接收端輪詢。"""
+        if not target.endswith('!') or not hasattr(socket, 'AF_UNIX'): return
+        try:
+            if self._bell is None:
+                self._bell = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+                self._bell.setblocking(False)
+            self._bell.sendto(b'\0', self._socket_path(target))
+        except OSError:
+            pass # 對方沒有通知 socket (輪詢中) 或已有未處理的通知
+
+    async def _open_doorbell(self, target):
+        if not hasattr(socket, 'AF_UNIX'): return None
+        path = self._socket_path(target)
+        try:
+            _private_dir(self.socket_dir)
+            if os.path.exists(path): os.unlink(path)
+            transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(lambda: _Doorbell(self._wakeup), local_addr=path, family=socket.AF_UNIX)
+            return transport
+        except (OSError, NotImplementedError, ValueError) as e: # Windows 的 event loop 不支援 AF_UNIX datagram
+            logger.warning(f"Channel layer could not open notification socket {path}, falling back to polling: {e}")
+            return None
+
+    # --- 接收 (每個行程 / event loop 一個 task) ---
+    def _ensure_receiver(self):
+        loop = asyncio.get_running_loop()
+        if self._receiver is not None and not self._receiver.done() and self._receiver.get_loop() is loop: return
+        self._queues = {}
+        self._wakeup = asyncio.Event()
+        self._receiver = loop.create_task(self._receive_loop())
+
+    async def _receive_loop(self):
+        targets = sorted(self._targets)
+        self._doorbell = [await self._open_doorbell(target) for target in targets]
+        timeout = self.heartbeat_interval if all(self._doorbell) else self.poll_interval
+        last_heartbeat = 0
+        try:
+            while True:
+                try:
+                    if set(targets) != self._targets: # new_channel 使用了新的前綴
+                        targets = sorted(self._targets)
+                        self._doorbell += [await self._open_doorbell(target) for target in targets[len(self._doorbell):]]
+                    now = time.time()
+                    if now - last_heartbeat >= self.heartbeat_interval:
+                        last_heartbeat = now
+                        await self._run(self._db_heartbeat, targets)
+                        await self._expire_local(now)
+                    self._wakeup.clear()
+                    consumed, self._consumed = self._consumed, {}
+                    try:
+                        rows = await self._run(self._db_claim, targets, CLAIM_BATCH, consumed)
+                    except BaseException:
+                        self._count_consumed(consumed) # 下一次再扣除
+                        raise
+                    for channels, body, expires in rows: self._deliver(json.loads(channels), body, expires)
+                    if len(rows) >= CLAIM_BATCH: continue
+                except Exception as e:
+                    logger.error(f"Error receiving from local channel layer: {e}", exc_info=True)
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            for transport in self._doorbell or []:
+                if transport is not None: transport.close()
+
+    def _deliver(self, channels, body, expires):
+        for channel in channels:
+            queue = self._queues.setdefault(channel, asyncio.Queue(maxsize=self.get_capacity(channel)))
+            try:
+                queue.put_nowait((expires, deserialize(body))) # 每個 channel 各自一份 (與 InMemoryChannelLayer 的 deepcopy 相同)
+            except asyncio.QueueFull: # queued 已限制數量，正常不會發生
+                logger.warning(f"Channel '{channel}' local queue is full, dropping message.")
+                self._count_consumed({channel: 1})
+
+    def _count_consumed(self, counts):
+        """specific channel 的訊息已取走或丟棄：叫醒接收 task，從 queued 扣除 (同時取走新訊息)。"""
+        for channel, n in counts.items(): self._consumed[channel] = self._consumed.get(channel, 0) + n
+        if self._wakeup is not None: self._wakeup.set()
+
+    async def _expire_local(self, now):
+        """本機 queue 中的過期訊息：丟棄，並把這些 channel (已沒有人接收) 移出所有群組。"""
+        expired = []
+        for channel, queue in list(self._queues.items()):
+            while not queue.empty() and queue._queue[0][0] < now:
+                queue.get_nowait()
+                self._count_consumed({channel: 1})
+                if channel not in expired: expired.append(channel)
+            # 空的 queue 可能有 receive() 正在等待，只移除剛清掉過期訊息的
+            if channel in expired and queue.empty(): self._queues.pop(channel, None)
+        if expired: await self._run(self._db_discard_channels, expired)
+
+    # --- Channel layer API ---
+    async def send(self, channel, message):
+        assert isinstance(message, dict), "message is not a dict"
+        self.require_valid_channel_name(channel)
+        assert '__asgi_channel__' not in message
+        self._check_pid()
+        if not await self._run(self._db_send, channel, serialize(message)):
+            raise ChannelFull(channel)
+
+    async def receive(self, channel):
+        self.require_valid_channel_name(channel)
+        self._check_pid()
+        if '!' not in channel:
+            # 一般 channel：多個行程都可能接收，輪詢資料庫
+            while True:
+                rows = await self._run(self._db_claim, [channel], 1)
+                if rows: return deserialize(rows[0][1])
+                await asyncio.sleep(self.poll_interval)
+        self._targets.add(self.non_local_name(channel))
+        self._ensure_receiver()
+        queue = self._queues.setdefault(channel, asyncio.Queue(maxsize=self.get_capacity(channel)))
+        try:
+            while True:
+                expires, message = await queue.get()
+                self._count_consumed({channel: 1})
+                if expires > time.time(): return message
+        finally:
+            if queue.empty() and self._queues.get(channel) is queue: self._queues.pop(channel, None)
+
+    async def new_channel(self, prefix='specific.'):
+        self._check_pid()
+        target = f'{prefix}{self.client_prefix}!'
+        self._targets.add(target)
+        self._ensure_receiver()
+        return target + ''.join(random.choices(string.ascii_letters, k=12))
+
+    async def flush(self):
+        self._check_pid()
+        await self._run(self._db_flush)
+        self._queues = {}
+        self._consumed = {}
+
+    async def close(self):
+        if self._receiver is not None:
+            self._receiver.cancel()
+            self._receiver = None
+        if self._targets: await self._run(self._db_unregister, sorted(self._targets))
+        for target in self._targets:
+            try:
+                os.unlink(self._socket_path(target))
+            except OSError:
+                pass
+
+    # --- Groups extension ---
+    async def group_add(self, group, channel):
+        self.require_valid_group_name(group)
+        self.require_valid_channel_name(channel)
+        self._check_pid()
+        await self._run(self._db_group_add, group, channel)
+
+    async def group_discard(self, group, channel):
+        self.require_valid_channel_name(channel)
+        self.require_valid_group_name(group)
+        self._check_pid()
+        await self._run(self._db_group_discard, group, channel)
+
+    async def group_send(self, group, message):
+        assert isinstance(message, dict), "Message is not a dict"
+        self.require_valid_group_name(group)
+        self._check_pid()
+        await self._run(self._db_group_send, group, serialize(message))
@@ -0,0 +1,63 @@
+# D:\bkgg\mybackend\chat\management\commands\bench_chat_fanout.py
+import asyncio
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from chat.consumers import ChatConsumer, history
+from chat.events import broadcast_event
+
+
+class Command(BaseCommand):
+    help = ("聊天室廣播扇出的 CPU 量測 (合成測試，不經過 channel layer 與網路)：--consumers 個 ChatConsumer 依序處理 --messages 則 broadcast_message 事件，"
+            "比較舊格式 (事件只帶 message_data，每個連線各自 json.dumps) 與預先序列化 (發送端 json.dumps 一次，連線直接轉送 text frame) 的 CPU 時間。")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--consumers', type=int, default=500, help="連線數 (預設 500)")
+        parser.add_argument('--messages', type=int, default=200, help="廣播訊息數 (預設 200)")
+        parser.add_argument('--repeat', type=int, default=3, help="重複次數，取最佳值 (預設 3)")
+
+    def handle(self, *args, **options):
+        consumer_count, message_count = max(1, options['consumers']), max(1, options['messages'])
+        repeat = max(1, options['repeat'])
+        self.stdout.write(f"consumers: {consumer_count}, messages: {message_count}, deliveries: {consumer_count * message_count}")
+        self.stdout.write(f"{'mode':<16} {'cpu (s)':>8} {'us/delivery':>12} {'frames':>8}")
+        results = {}
+        for mode in ('per-consumer', 'pre-serialized'):
+            best, frames = None, 0
+            for _ in range(repeat):
+                cpu, frames = asyncio.run(self._run(mode, consumer_count, message_count))
+                best = cpu if best is None else min(best, cpu)
+            results[mode] = best
+            self.stdout.write(f"{mode:<16} {best:>8.3f} {best / (consumer_count * message_count) * 1e6:>12.2f} {frames:>8}")
+        history.invalidate()
+        if results['pre-serialized']:
+            self.stdout.write(self.style.SUCCESS(f"speedup: {results['per-consumer'] / results['pre-serialized']:.2f}x"))
+
+    def _message(self, i):
+        return {
+            'type': 'user', 'message_id': f'pending_bench{i:08d}', 'message': f'扇出測試訊息 {i}：' + '今天晚上有人要一起去嗎？' * 4,
+            'username': f'bench_user_{i % 50}', 'user_id': i % 50, 'timestamp': timezone.now().isoformat(), 'user_title': '資深會員',
+            'reply_to_id': f'pending_bench{i - 1:08d}' if i else None, 'quoted_username': 'bench_user_0', 'quoted_message_text': '引用的訊息摘要...',
+        }
+
+    async def _run(self, mode, consumer_count, message_count):
+        """回傳 (CPU 秒數, 送出的 frame 數)；計時包含發送端建立事件 (預先序列化時的那一次 json.dumps)。"""
+        frames = [0]
+
+        async def base_send(message):
+            frames[0] += 1
+
+        consumers = []
+        for _ in range(consumer_count):
+            consumer = ChatConsumer()
+            consumer.base_send = base_send
+            consumers.append(consumer)
+        messages = [self._message(i) for i in range(message_count)]
+        history.invalidate()
+        start = time.process_time()
+        for message_data in messages:
+            event = broadcast_event(message_data) if mode == 'pre-serialized' else {'type': 'broadcast_message', 'message_data': message_data}
+            for consumer in consumers: await consumer.broadcast_message(event)
+        return time.process_time() - start, frames[0]
@@ -0,0 +1,117 @@
+# D:\bkgg\mybackend\chat\management\commands\bench_chat_persistence.py
+import asyncio
+import functools
+import time
+
+from asgiref.sync import sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F
+from django.test.utils import override_settings
+
+from chat import consumers
+from chat.models import ChatMessage
+from chat.persistence import writer
+
+BENCH_USER_PREFIX = 'chat_bench_'
+BENCH_MESSAGE_PREFIX = '[bench]'
+
+
+class Command(BaseCommand):
+    help = ("聊天訊息寫入的負載測試：以 --sockets 個模擬連線 (channels 的 WebsocketCommunicator，直接連到 ChatConsumer) 同時發言，"
+            "比較逐則寫入與 write-behind 批次寫入 (chat.persistence) 的吞吐量與寫入次數，並確認回覆連結正確。\n"
+            "db (s)：寫入在資料庫 thread 上花費的時間 (所有連線共用這個 thread，決定寫入吞吐量)；wall (s) 另包含廣播給所有連線的時間。測試用的使用者與訊息結束後刪除。")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sockets', type=int, default=200, help="模擬連線數 (預設 200)")
+        parser.add_argument('--messages', type=int, default=5, help="每個連線發言數；第二則起回覆自己的第一則 (預設 5)")
+        parser.add_argument('--mode', choices=['both', 'direct', 'write-behind'], default='both', help="測試的寫入方式 (預設 both)")
+        parser.add_argument('--capacity', type=int, default=100000, help="測試用 InMemoryChannelLayer 每個 channel 的容量 (預設 100000，避免廣播被丟棄)")
+        parser.add_argument('--timeout', type=float, default=120, help="等待全部寫入的秒數上限 (預設 120)")
+
+    def handle(self, *args, **options):
+        sockets, per_socket = max(1, options['sockets']), max(1, options['messages'])
+        modes = ['direct', 'write-behind'] if options['mode'] == 'both' else [options['mode']]
+        users = self._create_users(sockets)
+        original = consumers.CHAT_WRITE_BEHIND
+        original_save = consumers.ChatConsumer.__dict__['_save_message_to_db']
+        consumers.ChatConsumer._save_message_to_db = sync_to_async(self._timed(original_save.func))
+        # 預設容量 (100) 下同時發言的廣播會被丟棄；測試時改用容量夠大的 in-memory layer，兩種寫入方式的廣播量才相同
+        layers = override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer', 'CONFIG': {'capacity': options['capacity']}}})
+        layers.enable()
+        try:
+            self.stdout.write(f"sockets: {sockets}, messages per socket: {per_socket}")
+            self.stdout.write(f"{'mode':<14} {'messages':>9} {'writes':>7} {'db (s)':>7} {'db msg/s':>9} {'wall (s)':>9}  replies linked")
+            for mode in modes:
+                consumers.CHAT_WRITE_BEHIND = mode == 'write-behind'
+                saved, writes, db_seconds, elapsed, linked = asyncio.run(self._run(users, per_socket, options['timeout']))
+                self.stdout.write(f"{mode:<14} {saved:>9} {writes:>7} {db_seconds:>7.2f} {saved / db_seconds if db_seconds else 0:>9.0f} {elapsed:>9.2f}  {linked}/{sockets * (per_socket - 1)}")
+                ChatMessage.objects.filter(message__startswith=BENCH_MESSAGE_PREFIX).delete()
+                if saved < sockets * per_socket:
+                    raise CommandError(f"{mode}: only {saved}/{sockets * per_socket} messages were saved within {options['timeout']}s")
+        finally:
+            layers.disable()
+            consumers.ChatConsumer._save_message_to_db = original_save
+            consumers.CHAT_WRITE_BEHIND = original
+            ChatMessage.objects.filter(message__startswith=BENCH_MESSAGE_PREFIX).delete()
+            get_user_model().objects.filter(pk__in=[user.pk for user in users]).delete()
+
+    def _timed(self, func):
+        """逐則寫入 (ChatConsumer._save_message_to_db) 在資料庫 thread 上花費的時間累計到 self.direct_seconds。"""
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.direct_seconds += time.perf_counter() - start
+        return timed
+
+    def _create_users(self, count):
+        User = get_user_model()
+        if User.objects.filter(username__startswith=BENCH_USER_PREFIX).exists():
+            raise CommandError(f"已有 {BENCH_USER_PREFIX}* 使用者 (上一次測試未清除？)，請先刪除")
+        User.objects.bulk_create([User(username=f'{BENCH_USER_PREFIX}{i}') for i in range(count)])
+        return list(User.objects.filter(username__startswith=BENCH_USER_PREFIX).order_by('pk'))
+
+    async def _run(self, users, per_socket, timeout):
+        app = consumers.ChatConsumer.as_asgi()
+        communicators = []
+        for user in users:
+            communicator = WebsocketCommunicator(app, '/ws/chat/')
+            communicator.scope['user'] = user
+            connected, _ = await communicator.connect()
+            if not connected: raise CommandError(f"User {user.username} could not connect")
+            await communicator.receive_json_from() # message_history
+            communicators.append(communicator)
+
+        total = len(users) * per_socket
+        writes_before, seconds_before = writer.stats['batches'], writer.stats['seconds']
+        self.direct_seconds = 0.0
+        start = time.perf_counter()
+        await asyncio.gather(*(self._talk(c, user, per_socket) for c, user in zip(communicators, users)))
+        count = sync_to_async(ChatMessage.objects.filter(message__startswith=BENCH_MESSAGE_PREFIX).count)
+        saved = await count()
+        while saved < total and time.perf_counter() - start < timeout:
+            await asyncio.sleep(0.02)
+            saved = await count()
+        elapsed = time.perf_counter() - start
+        # 逐則寫入時每則一次 INSERT；write-behind 時為寫入批次數
+        if consumers.CHAT_WRITE_BEHIND:
+            writes, db_seconds = writer.stats['batches'] - writes_before, writer.stats['seconds'] - seconds_before
+        else:
+            writes, db_seconds = saved, self.direct_seconds
+        linked = await sync_to_async(ChatMessage.objects.filter(message__startswith=BENCH_MESSAGE_PREFIX, reply_to__user_id=F('user_id')).count)() # 回覆到自己的第一則
+        for communicator in communicators: await communicator.disconnect()
+        return saved, writes, db_seconds, elapsed, linked
+
+    async def _talk(self, communicator, user, per_socket):
+        """先發第一則並等到自己的廣播 (取得暫時 ID)，其餘訊息都回覆它。"""
+        first = f'{BENCH_MESSAGE_PREFIX} {user.username} 0'
+        await communicator.send_json_to({'message': first})
+        while True:
+            data = await communicator.receive_json_from(timeout=30)
+            if data.get('type') == 'user' and data.get('user_id') == user.pk and data.get('message') == first: break
+        for i in range(1, per_socket):
+            await communicator.send_json_to({'message': f'{BENCH_MESSAGE_PREFIX} {user.username} {i}', 'reply_to_id': data['message_id']})
@@ -0,0 +1,173 @@
+# D:\bkgg\mybackend\chat\persistence.py
+"""
+聊天訊息的 write-behind 寫入 (ChatConsumer 廣播之後呼叫 submit())。
+
+- 訊息先放進本行程的緩衝區，由 event loop 上的背景 task 每 CHAT_WRITE_BEHIND_INTERVAL_MS 毫秒
+  或累積 CHAT_WRITE_BEHIND_BATCH_SIZE 則時，以一次 bulk_create 寫入 (一次 thread hop)。
+- 寫入後回填資料庫 ID：同一批中回覆「尚未寫入的訊息」的 reply_to 以 bulk_update 補上，
+  並對每個群組送出一則 message_saved (暫時 ID -> 資料庫 ID)。
+- 關閉時 (atexit) 把緩衝區中剩下的訊息同步寫入；整批寫入失敗時改為逐筆寫入，只丟棄寫不進去的那幾筆。
+"""
+import asyncio
+import atexit
+import logging
+import threading
+import time
+from collections import OrderedDict, deque, namedtuple, defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection, transaction
+
+from .events import message_saved_event
+from .models import ChatMessage
+
+logger = logging.getLogger(__name__)
+
+CHAT_WRITE_BEHIND = getattr(settings, 'CHAT_WRITE_BEHIND', True)
+CHAT_WRITE_BEHIND_INTERVAL_MS = getattr(settings, 'CHAT_WRITE_BEHIND_INTERVAL_MS', 200)
+CHAT_WRITE_BEHIND_BATCH_SIZE = getattr(settings, 'CHAT_WRITE_BEHIND_BATCH_SIZE', 200)
+SAVED_ID_MEMORY = 5000 # 記住最近多少則暫時 ID -> 資料庫 ID (回覆跨批次的訊息時使用)
+
+# pending_id：廣播時使用的暫時 ID (字串)；reply_to_id：資料庫 ID (int)、暫時 ID 或 None
+# group_name / channel_layer：寫入後要通知的群組 (None 表示不通知)
+PendingMessage = namedtuple('PendingMessage', 'pending_id user_id content timestamp reply_to_id group_name channel_layer')
+
+
+def _is_pending_id(value):
+    return isinstance(value, str)
+
+
+def write_messages(items, saved_ids=None):
+    """
+    同步寫入一批訊息，回傳 {暫時 ID: 資料庫 ID}。
+    reply_to_id 可以是資料庫 ID、先前批次的暫時 ID (由 saved_ids 對照) 或同一批中的暫時 ID。
+    """
+    saved_ids = saved_ids if saved_ids is not None else {}
+    resolved = [saved_ids.get(item.reply_to_id) if _is_pending_id(item.reply_to_id) else item.reply_to_id for item in items]
+    db_reply_ids = {rid for rid in resolved if rid}
+    existing = set(ChatMessage.objects.filter(pk__in=db_reply_ids).values_list('pk', flat=True)) if db_reply_ids else set()
+    objs = [ChatMessage(user_id=item.user_id, message=item.content, timestamp=item.timestamp, reply_to_id=rid if rid in existing else None)
+            for item, rid in zip(items, resolved)]
+    with transaction.atomic():
+        if connection.features.can_return_rows_from_bulk_insert:
+            ChatMessage.objects.bulk_create(objs)
+        else:
+            for obj in objs: obj.save()
+        batch_ids = {item.pending_id: obj.pk for item, obj in zip(items, objs)}
+        # 回覆同一批中較早的訊息：寫入後才知道 ID，再補上 reply_to
+        backfill = []
+        for item, obj in zip(items, objs):
+            if _is_pending_id(item.reply_to_id) and obj.reply_to_id is None and item.reply_to_id in batch_ids:
+                obj.reply_to_id = batch_ids[item.reply_to_id]
+                backfill.append(obj)
+        if backfill: ChatMessage.objects.bulk_update(backfill, ['reply_to'])
+    return batch_ids
+
+
+class MessageWriter:
+    """單一行程的 write-behind 緩衝區與背景寫入 task。緩衝區用 deque，atexit 時不需要 event loop 也能取出。"""
+
+    def __init__(self, interval_ms=CHAT_WRITE_BEHIND_INTERVAL_MS, batch_size=CHAT_WRITE_BEHIND_BATCH_SIZE):
+        self.interval = interval_ms / 1000
+        self.batch_size = max(1, batch_size)
+        self._buffer = deque()
+        self._lock = threading.Lock() # 背景 task 與 atexit 的 flush 互斥
+        self._saved_ids = OrderedDict()
+        self._loop = None
+        self._task = None
+        self._wakeup = None
+        self.stats = {'messages': 0, 'batches': 0, 'seconds': 0.0} # seconds：寫入資料庫花費的時間
+
+    # --- event loop 端 ---
+    def submit(self, item):
+        """放入緩衝區 (不等待寫入)；必要時在目前的 event loop 上啟動背景 task。"""
+        self._buffer.append(item)
+        self._ensure_task()
+        self._wakeup.set() # 喚醒閒置的 task，或讓等待中的 task 檢查是否已滿一批
+
+    def _ensure_task(self):
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._loop is not loop:
+            self._loop = loop
+            self._wakeup = asyncio.Event()
+            self._task = loop.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            if not self._buffer:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            # 等到批次間隔結束或累積滿一批
+            try:
+                await asyncio.wait_for(self._wait_for_full_batch(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+
+    async def _wait_for_full_batch(self):
+        while len(self._buffer) < self.batch_size:
+            self._wakeup.clear()
+            await self._wakeup.wait()
+
+    async def flush(self):
+        """立即寫入緩衝區中的所有訊息，並通知各群組資料庫 ID。"""
+        while self._buffer:
+            items = self._take_batch()
+            saved = await sync_to_async(self._write, thread_sensitive=True)(items)
+            await self._notify(items, saved)
+
+    async def _notify(self, items, saved):
+        by_group = defaultdict(list)
+        for item in items:
+            if item.pending_id in saved and item.group_name and item.channel_layer is not None:
+                by_group[(item.group_name, id(item.channel_layer))].append(item)
+        for (group_name, _), group_items in by_group.items():
+            event = message_saved_event([{'pending_id': i.pending_id, 'message_id': saved[i.pending_id]} for i in group_items])
+            try:
+                await group_items[0].channel_layer.group_send(group_name, event)
+            except Exception as e:
+                logger.error(f"Error sending message_saved to group '{group_name}': {e}", exc_info=True)
+
+    # --- 寫入 (同步) ---
+    def _take_batch(self):
+        items = []
+        while self._buffer and len(items) < self.batch_size: items.append(self._buffer.popleft())
+        return items
+
+    def _write(self, items):
+        with self._lock:
+            start = time.perf_counter()
+            try:
+                saved = write_messages(items, self._saved_ids)
+            except Exception as e:
+                logger.error(f"Error writing chat batch of {len(items)} messages, retrying one by one: {e}", exc_info=True)
+                saved = {}
+                for item in items:
+                    try:
+                        saved.update(write_messages([item], {**self._saved_ids, **saved}))
+                    except Exception as item_err:
+                        logger.error(f"Dropping chat message {item.pending_id} from user {item.user_id}: {item_err}", exc_info=True)
+            for pending_id, message_id in saved.items(): self._saved_ids[pending_id] = message_id
+            while len(self._saved_ids) > SAVED_ID_MEMORY: self._saved_ids.popitem(last=False)
+            self.stats['messages'] += len(saved); self.stats['batches'] += 1; self.stats['seconds'] += time.perf_counter() - start
+            logger.debug(f"Chat write-behind flushed {len(saved)}/{len(items)} messages.")
+            return saved
+
+    def flush_sync(self):
+        """行程結束時同步寫入剩下的訊息 (不通知群組)。"""
+        while self._buffer:
+            items = self._take_batch()
+            self._write(items)
+            logger.info(f"Chat write-behind flushed {len(items)} messages at shutdown.")
+
+
+writer = MessageWriter()
+
+
+@atexit.register
+def _flush_on_exit():
+    try:
+        writer.flush_sync()
+    except Exception as e:
+        logger.error(f"Error flushing chat messages at shutdown: {e}", exc_info=True)
@@ -0,0 +1,52 @@
+# D:\bkgg\mybackend\chat\signals.py
+"""
+通知聊天室連線重新計算稱號 (ChatConsumer 在連線時計算一次稱號並保留在連線上)。
+
+- 心得 / 限時動態儲存或刪除 (審核狀態可能改變)：通知作者的連線群組 (commit 之後)。
+- 稱號規則變動：通知所有連線。
+聊天訊息被刪除時通知所有連線丟棄最近訊息的 ring buffer (MessageHistory)，下一次連線重新載入。
+"""
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from myapp.models import Review, StoryReview, UserTitleRule
+
+from .consumers import PUBLIC_GROUP_NAME, user_group_name
+from .models import ChatMessage
+
+logger = logging.getLogger(__name__)
+
+
+def _notify(group_name, event_type='refresh_user_title'):
+    channel_layer = get_channel_layer()
+    if channel_layer is None: return
+    try:
+        async_to_sync(channel_layer.group_send)(group_name, {'type': event_type})
+    except Exception as e:
+        logger.error(f"Error sending '{event_type}' to chat group '{group_name}': {e}", exc_info=True)
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_save, sender=StoryReview)
+@receiver(post_delete, sender=Review)
+@receiver(post_delete, sender=StoryReview)
+def refresh_author_chat_title(sender, instance, **kwargs):
+    # 審核狀態是否改變由 myapp 的 signals 處理後就清掉了，這裡一律通知 (沒有連線時 group_send 不做任何事)
+    group_name = user_group_name(instance.user_id)
+    transaction.on_commit(lambda: _notify(group_name))
+
+
+@receiver(post_save, sender=UserTitleRule)
+@receiver(post_delete, sender=UserTitleRule)
+def refresh_all_chat_titles(sender, instance, **kwargs):
+    transaction.on_commit(lambda: _notify(PUBLIC_GROUP_NAME))
+
+
+@receiver(post_delete, sender=ChatMessage)
+def reset_chat_history(sender, instance, **kwargs):
+    transaction.on_commit(lambda: _notify(PUBLIC_GROUP_NAME, 'reset_chat_history'))
@@ -124,6 +124,18 @@
                 console.log('[Chat] Reply state cleared.');
             }
 
+            /**
+             * Replaces a pending (not yet persisted) message ID with the database ID once the server confirms the save.
+             * Updates the message bubble, its reply button, quote previews pointing at it, and the current reply state.
+             */
+            function replaceMessageId(pendingId, messageId) {
+                if (!pendingId || messageId === undefined || messageId === null || !chatMessages) return;
+                const newId = String(messageId);
+                chatMessages.querySelectorAll(`[data-message-id="${pendingId}"]`).forEach(el => { el.dataset.messageId = newId; });
+                chatMessages.querySelectorAll(`[data-reply-to-id="${pendingId}"]`).forEach(el => { el.dataset.replyToId = newId; });
+                if (currentReplyTo && currentReplyTo.messageId === pendingId) currentReplyTo.messageId = newId;
+            }
+
             /**
              * Adds a chat message to the chat display area.
              * Handles different message types (system, user) and displays user titles.
@@ -206,8 +218,9 @@
                         // Add click listener to jump to the original message
                         quotePreview.addEventListener('click', (e) => {
                            e.stopPropagation(); // Prevent triggering actions on the parent message bubble
-                           console.log(`Clicked quote preview for message ID: ${data.reply_to_id}`);
-                           const originalMessageElement = chatMessages.querySelector(`.chat-message[data-message-id="${data.reply_to_id}"]`);
+                           const replyToId = quotePreview.dataset.replyToId; // 暫時 ID 寫入資料庫後會被換掉
+                           console.log(`Clicked quote preview for message ID: ${replyToId}`);
+                           const originalMessageElement = chatMessages.querySelector(`.chat-message[data-message-id="${replyToId}"]`);
                            if (originalMessageElement) {
                                // Scroll to the original message
                                originalMessageElement.scrollIntoView({ behavior: 'smooth', block: 'center' });
@@ -216,7 +229,7 @@
                                originalMessageElement.style.backgroundColor = 'rgba(255, 255, 0, 0.3)'; // Yellow highlight
                                setTimeout(() => { originalMessageElement.style.backgroundColor = ''; }, 1500); // Remove highlight after 1.5s
                            } else {
-                               console.warn(`Original message element with ID ${data.reply_to_id} not found in current view.`);
+                               console.warn(`Original message element with ID ${replyToId} not found in current view.`);
                                // Optionally: show a notification that the message is not loaded
                            }
                         });
@@ -494,6 +507,9 @@
                         } else if (data.type === 'user' || data.type === 'system') {
                             // Handle regular live messages
                             addChatMessage(data);
+                        } else if (data.type === 'message_saved') {
+                            // 訊息先以暫時 ID 廣播，寫入資料庫後 (可能整批一起) 把畫面上的暫時 ID 換成真正的 ID (回覆連結用)
+                            (data.saved || []).forEach(saved => replaceMessageId(saved.pending_id, saved.message_id));
                         } else if (data.type === 'error') { // Handle specific error messages from backend
                             console.error("[Chat] Received error message from server:", data.message);
                             addChatMessage({ type: 'system', message: `伺服器錯誤: ${data.message}`, timestamp: new Date().toISOString() });
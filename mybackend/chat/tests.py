@@ -1,3 +1,200 @@
-from django.test import TestCase
+import asyncio
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from channels.exceptions import ChannelFull
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from . import consumers, persistence
+from .events import broadcast_event
+from .layers import LocalChannelLayer
+from .models import ChatMessage
+from .persistence import MessageWriter, PendingMessage, write_messages
+
+
+# --- write-behind 寫入 (chat/persistence.py) ---
+class MessageWriterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create(username='writer-test')
+
+    def pending(self, pending_id, content, reply_to_id=None):
+        return PendingMessage(pending_id, self.user.id, content, timezone.now(), reply_to_id, None, None)
+
+    def test_reply_in_same_batch_is_back_filled(self):
+        saved = write_messages([self.pending('p-1', 'first'), self.pending('p-2', 'reply', reply_to_id='p-1')])
+        reply = ChatMessage.objects.get(pk=saved['p-2'])
+        self.assertEqual(reply.reply_to_id, saved['p-1'])
+
+    def test_reply_to_earlier_batch_uses_saved_ids(self):
+        writer = MessageWriter()
+        first = writer._write([self.pending('p-1', 'first')])
+        second = writer._write([self.pending('p-2', 'reply', reply_to_id='p-1')])
+        self.assertEqual(ChatMessage.objects.get(pk=second['p-2']).reply_to_id, first['p-1'])
+
+    def test_failed_batch_is_retried_one_by_one(self):
+        writer = MessageWriter()
+        items = [self.pending('p-1', 'ok'), self.pending('p-2', None), self.pending('p-3', 'reply', reply_to_id='p-1')]
+        with self.assertLogs('chat.persistence', 'ERROR'):
+            saved = writer._write(items)
+        self.assertEqual(set(saved), {'p-1', 'p-3'})
+        self.assertEqual(ChatMessage.objects.get(pk=saved['p-3']).reply_to_id, saved['p-1'])
+        self.assertEqual(writer.stats['messages'], 2)
+
+    def test_exit_flushes_buffer(self):
+        writer = MessageWriter(batch_size=2)
+        writer._buffer.extend(self.pending(f'p-{i}', f'message {i}') for i in range(5))
+        with mock.patch.object(persistence, 'writer', writer):
+            persistence._flush_on_exit()
+        self.assertFalse(writer._buffer)
+        self.assertEqual(writer.stats['batches'], 3)
+        self.assertEqual(ChatMessage.objects.filter(user=self.user).count(), 5)
+
+
+# --- 廣播與引用 LRU (chat/consumers.py) ---
+class BroadcastQuoteTests(SimpleTestCase):
+    def setUp(self):
+        for name, value in (('recent_messages', consumers.RecentMessageCache(10)), ('history', consumers.MessageHistory(10))):
+            patcher = mock.patch.object(consumers, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        consumers.history.loaded = True
+
+    def deliver(self, event, connections=2):
+        for _ in range(connections):
+            consumer = consumers.ChatConsumer()
+            consumer.send = mock.AsyncMock()
+            asyncio.run(consumer.broadcast_message(event))
+
+    def test_message_from_other_process_can_be_quoted(self):
+        event = broadcast_event({'message_id': 'pending_abc', 'reply_to_id': None, 'username': 'other', 'message': 'x' * 40})
+        with mock.patch.object(consumers.RecentMessageCache, 'put_quote', autospec=True, side_effect=consumers.RecentMessageCache.put_quote) as put_quote:
+            self.deliver(event)
+        self.assertEqual(put_quote.call_count, 1)
+        self.assertEqual(consumers.recent_messages.get('pending_abc'), {'username': 'other', 'text': 'x' * 30 + '...'})
+        consumers.recent_messages.mark_saved('pending_abc', 7)
+        self.assertEqual(consumers.recent_messages.get(7)['text'], 'x' * 30 + '...')
+
+
+# --- 單機多行程 channel layer (chat/layers.py) ---
+def _group_member(path, socket_dir, ready, received):
+    """fork 出來的行程：加入群組後回報 channel，收到第一則訊息後回報內容。"""
+    async def main():
+        layer = LocalChannelLayer(path=path, socket_dir=socket_dir)
+        channel = await layer.new_channel()
+        await layer.group_add('room', channel)
+        ready.put(channel)
+        message = await asyncio.wait_for(layer.receive(channel), timeout=10)
+        received.put((channel, message))
+        await layer.close()
+    asyncio.run(main())
+
+
+class LocalChannelLayerTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'layer.sqlite3')
+        self.socket_dir = os.path.join(self.tmp, 'sockets')
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+
+    def layer(self, **kwargs):
+        return LocalChannelLayer(path=self.path, socket_dir=self.socket_dir, **kwargs)
+
+    def run_async(self, coroutine):
+        return asyncio.run(asyncio.wait_for(coroutine, timeout=20))
+
+    def test_send_to_full_channel_raises(self):
+        async def main():
+            layer = self.layer(capacity=5)
+            channel = await layer.new_channel()
+            full = 0
+            for i in range(8):
+                try:
+                    await layer.send(channel, {'type': 'test', 'n': i})
+                except ChannelFull:
+                    full += 1
+            await asyncio.sleep(0.1) # 接收 task 把訊息搬到本機 queue 之後仍然是滿的
+            with self.assertRaises(ChannelFull):
+                await layer.send(channel, {'type': 'test', 'n': 8})
+            await layer.close()
+            return full
+        self.assertEqual(self.run_async(main()), 3)
+
+    def test_receiving_frees_capacity(self):
+        async def main():
+            layer = self.layer(capacity=2)
+            channel = await layer.new_channel()
+            for i in range(2): await layer.send(channel, {'type': 'test', 'n': i})
+            self.assertEqual((await layer.receive(channel))['n'], 0)
+            await asyncio.sleep(0.1)
+            await layer.send(channel, {'type': 'test', 'n': 2})
+            self.assertEqual((await layer.receive(channel))['n'], 1)
+            self.assertEqual((await layer.receive(channel))['n'], 2)
+            await layer.close()
+        self.run_async(main())
+
+    def test_group_send_skips_full_channel_with_warning(self):
+        async def main():
+            layer = self.layer(capacity=1)
+            full, free = await layer.new_channel(), await layer.new_channel()
+            for channel in (full, free): await layer.group_add('room', channel)
+            await layer.send(full, {'type': 'test', 'n': 0})
+            with self.assertLogs('chat.layers', 'WARNING') as logs:
+                await layer.group_send('room', {'type': 'test', 'n': 1})
+            self.assertIn(full, logs.output[0])
+            self.assertEqual((await layer.receive(free))['n'], 1)
+            self.assertEqual((await layer.receive(full))['n'], 0)
+            await layer.close()
+        self.run_async(main())
+
+    def test_expired_messages_are_dropped(self):
+        async def main():
+            layer = self.layer(expiry=0.3)
+            channel = await layer.new_channel()
+            await layer.send(channel, {'type': 'test'})
+            await layer.send('worker.queue', {'type': 'test'})
+            await asyncio.sleep(0.5)
+            for name in (channel, 'worker.queue'):
+                with self.assertRaises(asyncio.TimeoutError):
+                    await asyncio.wait_for(layer.receive(name), timeout=0.3)
+            await layer.close()
+        self.run_async(main())
+
+    def test_dead_process_is_cleaned_up(self):
+        async def main():
+            layer = self.layer(heartbeat_interval=0.2)
+            await layer.new_channel() # 啟動接收 task (heartbeat)
+            await asyncio.sleep(0.1)
+            with sqlite3.connect(self.path) as db:
+                db.execute("INSERT INTO processes (target, pid, seen) VALUES ('specific.dead!', 1, 0)")
+                db.execute("INSERT INTO groups (group_name, channel, joined) VALUES ('room', 'specific.dead!abc', ?)", (time.time(),))
+                db.execute("INSERT INTO messages (target, channels, body, expires) VALUES ('specific.dead!', '[]', x'00', ?)", (time.time() + 60,))
+            await asyncio.sleep(0.5)
+            await layer.close()
+        self.run_async(main())
+        with sqlite3.connect(self.path) as db:
+            for table in ('processes', 'groups', 'messages'):
+                self.assertEqual(db.execute(f"SELECT COUNT(*) FROM {table} WHERE {'channel' if table == 'groups' else 'target'} LIKE 'specific.dead!%'").fetchone()[0], 0, table)
+
+    @skipUnless('fork' in multiprocessing.get_all_start_methods(), "需要 fork")
+    def test_group_send_reaches_other_processes(self):
+        context = multiprocessing.get_context('fork')
+        ready, received = context.Queue(), context.Queue()
+        processes = [context.Process(target=_group_member, args=(self.path, self.socket_dir, ready, received)) for _ in range(2)]
+        for process in processes: process.start()
+        try:
+            channels = {ready.get(timeout=10) for _ in processes}
+            self.run_async(self.layer().group_send('room', {'type': 'chat.message', 'text': 'hello'}))
+            results = dict(received.get(timeout=10) for _ in processes)
+        finally:
+            for process in processes: process.join(timeout=10)
+        self.assertEqual(set(results), channels)
+        self.assertEqual({message['text'] for message in results.values()}, {'hello'})
+        self.assertEqual(len({channel.split('!')[0] for channel in channels}), 2) # 兩個行程各自的前綴
@@ -0,0 +1,160 @@
+# D:\bkgg\mybackend\myapp\active_stories.py
+"""
+有效限時動態的工作集 (ajax_get_active_stories 使用)。
+
+- 工作集：目前有效動態的顯示資料 (美容師、館別、作者名稱、到期時間...)，依 approved_at 新到舊排列。
+  版本號是 data_version 的世代號 (資料庫，一次主鍵查詢，所有 worker 一致)；工作集以版本號為 key 存在 cache，
+  每個 worker 另保留一份本機副本，版本號相同時直接使用。cache 中沒有這個版本 (例如 LocMemCache 的其他 worker) 時由資料庫重建一次。
+- 動態審核/修改/刪除，或美容師、館別、作者的顯示資料變動時，由 signals 呼叫 refresh_on_commit() (同一個交易只排一次)：
+  commit 之後遞增版本號並重新計算整個工作集 (一次查詢，大小與有效動態數量成正比)；其他 worker 在下一次讀取時看到新版本號。
+- 到期：讀取時最早的到期時間已過就把過期項目移出本機副本 (不查資料庫、不改版本號)，不需要另外的清除排程。
+"""
+import logging
+import threading
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+
+from . import data_version
+from .models import StoryReview
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STORIES_CACHE_ALIAS = getattr(settings, 'ACTIVE_STORIES_CACHE_ALIAS', 'default')
+ACTIVE_STORIES_CACHE_TIMEOUT = getattr(settings, 'ACTIVE_STORIES_CACHE_TIMEOUT', 60 * 60)
+
+ENTRIES_KEY = 'active_stories:{version}'
+
+_local_lock = threading.Lock()
+_local = {'version': None, 'entries': None, 'next_expiry': None}
+
+
+def get_cache():
+    return caches[ACTIVE_STORIES_CACHE_ALIAS]
+
+
+def _active_qs(now):
+    return StoryReview.objects.filter(animal__is_active=True, animal__hall__is_active=True, approved=True, expires_at__gt=now)
+
+
+def _build_entries(now):
+    """由資料庫計算工作集 (一次查詢)。expires_at 以 timestamp 存放，方便在記憶體中比較。"""
+    entries = []
+    for s in _active_qs(now).select_related('animal', 'animal__hall', 'user').order_by('-approved_at'):
+        try:
+            entries.append({
+                'id': s.id, 'animal_id': s.animal_id, 'user_id': s.user_id,
+                'animal_name': s.animal.name if s.animal else '未知美容師',
+                'animal_photo_url': s.animal.photo.url if s.animal and s.animal.photo else None,
+                'hall_id': s.animal.hall_id if s.animal else None,
+                'hall_name': s.animal.hall.name if s.animal and s.animal.hall else '未知館別',
+                'user_name': s.user.first_name or s.user.username if s.user else '匿名',
+                'expires_at': s.expires_at.timestamp(),
+            })
+        except Exception as e:
+            logger.error(f"Error building active story entry for story {s.id}: {e}", exc_info=True)
+    return entries
+
+
+def _next_expiry(entries):
+    return min((entry['expires_at'] for entry in entries), default=None)
+
+
+def _keep(version, entries):
+    with _local_lock:
+        _local['version'], _local['entries'], _local['next_expiry'] = version, entries, _next_expiry(entries)
+
+
+def _store(version, entries):
+    try:
+        get_cache().set(ENTRIES_KEY.format(version=version), entries, ACTIVE_STORIES_CACHE_TIMEOUT)
+    except Exception as e:
+        logger.error(f"Error storing active stories working set: {e}", exc_info=True)
+    _keep(version, entries)
+
+
+def refresh():
+    """遞增版本號並重新計算整個工作集 (審核狀態、到期時間或顯示資料變動時)。先遞增再計算，較晚的 refresh 一定寫入較新的資料。"""
+    try:
+        data_version.bump(data_version.TOPIC_STORIES)
+        version, = data_version.generations(data_version.TOPIC_STORIES)
+        entries = _build_entries(timezone.now())
+        _store(version, entries)
+        logger.debug(f"Active stories working set rebuilt: {len(entries)} stories (version {version}).")
+    except Exception as e:
+        logger.error(f"Error rebuilding active stories working set: {e}", exc_info=True)
+        invalidate()
+
+
+def refresh_on_commit():
+    """commit 之後 refresh() 一次：同一個交易中多次呼叫 (例如逐一儲存多位美容師) 只排一次；不在交易中時立即執行。"""
+    connection = transaction.get_connection()
+    if connection.in_atomic_block and any(func is refresh for _, func, _ in connection.run_on_commit): return
+    transaction.on_commit(refresh)
+
+
+def invalidate():
+    """丟棄工作集 (所有 worker)，下一次讀取時重建。"""
+    data_version.bump(data_version.TOPIC_STORIES)
+    with _local_lock:
+        _local['version'], _local['entries'], _local['next_expiry'] = None, None, None
+
+
+def _cached(version):
+    """版本號相同的本機副本或 cache 中的工作集；都沒有時回傳 None。"""
+    with _local_lock:
+        if _local['version'] == version and _local['entries'] is not None:
+            return _local['entries']
+    try:
+        entries = get_cache().get(ENTRIES_KEY.format(version=version))
+    except Exception as e:
+        logger.error(f"Error loading active stories working set: {e}", exc_info=True)
+        return None
+    if entries is not None: _keep(version, entries)
+    return entries
+
+
+def _load(now):
+    """(版本號, 工作集)：本機副本/cache 沒有目前的版本時由資料庫重建。最早的到期時間已過時先移除本機副本中的過期項目。"""
+    version, = data_version.generations(data_version.TOPIC_STORIES)
+    entries = _cached(version)
+    if entries is None:
+        logger.info(f"Active stories working set version {version} not cached, rebuilding.")
+        entries = _build_entries(now)
+        _store(version, entries)
+        return version, entries
+    now_ts = now.timestamp()
+    with _local_lock:
+        if _local['version'] == version and _local['next_expiry'] is not None and _local['next_expiry'] <= now_ts:
+            _local['entries'] = [entry for entry in _local['entries'] if entry['expires_at'] > now_ts]
+            _local['next_expiry'] = _next_expiry(_local['entries'])
+            entries = _local['entries']
+    return version, entries
+
+
+def get_active(now=None):
+    """(版本號, 目前有效的項目列表)。"""
+    now = now or timezone.now()
+    version, entries = _load(now)
+    now_ts = now.timestamp()
+    return version, [entry for entry in entries if entry['expires_at'] > now_ts]
+
+
+def remaining_time(entry, now=None):
+    expires_at = datetime.fromtimestamp(entry['expires_at'], tz=dt_timezone.utc)
+    return StoryReview.remaining_time_text(expires_at, now)
+
+
+def references(story_id=None, animal_id=None, hall_id=None, user_id=None):
+    """目前的工作集是否包含指定動態/美容師/館別/作者 (用於判斷資料變動時是否需要重算)。"""
+    try:
+        entries = _cached(data_version.generations(data_version.TOPIC_STORIES)[0])
+    except Exception:
+        return True
+    if entries is None: return True # 這個 worker 沒有目前版本的副本：無法判斷，視為有關 (不在 signal 中重建工作集)
+    return any((story_id is not None and e['id'] == story_id) or (animal_id is not None and e['animal_id'] == animal_id)
+               or (hall_id is not None and e['hall_id'] == hall_id) or (user_id is not None and e['user_id'] == user_id) for e in entries)
+
@@ -0,0 +1,50 @@
+# D:\bkgg\mybackend\myapp\data_version.py
+"""
+公開 AJAX 端點的資料版本戳記，在執行視圖之前判斷內容是否改變 (見 http_cache.version_etag_condition)。
+
+兩種來源組合成 ETag：
+- 資料表戳記：相關資料的 Max(updated_at) + Count 等，一次小型聚合查詢，跨 worker 都正確。
+- 世代號：沒有 updated_at 的資料 (館別、稱號規則、限時動態工作集) 由 signals 遞增 DataGeneration 資料表中的世代號，
+  讀取時一次主鍵查詢。存在資料庫而不是 cache：LocMemCache 每個 worker 各自一份，遞增只有本機看得到。
+"""
+import hashlib
+import logging
+
+from django.db import transaction
+from django.db.models import F
+
+from .models import DataGeneration
+
+logger = logging.getLogger(__name__)
+
+TOPIC_HALLS = 'halls'    # 館別名稱 / 啟用狀態
+TOPIC_TITLES = 'titles'  # 稱號規則 (名人堂)
+TOPIC_STORIES = 'stories' # 有效限時動態工作集 (myapp.active_stories)
+TOPIC_PROFILE_STATS = 'profile_stats' # 所有使用者的個人檔案統計 (myapp.profile_stats；個別使用者為 'profile_stats:<user_id>')
+
+
+def generations(*topics):
+    """回傳各 topic 的世代號 (tuple，順序同參數)，缺少者視為 1。一次主鍵查詢。"""
+    try:
+        found = dict(DataGeneration.objects.filter(topic__in=topics).values_list('topic', 'generation'))
+    except Exception as e:
+        logger.error(f"Error loading data versions {topics}: {e}", exc_info=True)
+        found = {}
+    return tuple(found.get(topic, 1) for topic in topics)
+
+
+def bump(*topics):
+    """遞增指定 topic 的世代號，使相關端點的 ETag 與各 worker 的本機副本失效。"""
+    try:
+        # 尚未有資料列 (預設 1) 時先建立，再一起遞增；在 signals 的交易中呼叫時失敗不影響外層交易
+        with transaction.atomic():
+            DataGeneration.objects.bulk_create([DataGeneration(topic=topic) for topic in topics], ignore_conflicts=True)
+            DataGeneration.objects.filter(topic__in=topics).update(generation=F('generation') + 1)
+    except Exception as e:
+        logger.error(f"Error bumping data versions {topics}: {e}", exc_info=True)
+
+
+def make_etag(*parts):
+    """把戳記組成 ETag 值 (不含引號)；parts 中的 datetime / None 等皆以 str 表示。"""
+    raw = "\x1f".join("" if p is None else str(p) for p in parts)
+    return hashlib.md5(raw.encode('utf-8')).hexdigest()
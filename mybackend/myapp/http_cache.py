@@ -0,0 +1,76 @@
+# D:\bkgg\mybackend\myapp\http_cache.py
+"""
+AJAX JSON 回應的 HTTP 條件式快取 (ETag / Last-Modified / 304)。
+
+ETag 取回應內容的雜湊 (弱 ETag)，內容不變就不變；Last-Modified 由呼叫端提供 (資料的最後更新時間)。
+shared=True 代表內容與使用者無關，可由瀏覽器與中間的快取 (CDN / 反向代理) 共用；否則為 private。
+version_etag_condition 則在執行視圖之前以資料版本戳記 (myapp.data_version) 判斷，未變動時直接回 304。
+"""
+import hashlib
+import logging
+from functools import wraps
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+
+logger = logging.getLogger(__name__)
+
+# 共用回應可被快取的秒數 (之後仍以 ETag 重新驗證)
+AJAX_SHARED_MAX_AGE = getattr(settings, 'AJAX_SHARED_MAX_AGE', 30)
+
+
+def content_etag(content):
+    return 'W/' + quote_etag(hashlib.md5(content).hexdigest())
+
+
+def conditional_json_response(request, payload, last_modified=None, shared=False, max_age=None, status=200):
+    """
+    建立 JsonResponse 並加上 ETag / Last-Modified / Cache-Control；
+    請求的 If-None-Match / If-Modified-Since 相符時改回 304 (只處理 GET / HEAD 的 200 回應)。
+    """
+    response = JsonResponse(payload, status=status)
+    if status != 200 or request.method not in ('GET', 'HEAD'):
+        return response
+    etag = content_etag(response.content)
+    last_modified_ts = int(last_modified.timestamp()) if last_modified else None
+    response['ETag'] = etag
+    if last_modified_ts is not None: response['Last-Modified'] = http_date(last_modified_ts)
+    if shared:
+        patch_cache_control(response, public=True, max_age=AJAX_SHARED_MAX_AGE if max_age is None else max_age)
+    else:
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ('Cookie',))
+    return get_conditional_response(request, etag=etag, last_modified=last_modified_ts, response=response)
+
+
+def version_etag_condition(etag_func):
+    """
+    類似 django.views.decorators.http.condition(etag_func=...)：etag_func(request, *args, **kwargs) 回傳版本戳記，
+    請求的 If-None-Match 相符時不執行視圖直接回 304。不同的是版本 ETag 會覆蓋視圖自己設定的 ETag
+    (例如 conditional_json_response 的內容雜湊)，下一次請求才能在執行視圖前比對。
+    etag_func 回傳 None 或發生錯誤時照常執行視圖。
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def inner(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view_func(request, *args, **kwargs)
+            try:
+                version = etag_func(request, *args, **kwargs)
+            except Exception as e:
+                logger.error(f"Error computing version ETag for {view_func.__name__}: {e}", exc_info=True)
+                version = None
+            if version is None:
+                return view_func(request, *args, **kwargs)
+            etag = 'W/' + quote_etag(version)
+            not_modified = get_conditional_response(request, etag=etag)
+            if not_modified is not None:
+                return not_modified
+            response = view_func(request, *args, **kwargs)
+            if response.status_code == 200:
+                response['ETag'] = etag
+            return response
+        return inner
+    return decorator
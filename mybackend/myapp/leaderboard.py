@@ -0,0 +1,115 @@
+# D:\bkgg\mybackend\myapp\leaderboard.py
+"""
+名人堂排行榜快照 (LeaderboardSnapshot)，每個類別一列，存前 N 名。
+
+- read_rankings()：名人堂端點使用，一次查詢讀出所有類別 (稱號由快取的稱號對照表計算)，成本與心得/回饋數量無關。
+- refresh_for_user()：某位使用者的貢獻計數變動後 (signals，commit 之後) 呼叫。只有該使用者原本就在榜上、
+  或新的計數足以進榜時才重算該類別 (一次有索引的 top-N 查詢)，其他情況讀一次快照就結束。
+- rebuild()：完整重算 (rebuild_leaderboard 指令，建議定期執行以校正)。
+"""
+import logging
+
+from django.conf import settings
+
+from .models import UserContributionStats, LeaderboardSnapshot
+from .utils import titles_for_counts
+
+logger = logging.getLogger(__name__)
+
+TOP_N = getattr(settings, 'HALL_OF_FAME_TOP_N', 10)
+
+# (類別, UserContributionStats 欄位, 同分時的排序)
+CATEGORIES = [('reviews', 'approved_reviews', 'user__username'), ('stories', 'approved_stories', 'user__username')]
+CATEGORIES += [(fb_type, field, 'user_id') for fb_type, field in UserContributionStats.FEEDBACK_COUNTER_FIELDS.items()]
+CATEGORY_FIELDS = {category: field for category, field, _ in CATEGORIES}
+# 稱號依 total_reviews (心得 + 限時動態) 決定，這兩個欄位變動時榜上的稱號也要更新
+TOTAL_FIELDS = {'approved_reviews', 'approved_stories'}
+
+
+def _display_name(user):
+    return user.first_name or user.username
+
+
+def compute_category(category):
+    """由 UserContributionStats 計算單一類別的前 N 名 (不寫入)。"""
+    field = CATEGORY_FIELDS[category]
+    tie_breaker = next(t for c, _, t in CATEGORIES if c == category)
+    stats_qs = UserContributionStats.objects.select_related('user').filter(**{f'{field}__gt': 0}).order_by(f'-{field}', tie_breaker)[:TOP_N]
+    return [{'user_id': stats.user_id, 'user_name': _display_name(stats.user), 'count': getattr(stats, field), 'total_reviews': stats.total_reviews}
+            for stats in stats_qs]
+
+
+def rebuild(categories=None):
+    """重算並寫入指定 (預設全部) 類別的快照，回傳 {類別: 名單}。"""
+    results = {}
+    for category, _, _ in CATEGORIES:
+        if categories is not None and category not in categories: continue
+        results[category] = compute_category(category)
+        LeaderboardSnapshot.objects.update_or_create(category=category, defaults={'entries': results[category]})
+    logger.debug(f"Leaderboard rebuilt: {list(results.keys())}")
+    return results
+
+
+def _load_snapshots():
+    return {snapshot.category: snapshot for snapshot in LeaderboardSnapshot.objects.all()}
+
+
+def refresh_for_user(user_id, fields):
+    """user_id 的 fields (UserContributionStats 欄位) 已變動：只更新受影響的類別。"""
+    fields = set(fields)
+    if not user_id or not (fields & (set(CATEGORY_FIELDS.values()) | TOTAL_FIELDS)): return
+    snapshots = _load_snapshots()
+    stats = None; stats_loaded = False
+    to_rebuild = []
+    for category, field, _ in CATEGORIES:
+        snapshot = snapshots.get(category)
+        if snapshot is None:
+            to_rebuild.append(category)
+            continue
+        entries = snapshot.entries or []
+        position = next((i for i, entry in enumerate(entries) if entry['user_id'] == user_id), None)
+        if field not in fields and (position is None or not fields & TOTAL_FIELDS): continue
+        if not stats_loaded:
+            stats = UserContributionStats.objects.filter(user_id=user_id).first(); stats_loaded = True
+        if field in fields:
+            count = getattr(stats, field, 0) if stats else 0
+            # 原本在榜上 (名次可能變動或掉出榜外) 或足以進榜時才重算
+            if position is not None or (count > 0 and (len(entries) < TOP_N or count >= entries[-1]['count'])):
+                to_rebuild.append(category)
+            continue
+        # 只有稱號用的總數改變：就地更新
+        entries[position]['total_reviews'] = stats.total_reviews if stats else 0
+        snapshot.save(update_fields=['entries', 'updated_at'])
+    if to_rebuild: rebuild(to_rebuild)
+
+
+def refresh_user_name(user):
+    """使用者改名後更新榜上的顯示名稱 (不在榜上時只讀一次快照)。"""
+    name = _display_name(user)
+    for snapshot in _load_snapshots().values():
+        changed = False
+        for entry in snapshot.entries or []:
+            if entry['user_id'] == user.pk and entry['user_name'] != name:
+                entry['user_name'] = name; changed = True
+        if changed: snapshot.save(update_fields=['entries', 'updated_at'])
+
+
+def remove_user(user_id):
+    """使用者被刪除：重算有他的類別，讓下一名遞補。"""
+    categories = [c for c, snapshot in _load_snapshots().items() if any(e['user_id'] == user_id for e in snapshot.entries or [])]
+    if categories: rebuild(categories)
+
+
+def read_rankings():
+    """名人堂資料：{類別: [{'rank', 'user_name', 'user_title', 'count', 'user_id'}, ...]}。尚未建立的類別會先建立。"""
+    entries_by_category = {category: snapshot.entries or [] for category, snapshot in _load_snapshots().items()}
+    missing = [category for category, _, _ in CATEGORIES if category not in entries_by_category]
+    if missing:
+        logger.info(f"Leaderboard snapshot missing for {missing}, building now.")
+        entries_by_category.update(rebuild(missing))
+    titles = titles_for_counts({entry['user_id']: entry['total_reviews'] for entries in entries_by_category.values() for entry in entries})
+    return {
+        category: [{'rank': i + 1, 'user_name': entry['user_name'], 'user_title': titles.get(entry['user_id']), 'count': entry['count'], 'user_id': entry['user_id']}
+                   for i, entry in enumerate(entries_by_category[category])]
+        for category, _, _ in CATEGORIES
+    }
@@ -0,0 +1,68 @@
+# D:\bkgg\mybackend\myapp\management\commands\bench_profile_stats.py
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Q
+from django.test.utils import CaptureQueriesContext
+
+from myapp import profile_stats
+from myapp.models import UserProfile, Review, StoryReview, ReviewFeedback, PendingAppointment, Note
+
+
+class Command(BaseCommand):
+    help = "比較個人檔案統計的舊寫法 (逐項查詢) 與 profile_stats 的單一查詢 / 快取，列出資料庫來回次數與耗時，並確認結果相同。"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', default='', help="要測試的使用者名稱 (預設第一位有 UserProfile 的使用者)")
+        parser.add_argument('--repeat', type=int, default=20, help="每種寫法重複次數，取最佳值 (預設 20)")
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        if options['user']:
+            user = User.objects.filter(username=options['user']).first()
+            if user is None: raise CommandError(f"找不到使用者 {options['user']}")
+        else:
+            profile = UserProfile.objects.select_related('user').order_by('pk').first()
+            if profile is None: raise CommandError("資料庫中沒有任何 UserProfile")
+            user = profile.user
+        repeat = max(1, options['repeat'])
+
+        profile_stats.invalidate(user.id)
+        expected = self._legacy(user)
+        profile_stats.get(user.id)  # 預熱，cached 量測命中快取的情況
+        self.stdout.write(f"user: {user.username} (ID {user.id})")
+        self.stdout.write(f"{'method':<14} {'queries':>8} {'best (ms)':>10}  identical")
+        for name, func in (('legacy', lambda: self._legacy(user)), ('single-query', lambda: profile_stats.query(user.id)), ('cached', lambda: profile_stats.get(user.id))):
+            queries, best, result = self._measure(func, repeat)
+            identical = {field: result[field] for field in profile_stats.FIELDS} == expected
+            self.stdout.write(f"{name:<14} {queries:>8} {best * 1000:>10.3f}  {identical}")
+            if not identical:
+                raise CommandError(f"{name} 的結果與舊寫法不同: {result} != {expected}")
+
+    def _measure(self, func, repeat):
+        with CaptureQueriesContext(connection) as captured:
+            result = func()
+        queries = len(captured)
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return queries, best, result
+
+    def _legacy(self, user):
+        """改寫前 ajax_get_profile_data 的七個查詢 (直接由原始資料表計數)。"""
+        profile = UserProfile.objects.get(user=user)
+        received = Q(review__user=user) | Q(story_review__user=user)
+        return {
+            'desire_coins': profile.desire_coins,
+            'approved_reviews': Review.objects.filter(user=user, approved=True).count(),
+            'approved_stories': StoryReview.objects.filter(user=user, approved=True).count(),
+            'good_to_have_you_received': ReviewFeedback.objects.filter(received, feedback_type='good_to_have_you').count(),
+            'good_looking_received': ReviewFeedback.objects.filter(received, feedback_type='good_looking').count(),
+            'pending_count': PendingAppointment.objects.filter(user=user).count(),
+            'notes_count': Note.objects.filter(user=user).count(),
+        }
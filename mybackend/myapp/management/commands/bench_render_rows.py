@@ -0,0 +1,63 @@
+# D:\bkgg\mybackend\myapp\management\commands\bench_render_rows.py
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+
+from myapp.models import Animal, Hall
+from myapp.views import render_animal_rows
+
+
+class Command(BaseCommand):
+    help = "比較 render_animal_rows 逐行渲染與批次渲染的速度，並確認兩者輸出完全相同 (不需資料庫)。"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10,100,1000', help="要測試的列數，以逗號分隔 (預設 10,100,1000)")
+        parser.add_argument('--repeat', type=int, default=5, help="每種列數重複次數，取最佳值 (預設 5)")
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(s) for s in options['sizes'].split(',') if s.strip()]
+        except ValueError:
+            raise CommandError("--sizes 必須是以逗號分隔的整數")
+        repeat = max(1, options['repeat'])
+
+        request = RequestFactory().get('/ajax/daily_schedule/')
+        request.user = AnonymousUser()
+
+        self.stdout.write(f"{'rows':>6} {'per-row (ms)':>14} {'batched (ms)':>14} {'speedup':>9}  identical")
+        for size in sizes:
+            animals, slots = self._build_animals(size)
+            per_row_html, per_row_best = self._time(request, animals, slots, False, repeat)
+            batched_html, batched_best = self._time(request, animals, slots, True, repeat)
+            identical = per_row_html == batched_html
+            speedup = per_row_best / batched_best if batched_best else float('inf')
+            self.stdout.write(f"{size:>6} {per_row_best * 1000:>14.2f} {batched_best * 1000:>14.2f} {speedup:>8.2f}x  {identical}")
+            if not identical:
+                raise CommandError(f"批次渲染輸出與逐行渲染不同 (rows={size})")
+
+    def _time(self, request, animals, slots, batched, repeat):
+        best = None; html = ""
+        for _ in range(repeat):
+            start = time.perf_counter()
+            html = render_animal_rows(request, animals, fetch_daily_slots=False, slots_override_dict=slots, batched=batched)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return html, best
+
+    def _build_animals(self, size):
+        """建立未存檔的 Animal 物件 (含館別與已審核心得數)，模擬列表查詢的結果。"""
+        hall = Hall(id=1, name="測試館")
+        animals = []; slots = {}
+        for i in range(1, size + 1):
+            animal = Animal(
+                id=i, name=f"美容師{i}", hall=hall, height=160 + i % 15, weight=45 + i % 10,
+                cup_size="CDEF"[i % 4], fee=3000 + (i % 5) * 100,
+                introduction=f"第 {i} 位的介紹 <b>\"quoted\"</b>\n第二行",
+                is_newcomer=i % 2 == 0, is_hot=i % 3 == 0, is_exclusive=i % 5 == 0, is_hidden_edition=i % 7 == 0,
+            )
+            animal.approved_review_count = i % 13
+            animals.append(animal)
+            slots[i] = ["14.15.16.100.101", "預約滿", "人到再約", ""][i % 4]
+        return animals, slots
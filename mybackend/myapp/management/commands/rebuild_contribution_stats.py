@@ -0,0 +1,74 @@
+# D:\bkgg\mybackend\myapp\management\commands\rebuild_contribution_stats.py
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from django.db.models import Count
+from django.db.models.functions import Coalesce
+
+from myapp.models import Review, StoryReview, ReviewFeedback, UserContributionStats
+from myapp import profile_stats
+
+
+class Command(BaseCommand):
+    help = "由 Review / StoryReview / ReviewFeedback 重新計算 UserContributionStats，並校正與現有計數不符的資料列。"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="只列出不一致的使用者，不寫入資料庫")
+        parser.add_argument('--batch-size', type=int, default=500, help="bulk_create / bulk_update 批次大小 (預設 500)")
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        batch_size = max(1, options['batch_size'])
+        fields = UserContributionStats.COUNTER_FIELDS
+
+        expected = self._compute_expected()
+        existing = {s.user_id: s for s in UserContributionStats.objects.all()}
+
+        to_create, to_update = [], []
+        for user_id, counts in expected.items():
+            stats = existing.get(user_id)
+            if stats is None:
+                to_create.append(UserContributionStats(user_id=user_id, **counts))
+                continue
+            current = {f: getattr(stats, f) for f in fields}
+            if current != counts:
+                self.stdout.write(f"User {user_id}: {current} -> {counts}")
+                for f, value in counts.items(): setattr(stats, f, value)
+                to_update.append(stats)
+        # 已存在但不再有任何貢獻的使用者歸零
+        for user_id, stats in existing.items():
+            if user_id in expected or all(getattr(stats, f) == 0 for f in fields): continue
+            self.stdout.write(f"User {user_id}: reset to 0")
+            for f in fields: setattr(stats, f, 0)
+            to_update.append(stats)
+
+        self.stdout.write(f"{len(expected)} users with contributions, {len(to_create)} missing rows, {len(to_update)} mismatched rows.")
+        if dry_run:
+            self.stdout.write(self.style.WARNING("Dry run: no changes written."))
+            return
+
+        with transaction.atomic():
+            UserContributionStats.objects.bulk_create(to_create, batch_size=batch_size, ignore_conflicts=True)
+            # bulk_update 不會套用 auto_now，updated_at 另外設定 (名人堂的版本戳記依賴它)
+            now = timezone.now()
+            for stats in to_update: stats.updated_at = now
+            UserContributionStats.objects.bulk_update(to_update, [*fields, 'updated_at'], batch_size=batch_size)
+        # bulk_create / bulk_update 不觸發 signals，個人檔案統計快取整批失效
+        profile_stats.invalidate_all()
+        self.stdout.write(self.style.SUCCESS(f"Contribution stats rebuilt: {len(to_create)} created, {len(to_update)} corrected."))
+
+    def _compute_expected(self):
+        expected = defaultdict(lambda: dict.fromkeys(UserContributionStats.COUNTER_FIELDS, 0))
+        for row in Review.objects.filter(approved=True).values('user_id').annotate(count=Count('id')):
+            expected[row['user_id']]['approved_reviews'] = row['count']
+        for row in StoryReview.objects.filter(approved=True).values('user_id').annotate(count=Count('id')):
+            expected[row['user_id']]['approved_stories'] = row['count']
+        feedback_rows = ReviewFeedback.objects.annotate(
+            recipient_id=Coalesce('review__user_id', 'story_review__user_id')
+        ).filter(recipient_id__isnull=False).values('recipient_id', 'feedback_type').annotate(count=Count('id'))
+        for row in feedback_rows:
+            field = UserContributionStats.FEEDBACK_COUNTER_FIELDS.get(row['feedback_type'])
+            if field: expected[row['recipient_id']][field] = row['count']
+        return expected
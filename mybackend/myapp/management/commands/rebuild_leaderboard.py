@@ -0,0 +1,22 @@
+# D:\bkgg\mybackend\myapp\management\commands\rebuild_leaderboard.py
+from django.core.management.base import BaseCommand, CommandError
+
+from myapp import leaderboard
+
+
+class Command(BaseCommand):
+    help = "由 UserContributionStats 完整重建名人堂快照 (LeaderboardSnapshot)；平常由 signals 增量更新，建議定期執行以校正。"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categories', default='', help="只重建指定類別，以逗號分隔 (預設全部)")
+
+    def handle(self, *args, **options):
+        categories = None
+        if options['categories']:
+            categories = {c.strip() for c in options['categories'].split(',') if c.strip()}
+            unknown = categories - set(leaderboard.CATEGORY_FIELDS)
+            if unknown: raise CommandError(f"未知的類別: {', '.join(sorted(unknown))}")
+        results = leaderboard.rebuild(categories)
+        for category, entries in results.items():
+            self.stdout.write(f"{category}: {len(entries)} entries")
+        self.stdout.write(self.style.SUCCESS(f"Leaderboard rebuilt ({len(results)} categories)."))
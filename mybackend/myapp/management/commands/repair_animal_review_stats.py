@@ -0,0 +1,30 @@
+# D:\bkgg\mybackend\myapp\management\commands\repair_animal_review_stats.py
+from django.core.management.base import BaseCommand
+
+from myapp.models import Animal
+
+
+class Command(BaseCommand):
+    help = "由 Review 重新計算 Animal.approved_review_count / last_review_approved_at，並列出原本不一致的美容師。"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="只列出不一致的美容師，不寫入資料庫")
+
+    def handle(self, *args, **options):
+        count_sq, latest_sq = Animal.review_stats_subqueries()
+        rows = Animal.objects.annotate(expected_count=count_sq, expected_latest=latest_sq).values_list(
+            'id', 'name', 'approved_review_count', 'last_review_approved_at', 'expected_count', 'expected_latest'
+        )
+        mismatched_ids = []
+        for animal_id, name, count, latest, expected_count, expected_latest in rows:
+            expected_count = expected_count or 0
+            if count != expected_count or latest != expected_latest:
+                mismatched_ids.append(animal_id)
+                self.stdout.write(f"Animal {animal_id} ({name}): count {count} -> {expected_count}, latest {latest} -> {expected_latest}")
+
+        self.stdout.write(f"{len(mismatched_ids)} animal(s) out of sync.")
+        if options['dry_run'] or not mismatched_ids:
+            if options['dry_run']: self.stdout.write(self.style.WARNING("Dry run: no changes written."))
+            return
+        updated = Animal.refresh_review_stats(mismatched_ids)
+        self.stdout.write(self.style.SUCCESS(f"Review stats repaired for {updated} animal(s)."))
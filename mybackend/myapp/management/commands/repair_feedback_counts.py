@@ -0,0 +1,35 @@
+# D:\bkgg\mybackend\myapp\management\commands\repair_feedback_counts.py
+from django.core.management.base import BaseCommand
+
+from myapp.models import Review, StoryReview
+
+
+class Command(BaseCommand):
+    help = "由 ReviewFeedback 重新計算 Review / StoryReview 的回饋計數 (good_to_have_you_count / good_looking_count)，並列出原本不一致的心得。"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="只列出不一致的心得，不寫入資料庫")
+
+    def handle(self, *args, **options):
+        total_mismatched = 0
+        for model in (Review, StoryReview):
+            subqueries = model.feedback_count_subqueries()
+            fields = list(subqueries.keys())
+            rows = model.objects.annotate(**{f'expected_{field}': expr for field, expr in subqueries.items()}).values_list(
+                'id', *fields, *(f'expected_{field}' for field in fields)
+            )
+            mismatched_ids = []
+            for row in rows:
+                pk, current, expected = row[0], row[1:1 + len(fields)], row[1 + len(fields):]
+                if tuple(current) != tuple(expected):
+                    mismatched_ids.append(pk)
+                    changes = ", ".join(f"{field} {c} -> {e}" for field, c, e in zip(fields, current, expected) if c != e)
+                    self.stdout.write(f"{model.__name__} {pk}: {changes}")
+
+            self.stdout.write(f"{model.__name__}: {len(mismatched_ids)} row(s) out of sync.")
+            total_mismatched += len(mismatched_ids)
+            if not options['dry_run'] and mismatched_ids:
+                updated = model.refresh_feedback_counts(mismatched_ids)
+                self.stdout.write(self.style.SUCCESS(f"{model.__name__}: feedback counts repaired for {updated} row(s)."))
+
+        if options['dry_run'] and total_mismatched: self.stdout.write(self.style.WARNING("Dry run: no changes written."))
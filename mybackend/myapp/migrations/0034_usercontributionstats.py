@@ -0,0 +1,35 @@
+# Generated by Django 5.1.7 on 2026-10-18 09:32
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('myapp', '0033_prebookingslot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserContributionStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='contribution_stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('approved_reviews', models.PositiveIntegerField(db_index=True, default=0, verbose_name='已審核心得數')),
+                ('approved_stories', models.PositiveIntegerField(db_index=True, default=0, verbose_name='已審核限時動態數')),
+                ('good_to_have_you_received', models.PositiveIntegerField(db_index=True, default=0, verbose_name='收到「有你真好」數')),
+                ('good_looking_received', models.PositiveIntegerField(db_index=True, default=0, verbose_name='收到「人帥真好」數')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='最後更新')),
+            ],
+            options={
+                'verbose_name': '使用者貢獻統計',
+                'verbose_name_plural': '使用者貢獻統計',
+            },
+        ),
+        migrations.AlterModelOptions(
+            name='prebookingslot',
+            options={'ordering': ['-date', 'animal__hall__order', 'animal__order', 'animal__name'], 'verbose_name': '搶約專區', 'verbose_name_plural': '搶約專區'},
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.1.7 on 2026-10-18 09:34
+
+from django.db import migrations, models
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_review_stats(apps, schema_editor):
+    Animal = apps.get_model('myapp', 'Animal')
+    Review = apps.get_model('myapp', 'Review')
+    approved = Review.objects.filter(animal=OuterRef('pk'), approved=True).order_by().values('animal')
+    Animal.objects.update(
+        approved_review_count=Coalesce(Subquery(approved.annotate(c=Count('id')).values('c')[:1], output_field=models.IntegerField()), 0),
+        last_review_approved_at=Subquery(approved.annotate(m=Max('approved_at')).values('m')[:1], output_field=models.DateTimeField()),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0034_usercontributionstats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='animal',
+            name='approved_review_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='已審核心得數'),
+        ),
+        migrations.AddField(
+            model_name='animal',
+            name='last_review_approved_at',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, null=True, verbose_name='最新心得審核時間'),
+        ),
+        migrations.RunPython(populate_review_stats, migrations.RunPython.noop),
+    ]
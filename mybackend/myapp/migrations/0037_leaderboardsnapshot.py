@@ -0,0 +1,25 @@
+# Generated by Django 5.1.7 on 2026-10-18 09:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0036_prebookingslot_slot_fields'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaderboardSnapshot',
+            fields=[
+                ('category', models.CharField(max_length=30, primary_key=True, serialize=False, verbose_name='類別')),
+                ('entries', models.JSONField(blank=True, default=list, verbose_name='排名')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新時間')),
+            ],
+            options={
+                'verbose_name': '名人堂快照',
+                'verbose_name_plural': '名人堂快照',
+            },
+        ),
+    ]
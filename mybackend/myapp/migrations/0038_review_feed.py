@@ -0,0 +1,43 @@
+# Generated by Django 5.1.7 on 2026-10-18 09:56
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_feedback_counts(apps, schema_editor):
+    Review = apps.get_model('myapp', 'Review')
+    ReviewFeedback = apps.get_model('myapp', 'ReviewFeedback')
+    def count_of(feedback_type):
+        feedback = ReviewFeedback.objects.filter(review=OuterRef('pk'), feedback_type=feedback_type).order_by().values('review')
+        return Coalesce(Subquery(feedback.annotate(c=Count('id')).values('c')[:1], output_field=models.IntegerField()), 0)
+    Review.objects.update(good_to_have_you_count=count_of('good_to_have_you'), good_looking_count=count_of('good_looking'))
+    # 心得列表依 approved_at 分頁：舊資料中已審核卻沒有審核時間的心得，以建立時間補上 (列表原本就以建立時間顯示)
+    Review.objects.filter(approved=True, approved_at__isnull=True).update(approved_at=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0037_leaderboardsnapshot'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='review',
+            name='good_looking_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='「人帥真好」數'),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='good_to_have_you_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='「有你真好」數'),
+        ),
+        migrations.RunPython(populate_feedback_counts, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(models.F('animal'), models.OrderBy(models.F('approved_at'), descending=True), models.OrderBy(models.F('id'), descending=True), condition=models.Q(('approved', True)), name='review_feed_idx'),
+        ),
+    ]
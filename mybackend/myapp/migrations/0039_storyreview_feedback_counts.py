@@ -0,0 +1,35 @@
+# Generated by Django 5.1.7 on 2026-10-18 09:59
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_feedback_counts(apps, schema_editor):
+    StoryReview = apps.get_model('myapp', 'StoryReview')
+    ReviewFeedback = apps.get_model('myapp', 'ReviewFeedback')
+    def count_of(feedback_type):
+        feedback = ReviewFeedback.objects.filter(story_review=OuterRef('pk'), feedback_type=feedback_type).order_by().values('story_review')
+        return Coalesce(Subquery(feedback.annotate(c=Count('id')).values('c')[:1], output_field=models.IntegerField()), 0)
+    StoryReview.objects.update(good_to_have_you_count=count_of('good_to_have_you'), good_looking_count=count_of('good_looking'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0038_review_feed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='storyreview',
+            name='good_looking_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='「人帥真好」數'),
+        ),
+        migrations.AddField(
+            model_name='storyreview',
+            name='good_to_have_you_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='「有你真好」數'),
+        ),
+        migrations.RunPython(populate_feedback_counts, migrations.RunPython.noop),
+    ]
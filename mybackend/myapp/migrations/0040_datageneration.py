@@ -0,0 +1,24 @@
+# Generated by Django 5.1.7 on 2026-10-18 10:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0039_storyreview_feedback_counts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataGeneration',
+            fields=[
+                ('topic', models.CharField(max_length=100, primary_key=True, serialize=False, verbose_name='Topic')),
+                ('generation', models.PositiveBigIntegerField(default=1, verbose_name='世代號')),
+            ],
+            options={
+                'verbose_name': '資料世代號',
+                'verbose_name_plural': '資料世代號',
+            },
+        ),
+    ]
@@ -7,12 +7,15 @@ from django.utils import timezone
 # from django.db.models.signals import pre_save, post_save
 # from django.dispatch import receiver
 # --- ---
-from django.db import transaction
+from django.db import transaction, IntegrityError
+from django.db.models.functions import Greatest, Coalesce
 from django.db.models import Q, Count, F, Case, When, Value, OuterRef, Subquery # 保留 F
 from django.core.exceptions import ValidationError
 from datetime import timedelta, date # <<<--- 導入 date
 import logging
 
+from .time_slots import SlotStatus, apply_slot_fields
+
 # --- django-solo import ---
 try:
     from solo.models import SingletonModel
@@ -126,6 +129,9 @@ class Animal(models.Model):
     is_featured = models.BooleanField("設為主打", default=False, db_index=True, help_text="勾選此項，將此美容師顯示在首頁主打區塊（建議只勾選一位）")
     created_at = models.DateTimeField("建立時間", auto_now_add=True, null=True, blank=True)
     updated_at = models.DateTimeField("更新時間", auto_now=True, null=True, blank=True)
+    # --- 心得統計 (反正規化，由 signals 維護；可用 repair_animal_review_stats 指令校正) ---
+    approved_review_count = models.PositiveIntegerField("已審核心得數", default=0, editable=False)
+    last_review_approved_at = models.DateTimeField("最新心得審核時間", null=True, blank=True, editable=False, db_index=True)
 
     class Meta:
         ordering = ['hall__order', 'order', 'name']
@@ -150,11 +156,70 @@ class Animal(models.Model):
         if self.weight: parts.append(str(self.weight))
         if self.cup_size: parts.append(self.cup_size)
         return ".".join(parts) if parts else "未填"
+
+    @staticmethod
+    def review_stats_subqueries():
+        """回傳 (已審核心得數, 最新審核時間) 的 Subquery，供 update()/annotate() 使用。"""
+        approved = Review.objects.filter(animal=OuterRef('pk'), approved=True).order_by().values('animal')
+        count_sq = Subquery(approved.annotate(c=Count('id')).values('c')[:1], output_field=models.IntegerField())
+        latest_sq = Subquery(approved.annotate(m=models.Max('approved_at')).values('m')[:1], output_field=models.DateTimeField())
+        return count_sq, latest_sq
+
+    @classmethod
+    def refresh_review_stats(cls, animal_ids=None):
+        """由 Review 重新計算指定 (或全部) 美容師的心得統計，單一 UPDATE。"""
+        count_sq, latest_sq = cls.review_stats_subqueries()
+        qs = cls.objects.all() if animal_ids is None else cls.objects.filter(pk__in=[a_id for a_id in animal_ids if a_id])
+        return qs.update(approved_review_count=Coalesce(count_sq, 0), last_review_approved_at=latest_sq)
 # --- Animal Model 結束 ---
 
 
+# --- 心得回饋計數 (Review / StoryReview 共用) ---
+class FeedbackCounts(models.Model):
+    """
+    反正規化的回饋計數：ReviewFeedback 新增/刪除時由 signals 以 F() 原子地增減，讀取時不必 COUNT 回饋表。
+    可用 repair_feedback_counts 指令由 ReviewFeedback 重新計算校正。
+    """
+    good_to_have_you_count = models.PositiveIntegerField("「有你真好」數", default=0, editable=False)
+    good_looking_count = models.PositiveIntegerField("「人帥真好」數", default=0, editable=False)
+    FEEDBACK_COUNT_FIELDS = { 'good_to_have_you': 'good_to_have_you_count', 'good_looking': 'good_looking_count', }
+    FEEDBACK_TARGET_FIELD = None # ReviewFeedback 上指向此模型的欄位名稱 (子類別設定)
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def bump_feedback_count(cls, pk, feedback_type, delta):
+        """以 F() 原子地增減回饋計數 (不會低於 0)；未知的回饋類型忽略。"""
+        field = cls.FEEDBACK_COUNT_FIELDS.get(feedback_type)
+        if not pk or not field or not delta: return
+        cls.objects.filter(pk=pk).update(**{field: Greatest(F(field) + delta, 0)})
+
+    @classmethod
+    def get_feedback_counts(cls, pk):
+        """{'good_to_have_you_count': n, 'good_looking_count': n}，一次查詢 (找不到時皆為 0)。"""
+        counts = cls.objects.filter(pk=pk).values(*cls.FEEDBACK_COUNT_FIELDS.values()).first()
+        return counts or {field: 0 for field in cls.FEEDBACK_COUNT_FIELDS.values()}
+
+    @classmethod
+    def feedback_count_subqueries(cls):
+        """由 ReviewFeedback 計算各回饋計數的子查詢 {欄位: 表達式} (供校正 / 比對使用)。"""
+        subqueries = {}
+        for feedback_type, field in cls.FEEDBACK_COUNT_FIELDS.items():
+            feedback = ReviewFeedback.objects.filter(**{cls.FEEDBACK_TARGET_FIELD: OuterRef('pk'), 'feedback_type': feedback_type}).order_by().values(cls.FEEDBACK_TARGET_FIELD)
+            subqueries[field] = Coalesce(Subquery(feedback.annotate(c=Count('id')).values('c')[:1], output_field=models.IntegerField()), 0)
+        return subqueries
+
+    @classmethod
+    def refresh_feedback_counts(cls, pks=None):
+        """由 ReviewFeedback 重新計算指定 (或全部) 資料列的回饋計數，單一 UPDATE。"""
+        qs = cls.objects.all() if pks is None else cls.objects.filter(pk__in=[pk for pk in pks if pk])
+        return qs.update(**cls.feedback_count_subqueries())
+# --- FeedbackCounts 結束 ---
+
+
 # --- Review Model ---
-class Review(models.Model):
+class Review(FeedbackCounts):
     animal = models.ForeignKey(Animal, related_name="reviews", on_delete=models.CASCADE)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='reviews')
     age = models.PositiveIntegerField("年紀", null=True, blank=True)
@@ -183,11 +248,16 @@ class Review(models.Model):
     approved = models.BooleanField("已審核", default=False, db_index=True)
     approved_at = models.DateTimeField("審核時間", null=True, blank=True, db_index=True)
     reward_granted = models.BooleanField("已獎勵", default=False, help_text="標記此心得是否已觸發增加慾望幣")
+    FEEDBACK_TARGET_FIELD = 'review'
 
     class Meta:
         ordering = ['-approved_at', '-created_at']
         verbose_name = "心得評論"
         verbose_name_plural = "心得評論"
+        indexes = [
+            # 美容師心得列表的 keyset 分頁 (approved_at DESC, id DESC)；已審核的心得一定有 approved_at (pre_save 設定)
+            models.Index(F('animal'), F('approved_at').desc(), F('id').desc(), condition=Q(approved=True), name='review_feed_idx'),
+        ]
 
     def __str__(self):
         animal_name = self.animal.name if self.animal else "未知美容師"
@@ -258,7 +328,7 @@ class Announcement(models.Model):
 
 
 # --- StoryReview Model ---
-class StoryReview(models.Model):
+class StoryReview(FeedbackCounts):
     animal = models.ForeignKey(Animal, related_name="story_reviews", on_delete=models.CASCADE, verbose_name="美容師")
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='story_reviews', verbose_name="用戶")
     age = models.PositiveIntegerField("年紀", null=True, blank=True)
@@ -281,6 +351,7 @@ class StoryReview(models.Model):
     approved_at = models.DateTimeField("審核時間", null=True, blank=True, db_index=True)
     expires_at = models.DateTimeField("過期時間", null=True, blank=True, db_index=True)
     reward_granted = models.BooleanField("已獎勵", default=False, help_text="標記此心得是否已觸發增加慾望幣")
+    FEEDBACK_TARGET_FIELD = 'story_review'
 
     class Meta:
         ordering = ['-approved_at', '-created_at']
@@ -303,8 +374,12 @@ class StoryReview(models.Model):
     @property
     def remaining_time_display(self):
         if not self.is_active: return "已過期"
-        now = timezone.now()
-        remaining = self.expires_at - now
+        return self.remaining_time_text(self.expires_at)
+
+    @staticmethod
+    def remaining_time_text(expires_at, now=None):
+        """剩餘時間文字 (不檢查審核狀態)；限時動態列表的版本戳記也以此判斷顯示是否改變。"""
+        remaining = expires_at - (now or timezone.now())
         total_seconds = int(remaining.total_seconds())
         hours = total_seconds // 3600
         minutes = (total_seconds % 3600) // 60
@@ -351,18 +426,28 @@ class PreBookingSlot(models.Model):
         help_text='輸入此日期可預約的時段，例如 "14:00, 15:30, 17:00" 或 "下午班"',
         blank=True # 允許空白，雖然通常應該有值
     )
+    # 由 time_slots 推導 (myapp.time_slots)，save() 時自動更新
+    slot_mask = models.PositiveIntegerField("時段遮罩", default=0, editable=False, help_text="bit h 代表 h 點有空 (0-23)")
+    slot_status = models.PositiveSmallIntegerField("時段狀態", choices=SlotStatus.choices, default=SlotStatus.EMPTY, editable=False)
     created_at = models.DateTimeField("建立時間", auto_now_add=True)
     updated_at = models.DateTimeField("更新時間", auto_now=True)
 
     class Meta:
         ordering = ['-date', 'animal__hall__order', 'animal__order', 'animal__name']
         unique_together = ('animal', 'date') # 一個美容師一天只應有一條搶約記錄
+        indexes = [models.Index(fields=['date', 'slot_status'], name='prebooking_date_status_idx')]
         verbose_name = "搶約專區"
         verbose_name_plural = "搶約專區"
 
     def __str__(self):
         hall_name = self.animal.hall.name if self.animal.hall else '未知館'
         return f"{self.date.strftime('%Y-%m-%d')} - {hall_name} {self.animal.name} - 時段: {self.time_slots}"
+
+    def save(self, *args, **kwargs):
+        apply_slot_fields(self)
+        if kwargs.get('update_fields') is not None and 'time_slots' in kwargs['update_fields']:
+            kwargs['update_fields'] = set(kwargs['update_fields']) | {'slot_mask', 'slot_status'}
+        super().save(*args, **kwargs)
 # --- PreBookingSlot Model 結束 ---
 
 
@@ -415,6 +500,94 @@ class UserProfile(models.Model):
 # --- UserProfile Model 結束 ---
 
 
+# --- UserContributionStats Model ---
+class UserContributionStats(models.Model):
+    """
+    每位使用者的貢獻計數 (反正規化)，供稱號、個人檔案、名人堂使用。
+    由 myapp/signals.py 的審核/回饋 signal 增減；可用 rebuild_contribution_stats 指令重建校正。
+    """
+    COUNTER_FIELDS = ('approved_reviews', 'approved_stories', 'good_to_have_you_received', 'good_looking_received')
+    FEEDBACK_COUNTER_FIELDS = { 'good_to_have_you': 'good_to_have_you_received', 'good_looking': 'good_looking_received', }
+
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, primary_key=True, related_name='contribution_stats')
+    approved_reviews = models.PositiveIntegerField("已審核心得數", default=0, db_index=True)
+    approved_stories = models.PositiveIntegerField("已審核限時動態數", default=0, db_index=True)
+    good_to_have_you_received = models.PositiveIntegerField("收到「有你真好」數", default=0, db_index=True)
+    good_looking_received = models.PositiveIntegerField("收到「人帥真好」數", default=0, db_index=True)
+    updated_at = models.DateTimeField("最後更新", auto_now=True)
+
+    class Meta:
+        verbose_name = "使用者貢獻統計"
+        verbose_name_plural = "使用者貢獻統計"
+
+    def __str__(self):
+        return f"User {self.user_id} stats (心得 {self.approved_reviews} / 動態 {self.approved_stories})"
+
+    @property
+    def total_reviews(self):
+        return self.approved_reviews + self.approved_stories
+
+    @classmethod
+    def for_user(cls, user_id):
+        """讀取單一使用者的計數；尚無資料列時回傳未儲存的全 0 物件 (不寫入)。"""
+        return cls.objects.filter(user_id=user_id).first() or cls(user_id=user_id)
+
+    @classmethod
+    def bump(cls, user_id, **deltas):
+        """以 F() 原子地增減計數，例如 bump(user_id, approved_reviews=1)。不會低於 0。"""
+        deltas = {field: delta for field, delta in deltas.items() if delta}
+        if not user_id or not deltas: return
+        updates = {field: Greatest(F(field) + delta, 0) for field, delta in deltas.items()}
+        updates['updated_at'] = timezone.now()
+        if cls.objects.filter(user_id=user_id).update(**updates): return
+        # 只有遞減時不建立資料列 (例如刪除使用者時 cascade 刪除心得)
+        if all(delta < 0 for delta in deltas.values()): return
+        try:
+            with transaction.atomic():
+                cls.objects.create(user_id=user_id, **{field: max(delta, 0) for field, delta in deltas.items()})
+        except IntegrityError:
+            # 併發下另一個請求已建立資料列，改用 update
+            cls.objects.filter(user_id=user_id).update(**updates)
+# --- UserContributionStats Model 結束 ---
+
+
+# --- LeaderboardSnapshot Model ---
+class LeaderboardSnapshot(models.Model):
+    """
+    名人堂各類別前 N 名的快照，由 myapp/leaderboard.py 在計數變動時增量更新、rebuild_leaderboard 指令完整重建。
+    entries 已排序：[{"user_id", "user_name", "count", "total_reviews"}, ...]；名人堂端點只讀取這張表。
+    """
+    category = models.CharField("類別", max_length=30, primary_key=True)
+    entries = models.JSONField("排名", default=list, blank=True)
+    updated_at = models.DateTimeField("更新時間", auto_now=True)
+
+    class Meta:
+        verbose_name = "名人堂快照"
+        verbose_name_plural = "名人堂快照"
+
+    def __str__(self):
+        return f"{self.category} ({len(self.entries or [])} 名)"
+# --- LeaderboardSnapshot Model 結束 ---
+
+
+# --- DataGeneration Model ---
+class DataGeneration(models.Model):
+    """
+    各 topic 的世代號 (myapp/data_version.py)：資料變動時遞增，所有 worker 讀到的都是同一個值 (不依賴共用 cache)。
+    讀取為一次主鍵查詢；沒有資料列的 topic 視為 1。
+    """
+    topic = models.CharField("Topic", max_length=100, primary_key=True)
+    generation = models.PositiveBigIntegerField("世代號", default=1)
+
+    class Meta:
+        verbose_name = "資料世代號"
+        verbose_name_plural = "資料世代號"
+
+    def __str__(self):
+        return f"{self.topic}: {self.generation}"
+# --- DataGeneration Model 結束 ---
+
+
 # --- SiteConfiguration Model ---
 class SiteConfiguration(SingletonModel):
     site_logo = models.ImageField("網站 Logo (頁首左上角)", upload_to='site_config/', blank=True, null=True, help_text="建議使用透明背景的 PNG 圖片，高度約 40-50px")
@@ -0,0 +1,90 @@
+# D:\bkgg\mybackend\myapp\profile_stats.py
+"""
+個人檔案統計 (ajax_get_profile_data 使用)：慾望幣、已審核心得/動態數、收到的回饋數、待約數、筆記數。
+
+- query()：以 UserProfile 為主表，其餘數字以純量子查詢併入同一個 SELECT，一次資料庫來回。
+- get()：依使用者快取 query() 的結果 (PROFILE_STATS_CACHE_TIMEOUT 秒)；相關資料寫入時由 signals (commit 之後) 呼叫 invalidate()。
+  完整重算貢獻計數等批次作業之後呼叫 invalidate_all()。
+- 失效以 data_version 的世代號 (資料庫) 表示，cache key 包含全體與該使用者的世代號：
+  LocMemCache 每個 worker 各自一份，刪除 key 只影響本機，遞增資料庫中的世代號則所有 worker 都看得到。讀取多一次主鍵查詢。
+"""
+import logging
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from . import data_version
+from .models import UserProfile, UserContributionStats, PendingAppointment, Note
+
+logger = logging.getLogger(__name__)
+
+PROFILE_STATS_CACHE_ALIAS = getattr(settings, 'PROFILE_STATS_CACHE_ALIAS', 'default')
+PROFILE_STATS_CACHE_TIMEOUT = getattr(settings, 'PROFILE_STATS_CACHE_TIMEOUT', 5 * 60)
+
+USER_TOPIC = data_version.TOPIC_PROFILE_STATS + ':{user_id}'
+USER_KEY = 'profile_stats:{generation}:{user_generation}:{user_id}'
+
+CONTRIBUTION_FIELDS = ('approved_reviews', 'approved_stories', 'good_to_have_you_received', 'good_looking_received')
+FIELDS = ('desire_coins', *CONTRIBUTION_FIELDS, 'pending_count', 'notes_count')
+
+
+def get_cache():
+    return caches[PROFILE_STATS_CACHE_ALIAS]
+
+
+def _count_subquery(model):
+    rows = model.objects.filter(user_id=OuterRef('user_id')).order_by().values('user_id')
+    return Coalesce(Subquery(rows.annotate(c=Count('id')).values('c')[:1], output_field=models.IntegerField()), 0)
+
+
+def query(user_id):
+    """一次 SELECT 取回所有統計 ({欄位: 數值})；使用者沒有 UserProfile 時回傳 None。"""
+    contribution = UserContributionStats.objects.filter(user_id=OuterRef('user_id'))
+    annotations = {
+        field: Coalesce(Subquery(contribution.values(field)[:1], output_field=models.IntegerField()), 0)
+        for field in CONTRIBUTION_FIELDS
+    }
+    annotations['pending_count'] = _count_subquery(PendingAppointment)
+    annotations['notes_count'] = _count_subquery(Note)
+    # annotate 的別名不能與模型欄位同名，desire_coins 直接取欄位
+    return UserProfile.objects.filter(user_id=user_id).annotate(**annotations).values(*FIELDS).first()
+
+
+def _user_key(user_id):
+    generation, user_generation = data_version.generations(data_version.TOPIC_PROFILE_STATS, USER_TOPIC.format(user_id=user_id))
+    return USER_KEY.format(generation=generation, user_generation=user_generation, user_id=user_id)
+
+
+def get(user_id):
+    """快取的 query() 結果 (另加 total_reviews)；沒有 UserProfile 時回傳 None (不快取)。"""
+    cache = get_cache()
+    try:
+        key = _user_key(user_id)
+        stats = cache.get(key)
+    except Exception as e:
+        logger.error(f"Error reading profile stats cache for user {user_id}: {e}", exc_info=True)
+        key, stats = None, None
+    if stats is not None:
+        return stats
+    stats = query(user_id)
+    if stats is None:
+        return None
+    stats['total_reviews'] = stats['approved_reviews'] + stats['approved_stories']
+    if key:
+        try:
+            cache.set(key, stats, PROFILE_STATS_CACHE_TIMEOUT)
+        except Exception as e:
+            logger.error(f"Error writing profile stats cache for user {user_id}: {e}", exc_info=True)
+    return stats
+
+
+def invalidate(user_id):
+    if not user_id: return
+    data_version.bump(USER_TOPIC.format(user_id=user_id))
+
+
+def invalidate_all():
+    data_version.bump(data_version.TOPIC_PROFILE_STATS)
@@ -0,0 +1,102 @@
+# D:\bkgg\mybackend\myapp\row_cache.py
+"""
+美容師列表 (_animal_table_rows.html) 單行 HTML 片段快取。
+
+- 匿名部分：不含待約/筆記狀態的整行 HTML，所有使用者共用。
+- 使用者覆蓋層：有待約或筆記的行，另以 user + 待約 + 筆記版本為 key 快取。
+
+Key 內含 Animal.updated_at、館別名稱、時段字串 (DailySchedule / PreBookingSlot) 與已審核心得數，
+資料一改 key 就跟著變；另外每位美容師有一個版本號、整體有一個世代號，由 signals 遞增以主動淘汰。
+只使用 Django cache API，LocMemCache 與 FileBasedCache 皆可 (多 worker 共用請用 FileBasedCache)。
+"""
+import hashlib
+import logging
+
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+ROW_CACHE_ALIAS = getattr(settings, 'ANIMAL_ROW_CACHE_ALIAS', 'default')
+ROW_CACHE_TIMEOUT = getattr(settings, 'ANIMAL_ROW_CACHE_TIMEOUT', 60 * 60)
+
+GENERATION_KEY = 'animal_row:gen'
+ANIMAL_VERSION_KEY = 'animal_row:ver:{animal_id}'
+
+
+def get_row_cache():
+    return caches[ROW_CACHE_ALIAS]
+
+
+def _digest(*parts):
+    raw = "\x1f".join("" if p is None else str(p) for p in parts)
+    return hashlib.md5(raw.encode('utf-8')).hexdigest()
+
+
+def load_versions(animal_ids):
+    """一次取回世代號與各美容師版本號 (單一 get_many)，缺少者視為 1。"""
+    cache = get_row_cache()
+    version_keys = {ANIMAL_VERSION_KEY.format(animal_id=a_id): a_id for a_id in animal_ids}
+    try:
+        found = cache.get_many([GENERATION_KEY, *version_keys.keys()])
+    except Exception as e:
+        logger.error(f"Error loading animal row cache versions: {e}", exc_info=True)
+        found = {}
+    generation = found.get(GENERATION_KEY, 1)
+    versions = {a_id: found.get(key, 1) for key, a_id in version_keys.items()}
+    return generation, versions
+
+
+def anonymous_row_key(animal, time_slots, review_count, generation, version):
+    hall = getattr(animal, 'hall', None)
+    updated_ts = animal.updated_at.timestamp() if animal.updated_at else ''
+    digest = _digest(updated_ts, hall.id if hall else '', hall.name if hall else '', time_slots, review_count)
+    return f"animal_row:{generation}:{animal.id}:{version}:{digest}"
+
+
+def user_row_key(anonymous_key, user_id, is_pending, note):
+    note_part = f"{note.id}:{note.updated_at.timestamp() if note.updated_at else ''}" if note else ''
+    return f"{anonymous_key}:u{user_id}:{_digest(int(bool(is_pending)), note_part)}"
+
+
+def get_rows(keys):
+    try:
+        return get_row_cache().get_many(keys)
+    except Exception as e:
+        logger.error(f"Error reading animal row cache: {e}", exc_info=True)
+        return {}
+
+
+def set_rows(rows_by_key):
+    if not rows_by_key: return
+    try:
+        get_row_cache().set_many(rows_by_key, ROW_CACHE_TIMEOUT)
+    except Exception as e:
+        logger.error(f"Error writing animal row cache: {e}", exc_info=True)
+
+
+def _incr(key):
+    cache = get_row_cache()
+    try:
+        cache.incr(key)
+    except ValueError:
+        # 尚未有版本號 (預設 1)，直接設為 2
+        cache.set(key, 2, None)
+
+
+def evict_animals(animal_ids):
+    """遞增指定美容師的版本號，使其所有舊片段 (含使用者覆蓋層) 失效。"""
+    for animal_id in set(animal_ids):
+        if animal_id is None: continue
+        try:
+            _incr(ANIMAL_VERSION_KEY.format(animal_id=animal_id))
+        except Exception as e:
+            logger.error(f"Error evicting animal row cache for animal {animal_id}: {e}", exc_info=True)
+
+
+def evict_all():
+    """遞增世代號，使全部片段失效 (例如館別改名)。"""
+    try:
+        _incr(GENERATION_KEY)
+    except Exception as e:
+        logger.error(f"Error evicting all animal row cache entries: {e}", exc_info=True)
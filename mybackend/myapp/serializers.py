@@ -5,3 +5,30 @@ class AnimalSerializer(serializers.ModelSerializer):
     class Meta:
         model = Animal
         fields = '__all__'
+
+
+class AnimalRowSerializer(serializers.ModelSerializer):
+    """
+    美容師列表單行的精簡 JSON (format=json)，欄位對應 _animal_table_rows.html 中與使用者無關的部分。
+    時段由 context['slots_by_animal'] ({animal_id: time_slots}) 提供；待約/筆記另放在 user_state。
+    """
+    hall_id = serializers.IntegerField(read_only=True, allow_null=True)
+    hall_name = serializers.CharField(source='hall.name', default='', read_only=True)
+    size = serializers.CharField(source='size_display', read_only=True)
+    photo_url = serializers.SerializerMethodField()
+    review_count = serializers.IntegerField(source='approved_review_count', read_only=True)
+    time_slots = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Animal
+        fields = [
+            'id', 'name', 'hall_id', 'hall_name', 'size', 'fee', 'introduction', 'photo_url',
+            'is_newcomer', 'is_hot', 'is_exclusive', 'is_hidden_edition', 'review_count', 'time_slots',
+        ]
+        read_only_fields = fields
+
+    def get_photo_url(self, animal):
+        return animal.photo.url if animal.photo else ''
+
+    def get_time_slots(self, animal):
+        return self.context.get('slots_by_animal', {}).get(animal.id) or ''
@@ -1,9 +1,10 @@
 # D:\bkgg\mybackend\myapp\signals.py
 
-from django.db.models.signals import pre_save, post_save
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
 from django.dispatch import receiver
 from django.conf import settings
 from django.utils import timezone
+from django.db import transaction
 from django.db.models import F
 from datetime import timedelta
 import logging
@@ -11,15 +12,32 @@ import logging
 # 導入需要用到的模型
 # Important: Use try-except for models to prevent server startup error if models change later
 try:
-    from .models import Review, StoryReview, UserProfile
+    from .models import Review, StoryReview, UserProfile, Animal, Hall, UserTitleRule, ReviewFeedback, UserContributionStats, PendingAppointment, Note
 except ImportError:
     # Handle cases where models might not be ready during initial migrations etc.
     Review = None
     StoryReview = None
     UserProfile = None
+    Animal = None
+    Hall = None
+    UserTitleRule = None
+    ReviewFeedback = None
+    UserContributionStats = None
+    PendingAppointment = None
+    Note = None
     print("WARNING [signals.py]: Could not import models. Signals might not connect correctly yet.")
 
 
+try:
+    from schedule_parser.models import DailySchedule
+    from schedule_parser.signals import daily_schedule_changed
+except ImportError:
+    DailySchedule = None
+    daily_schedule_changed = None
+
+from . import row_cache, data_version, leaderboard, active_stories, profile_stats
+from .utils import invalidate_title_cache
+
 logger = logging.getLogger(__name__)
 
 # --- 定義獎勵常量 ---
@@ -84,6 +102,16 @@ if Review and UserProfile:
             if not instance.approved_at: instance.approved_at = timezone.now()
             logger.info(f"[PRE_SAVE][signals.py] Review (New): Created as approved.")
 
+        # 貢獻計數的增減於 post_save 套用 (見 #6)，避免儲存失敗造成誤差
+        instance._approved_delta = int(bool(instance.approved)) - int(bool(original_instance and original_instance.approved))
+        # Animal 心得統計需重算的美容師 (審核狀態、審核時間或所屬美容師變動)，同樣於 post_save 套用
+        affected_animal_ids = set()
+        if instance._approved_delta or (instance.approved and original_instance and original_instance.approved_at != instance.approved_at):
+            affected_animal_ids.add(instance.animal_id)
+        if original_instance and original_instance.animal_id != instance.animal_id and (original_instance.approved or instance.approved):
+            affected_animal_ids.update({original_instance.animal_id, instance.animal_id})
+        instance._review_stats_animal_ids = affected_animal_ids
+
         if approved_changed_to_true and not instance.reward_granted:
             try:
                 profile = UserProfile.objects.get(user=instance.user)
@@ -123,6 +151,9 @@ if StoryReview and UserProfile:
             if instance.approved_at and not instance.expires_at: instance.expires_at = instance.approved_at + timedelta(hours=24)
             logger.info(f"[PRE_SAVE][signals.py] StoryReview (New): Created approved.")
 
+        # 貢獻計數的增減於 post_save 套用 (見 #6)，避免儲存失敗造成誤差
+        instance._approved_delta = int(bool(instance.approved)) - int(bool(original_instance and original_instance.approved))
+
         current_approved_at = instance.approved_at or (timezone.now() if approved_changed_to_true else None)
         current_expires_at = instance.expires_at or (current_approved_at + timedelta(hours=24) if current_approved_at else None)
         is_valid_for_reward = (approved_changed_to_true and not instance.reward_granted and current_expires_at and current_expires_at > timezone.now())
@@ -140,4 +171,238 @@ if StoryReview and UserProfile:
                 logger.error(f"[PRE_SAVE][signals.py] Error rewarding StoryReview {instance.pk or '(New)'} for {instance.user.username}: {e}", exc_info=True)
         elif approved_changed_to_true and not instance.reward_granted:
              expiry_status = "Not Set" if not current_expires_at else ("Expired" if current_expires_at <= timezone.now() else "Valid")
-             logger.warning(f"[PRE_SAVE][signals.py] StoryReview {instance.pk or '(New)'}: Approved change True but NO reward granted. Reason: reward_granted={instance.reward_granted}, expiry_status={expiry_status} (Expires: {current_expires_at})")
\ No newline at end of file
+             logger.warning(f"[PRE_SAVE][signals.py] StoryReview {instance.pk or '(New)'}: Approved change True but NO reward granted. Reason: reward_granted={instance.reward_granted}, expiry_status={expiry_status} (Expires: {current_expires_at})")
+
+# 4. 美容師列表 HTML 片段快取失效 (myapp.row_cache)
+# Key 本身已包含 updated_at / 時段 / 心得數，這裡只負責主動淘汰舊片段。
+if Animal:
+    @receiver(post_save, sender=Animal)
+    @receiver(post_delete, sender=Animal)
+    def evict_animal_row_cache(sender, instance, **kwargs):
+        row_cache.evict_animals([instance.pk])
+
+if Hall:
+    @receiver(post_save, sender=Hall)
+    @receiver(post_delete, sender=Hall)
+    def evict_hall_row_cache(sender, instance, **kwargs):
+        # 館別名稱/狀態會出現在每一行，直接換世代
+        row_cache.evict_all()
+        data_version.bump(data_version.TOPIC_HALLS)
+
+if DailySchedule:
+    @receiver(post_save, sender=DailySchedule)
+    @receiver(post_delete, sender=DailySchedule)
+    def evict_daily_schedule_row_cache(sender, instance, **kwargs):
+        row_cache.evict_animals([instance.animal_id])
+
+if daily_schedule_changed:
+    # DailySchedule.sync_hall() 以 bulk_create / bulk_update 寫入 (不觸發 post_save)，只淘汰時段實際變動的美容師
+    @receiver(daily_schedule_changed)
+    def evict_synced_schedule_row_cache(sender, hall, diff, **kwargs):
+        row_cache.evict_animals(diff.created + diff.updated)
+
+# 5. 使用者稱號對照表失效 (myapp.utils)
+if UserTitleRule:
+    @receiver(post_save, sender=UserTitleRule)
+    @receiver(post_delete, sender=UserTitleRule)
+    def invalidate_user_title_table(sender, instance, **kwargs):
+        invalidate_title_cache()
+        data_version.bump(data_version.TOPIC_TITLES)
+
+# 名人堂快照存有顯示名稱：改名時更新，刪除時讓下一名遞補 (commit 之後)
+def _run_leaderboard_update(func, *args):
+    try:
+        func(*args)
+    except Exception as e:
+        logger.error(f"Error updating leaderboard ({func.__name__}{args}): {e}", exc_info=True)
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def update_leaderboard_user_name(sender, instance, created, update_fields=None, **kwargs):
+    if created or (update_fields is not None and set(update_fields) <= {'last_login'}): return
+    transaction.on_commit(lambda: _run_leaderboard_update(leaderboard.refresh_user_name, instance))
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def remove_deleted_user_from_leaderboard(sender, instance, **kwargs):
+    user_id = instance.pk
+    transaction.on_commit(lambda: _run_leaderboard_update(leaderboard.remove_user, user_id))
+
+# 個人檔案統計快取 (myapp.profile_stats)，commit 之後失效，避免併發的讀取把尚未 commit 的舊值寫回快取
+def _invalidate_profile_stats(user_id):
+    transaction.on_commit(lambda: profile_stats.invalidate(user_id))
+
+# 6. 使用者貢獻計數 (UserContributionStats)
+# 心得/動態的審核狀態變化由上方 pre_save 記錄在 instance._approved_delta；回饋則依收到者增減。
+if UserContributionStats:
+    def _bump_contribution_stats(user_id, **deltas):
+        try:
+            UserContributionStats.bump(user_id, **deltas)
+        except Exception as e:
+            logger.error(f"Error updating contribution stats for user {user_id} ({deltas}): {e}", exc_info=True)
+            return
+        # 名人堂快照在 commit 之後增量更新 (只有可能影響排名時才重算該類別)
+        fields = [field for field, delta in deltas.items() if delta]
+        if user_id and fields: _invalidate_profile_stats(user_id) # bump() 以 queryset.update 寫入，不會觸發 post_save
+        if user_id and fields: transaction.on_commit(lambda: _run_leaderboard_update(leaderboard.refresh_for_user, user_id, fields))
+
+    if Review:
+        @receiver(post_save, sender=Review)
+        def update_stats_on_review_save(sender, instance, **kwargs):
+            delta = getattr(instance, '_approved_delta', 0)
+            if delta:
+                instance._approved_delta = 0
+                _bump_contribution_stats(instance.user_id, approved_reviews=delta)
+
+        @receiver(post_delete, sender=Review)
+        def update_stats_on_review_delete(sender, instance, **kwargs):
+            if instance.approved: _bump_contribution_stats(instance.user_id, approved_reviews=-1)
+
+    if StoryReview:
+        @receiver(post_save, sender=StoryReview)
+        def update_stats_on_story_save(sender, instance, **kwargs):
+            delta = getattr(instance, '_approved_delta', 0)
+            if delta:
+                instance._approved_delta = 0
+                _bump_contribution_stats(instance.user_id, approved_stories=delta)
+
+        @receiver(post_delete, sender=StoryReview)
+        def update_stats_on_story_delete(sender, instance, **kwargs):
+            if instance.approved: _bump_contribution_stats(instance.user_id, approved_stories=-1)
+
+    if ReviewFeedback:
+        def _feedback_recipient_id(feedback):
+            # view 傳入的 review/story_review 物件已載入時不必再查詢
+            for field_name, model in (('review', Review), ('story_review', StoryReview)):
+                target_id = getattr(feedback, f'{field_name}_id')
+                if not target_id: continue
+                if ReviewFeedback._meta.get_field(field_name).is_cached(feedback):
+                    return getattr(feedback, field_name).user_id
+                return model.objects.filter(pk=target_id).values_list('user_id', flat=True).first()
+            return None
+
+        @receiver(post_save, sender=ReviewFeedback)
+        def update_stats_on_feedback_save(sender, instance, created, **kwargs):
+            field = UserContributionStats.FEEDBACK_COUNTER_FIELDS.get(instance.feedback_type)
+            if created and field: _bump_contribution_stats(_feedback_recipient_id(instance), **{field: 1})
+
+        # 刪除心得時 cascade 刪除的回饋，post_delete 時心得可能已被刪除：收到者在 pre_delete (尚未刪除任何資料) 先查好
+        @receiver(pre_delete, sender=ReviewFeedback)
+        def remember_feedback_recipient(sender, instance, **kwargs):
+            if UserContributionStats.FEEDBACK_COUNTER_FIELDS.get(instance.feedback_type):
+                instance._recipient_id = _feedback_recipient_id(instance)
+
+        @receiver(post_delete, sender=ReviewFeedback)
+        def update_stats_on_feedback_delete(sender, instance, **kwargs):
+            field = UserContributionStats.FEEDBACK_COUNTER_FIELDS.get(instance.feedback_type)
+            recipient_id = instance._recipient_id if hasattr(instance, '_recipient_id') else _feedback_recipient_id(instance)
+            if field: _bump_contribution_stats(recipient_id, **{field: -1})
+
+# 7. 美容師心得統計 (Animal.approved_review_count / last_review_approved_at)
+if Review and Animal:
+    def _refresh_animal_review_stats(animal_ids):
+        try:
+            Animal.refresh_review_stats(animal_ids)
+        except Exception as e:
+            logger.error(f"Error refreshing review stats for animals {animal_ids}: {e}", exc_info=True)
+
+    @receiver(post_save, sender=Review)
+    def update_animal_stats_on_review_save(sender, instance, **kwargs):
+        animal_ids = getattr(instance, '_review_stats_animal_ids', None)
+        if animal_ids:
+            instance._review_stats_animal_ids = set()
+            _refresh_animal_review_stats(animal_ids)
+
+    @receiver(post_delete, sender=Review)
+    def update_animal_stats_on_review_delete(sender, instance, **kwargs):
+        if instance.approved: _refresh_animal_review_stats([instance.animal_id])
+
+# 8. 心得回饋計數 (Review / StoryReview 的 good_to_have_you_count / good_looking_count)，讀取時不必再 COUNT 回饋表
+# 與回饋寫入在同一個交易中以 F() 增減；刪除心得時 cascade 刪除的回饋只會更新到 0 列
+if Review and StoryReview and ReviewFeedback:
+    def _bump_feedback_count(feedback, delta):
+        target_model, target_id = (Review, feedback.review_id) if feedback.review_id else (StoryReview, feedback.story_review_id)
+        if not target_id: return
+        try:
+            target_model.bump_feedback_count(target_id, feedback.feedback_type, delta)
+        except Exception as e:
+            logger.error(f"Error updating feedback count for {target_model.__name__} {target_id}: {e}", exc_info=True)
+
+    @receiver(post_save, sender=ReviewFeedback)
+    def update_feedback_count_on_save(sender, instance, created, **kwargs):
+        if created: _bump_feedback_count(instance, 1)
+
+    @receiver(post_delete, sender=ReviewFeedback)
+    def update_feedback_count_on_delete(sender, instance, **kwargs):
+        _bump_feedback_count(instance, -1)
+
+# 9. 有效限時動態工作集 (myapp.active_stories)：審核狀態或顯示資料變動時於 commit 之後重算 (同一個交易只重算一次)；
+#    到期的動態由讀取端移除。美容師/館別/作者只在限時動態會顯示的欄位變動時才重算 (例如調整價格、推薦不重算)。
+def _changed_story_display_fields(sender, instance, fields, update_fields):
+    """回傳 fields (限時動態顯示的欄位) 中有變動的欄位名稱；update_fields 不含這些欄位時不查詢原值。"""
+    if update_fields is not None: fields = [f for f in fields if f in update_fields or sender._meta.get_field(f).attname in update_fields]
+    if not fields or not instance.pk: return set()
+    attnames = {f: sender._meta.get_field(f).attname for f in fields}
+    original = sender.objects.filter(pk=instance.pk).values(*attnames.values()).first()
+    if original is None: return set()
+    return {f for f, attname in attnames.items() if original[attname] != getattr(instance, attname)}
+
+def _story_display_receiver(fields):
+    """pre_save receiver：把變動的顯示欄位記在 instance._story_display_changed，post_save 時判斷是否需要重算。"""
+    def remember_story_display_changes(sender, instance, raw=False, update_fields=None, **kwargs):
+        instance._story_display_changed = set() if raw else _changed_story_display_fields(sender, instance, fields, update_fields)
+    return remember_story_display_changes
+
+if StoryReview:
+    @receiver(post_save, sender=StoryReview)
+    def refresh_active_stories_on_story_save(sender, instance, **kwargs):
+        if instance.approved or active_stories.references(story_id=instance.pk): active_stories.refresh_on_commit()
+
+    @receiver(post_delete, sender=StoryReview)
+    def refresh_active_stories_on_story_delete(sender, instance, **kwargs):
+        if active_stories.references(story_id=instance.pk): active_stories.refresh_on_commit()
+
+if Animal:
+    pre_save.connect(_story_display_receiver(('name', 'photo', 'hall', 'is_active')), sender=Animal, weak=False)
+
+    @receiver(post_save, sender=Animal)
+    def refresh_active_stories_on_animal_save(sender, instance, created, **kwargs):
+        changed = getattr(instance, '_story_display_changed', set())
+        if created or not changed: return
+        # 重新啟用的美容師可能有尚未出現在工作集中的動態
+        if ('is_active' in changed and instance.is_active) or active_stories.references(animal_id=instance.pk): active_stories.refresh_on_commit()
+
+    @receiver(post_delete, sender=Animal)
+    def refresh_active_stories_on_animal_delete(sender, instance, **kwargs):
+        if active_stories.references(animal_id=instance.pk): active_stories.refresh_on_commit()
+
+if Hall:
+    pre_save.connect(_story_display_receiver(('name', 'is_active')), sender=Hall, weak=False)
+
+    @receiver(post_save, sender=Hall)
+    def refresh_active_stories_on_hall_save(sender, instance, created, **kwargs):
+        changed = getattr(instance, '_story_display_changed', set())
+        if created or not changed: return
+        if ('is_active' in changed and instance.is_active) or active_stories.references(hall_id=instance.pk): active_stories.refresh_on_commit()
+
+    @receiver(post_delete, sender=Hall)
+    def refresh_active_stories_on_hall_delete(sender, instance, **kwargs):
+        if active_stories.references(hall_id=instance.pk): active_stories.refresh_on_commit()
+
+pre_save.connect(_story_display_receiver(('username', 'first_name')), sender=settings.AUTH_USER_MODEL, weak=False)
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def refresh_active_stories_on_user_save(sender, instance, created, **kwargs):
+    if created or not getattr(instance, '_story_display_changed', set()): return
+    if active_stories.references(user_id=instance.pk): active_stories.refresh_on_commit()
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def refresh_active_stories_on_user_delete(sender, instance, **kwargs):
+    if active_stories.references(user_id=instance.pk): active_stories.refresh_on_commit()
+
+# 10. 個人檔案統計快取失效：慾望幣 (UserProfile)、貢獻計數 (見 #6)、待約與筆記數
+def invalidate_profile_stats_on_change(sender, instance, **kwargs):
+    _invalidate_profile_stats(instance.user_id)
+
+for _model in (UserProfile, UserContributionStats, PendingAppointment, Note):
+    if _model:
+        post_save.connect(invalidate_profile_stats_on_change, sender=_model)
+        post_delete.connect(invalidate_profile_stats_on_change, sender=_model)
@@ -44,6 +44,69 @@ const csrfToken = DJANGO_CONTEXT.csrfToken || getCookie('csrftoken'); // Fallbac
 const URLS = DJANGO_CONTEXT.urls || {}; // Access URLs like URLS.add_pending
 const isLoggedIn = DJANGO_CONTEXT.isLoggedIn || false; // Get boolean directly
 
+// --- Animal row JSON (format=json, client-side rendering) ---
+// DJANGO_CONTEXT.rowFormat === 'json' 時列表改向伺服器要精簡的 JSON 資料列，在這裡組成與 _animal_table_rows.html 相同的 <tr>
+const ROW_FORMAT = DJANGO_CONTEXT.rowFormat === 'json' ? 'json' : 'html';
+
+function withRowFormat(url) {
+    if (!url || ROW_FORMAT !== 'json') return url;
+    return url + (url.includes('?') ? '&' : '?') + 'format=json';
+}
+
+// 與 schedule_filters.format_slots 相同的轉換 (12-23 -> 12-23, 100 -> 24, 101... -> 01...)
+function formatSlotsHtml(value) {
+    const text = (value || '').trim();
+    if (text === '預約滿') return '<span class="time-slot" style="color: red; font-weight: bold;">預約滿</span>';
+    if (text === '人到再約') return '<span class="time-slot" style="color: orange;">人到再約</span>';
+    if (!text) return '';
+    const spans = [];
+    text.split('.').forEach(token => {
+        const cleaned = token.trim();
+        if (!/^[-+]?\d+$/.test(cleaned)) return;
+        const num = parseInt(cleaned, 10);
+        let display = null;
+        if (num >= 12 && num <= 23) display = String(num).padStart(2, '0');
+        else if (num === 100) display = '24';
+        else if (num > 100) display = String(num - 100).padStart(2, '0');
+        if (display !== null) spans.push(`<span class="time-slot">${display}</span>`);
+    });
+    return spans.length ? spans.join('') : `<span class="time-slot other-status">${escapeHtml(text)}</span>`;
+}
+
+function renderAnimalRowsFromJson(data) {
+    const userState = data.user_state || { pending_ids: [], notes: {} };
+    const pendingIds = new Set((userState.pending_ids || []).map(String));
+    const notes = userState.notes || {};
+    return (data.rows || []).map(row => {
+        const animalId = String(row.id);
+        const isPending = pendingIds.has(animalId);
+        const note = isLoggedIn ? notes[animalId] : null;
+        const labels = [
+            row.is_newcomer ? '<span class="label newcomer">新人</span>' : '',
+            row.is_hot ? '<span class="label hot">熱門</span>' : '',
+            row.is_exclusive ? '<span class="label exclusive">獨家</span>' : '',
+            row.is_hidden_edition ? '<span class="label hidden-edition">隱藏版</span>' : '',
+        ].join('');
+        const noteAttrs = note ? ` data-note-id="${escapeHtml(note.id)}" data-note-content="${escapeHtml(note.content)}"` : '';
+        const noteRow = note ? `<tr class="note-row" data-animal-id="${escapeHtml(animalId)}" style="display: none;"><td></td><td colspan="4"><div class="note-box">${escapeHtml(note.content)}</div></td></tr>` : '';
+        return `<tr data-photo-url="${escapeHtml(row.photo_url)}" data-introduction="${escapeHtml(row.introduction || '')}" data-animal-id="${escapeHtml(animalId)}" data-hall="${escapeHtml(row.hall_name || '')}" data-review-count="${escapeHtml(row.review_count || 0)}" data-pending="${isPending ? 'true' : 'false'}"${noteAttrs}>`
+            + `<td><button class="circle-btn plus-menu-btn" aria-label="更多選項">+</button></td>`
+            + `<td><div class="beautician-cell"><div class="labels">${labels}</div><div class="beautician-text"><div class="name-container"><span class="name">${escapeHtml(row.name)}</span></div><div class="size-container"><span class="size">${escapeHtml(row.size || '')}</span></div></div></div></td>`
+            + `<td class="time-cell">${formatSlotsHtml(row.time_slots)}</td>`
+            + `<td class="fee-cell">${row.fee ? escapeHtml(row.fee) : '--'} <span class="hall-name">${escapeHtml(row.hall_name || '')}</span></td>`
+            + `<td class="review-count-cell"><button class="review-count-btn" data-animal-id="${escapeHtml(animalId)}">${escapeHtml(row.review_count || 0)}</button></td>`
+            + `</tr>${noteRow}`;
+    }).join('');
+}
+
+// 列表回應若是 JSON 資料列 (沒有 table_html)，先在前端渲染成 table_html，後續流程不變
+function ensureTableHtml(data) {
+    if (data && data.table_html === undefined && Array.isArray(data.rows)) {
+        data.table_html = data.rows.length ? renderAnimalRowsFromJson(data) : (data.message ? `<tr class="empty-table-message"><td colspan="5">${escapeHtml(data.message)}</td></tr>` : '');
+    }
+    return data;
+}
+
 // --- Main Application Logic ---
 document.addEventListener('DOMContentLoaded', function() {
     const bottomOverlay = document.getElementById('bottomOverlay');
@@ -755,14 +818,110 @@ document.addEventListener('DOMContentLoaded', function() {
     }
 
     // --- loadReviews function ---
-    function loadReviews(animalId) {
+    // 心得列表以 cursor 分頁：第一頁清空列表，之後的頁面附加在後面 (捲到底或點「載入更多」)
+    let reviewFeedObserver = null;
+
+    function buildReviewCard(review) {
+        const card = document.createElement('div');
+        card.className = 'review-card';
+        card.dataset.reviewId = review.id;
+        card.dataset.authorId = review.author_id || 'none';
+
+        const userTitleSpan = review.user_title ? `<span class="review-user-title">${escapeHtml(review.user_title)}</span>` : '';
+
+        const createReviewLine = (label, value) => {
+            if (value === null || value === undefined || value === '' || (typeof value === 'string' && value.trim() === '')) return '';
+            let displayValue = value;
+            if (['臉蛋', '氣質', '尺度'].includes(label) && typeof value === 'string') {
+                 displayValue = value.split(',').map(s => s.trim()).filter(s => s).join(', ');
+            }
+            if (label === '罩杯' && typeof value === 'object') {
+                displayValue = `${value.cup || ''}${value.cup && value.cup_size ? ' - ' : ''}${value.cup_size || ''}`.trim();
+                if (!displayValue) return '';
+            }
+             if ((label === '音樂' || label === '體育') && typeof value === 'object') {
+                displayValue = `${value.type || ''}${value.type && value.price ? ` (${value.price})` : ''}`.trim();
+                if (!displayValue) return '';
+            }
+             const valueSpan = document.createElement('span');
+             valueSpan.className = 'review-value';
+             const decodedDisplayValue = decodeUnicodeEscapes(displayValue);
+             valueSpan.textContent = decodedDisplayValue;
+            return `<div class="review-line"><span class="review-label">${escapeHtml(label)}:</span>${valueSpan.outerHTML}</div>`;
+        };
+
+        // MODIFIED: Feedback buttons text
+        const feedbackButtonsHTML = `
+            <div class="review-feedback-buttons">
+                <button class="feedback-btn" data-review-id="${review.id}" data-type="good_to_have_you" ${USER_ID === review.author_id ? 'disabled' : ''}>
+                    <i class="fas fa-heart"></i> 好人
+                    <span class="feedback-count" id="count-gthy-${review.id}">${review.good_to_have_you_count || 0}</span>
+                </button>
+                <button class="feedback-btn" data-review-id="${review.id}" data-type="good_looking" ${USER_ID === review.author_id ? 'disabled' : ''}>
+                    <i class="fas fa-thumbs-up"></i> 帥哥
+                    <span class="feedback-count" id="count-gl-${review.id}">${review.good_looking_count || 0}</span>
+                </button>
+            </div>
+        `;
+
+        card.innerHTML = `
+            <div class="review-header">
+                <div class="review-user-info">
+                    <span class="review-user">${escapeHtml(review.user || '匿名用戶')}</span>
+                    ${userTitleSpan}
+                </div>
+                <span class="review-date">${escapeHtml(review.display_date || '日期未知')}</span>
+            </div>
+            <div class="review-body">
+                ${createReviewLine('年紀', review.age)}
+                ${createReviewLine('顏值', review.looks)}
+                ${createReviewLine('臉蛋', review.face)}
+                ${createReviewLine('氣質', review.temperament)}
+                ${createReviewLine('體態', review.physique)}
+                ${createReviewLine('罩杯', { cup: review.cup, cup_size: review.cup_size })}
+                ${createReviewLine('膚質', review.skin_texture)}
+                ${createReviewLine('膚色', review.skin_color)}
+                ${createReviewLine('音樂', { type: review.music, price: review.music_price })}
+                ${createReviewLine('體育', { type: review.sports, price: review.sports_price })}
+                ${createReviewLine('尺度', review.scale)}
+                ${createReviewLine('心得', review.content)}
+                ${feedbackButtonsHTML}
+            </div>
+        `;
+        return card;
+    }
+
+    function appendReviewLoadMore(reviewList, animalId, nextCursor) {
+        const button = document.createElement('button');
+        button.type = 'button';
+        button.className = 'review-load-more';
+        button.textContent = '載入更多心得';
+        button.addEventListener('click', () => loadReviews(animalId, nextCursor));
+        reviewList.appendChild(button);
+        if ('IntersectionObserver' in window) {
+            reviewFeedObserver = new IntersectionObserver(entries => {
+                if (entries.some(entry => entry.isIntersecting)) button.click();
+            }, { root: reviewList.closest('.modal-body') || null, rootMargin: '200px' });
+            reviewFeedObserver.observe(button);
+        }
+    }
+
+    function loadReviews(animalId, cursor = null) {
         const reviewList = document.getElementById('reviewList');
         if (!reviewList) return;
-        reviewList.innerHTML = '<p>載入心得中...</p>'; // Loading indicator
+        if (reviewFeedObserver) { reviewFeedObserver.disconnect(); reviewFeedObserver = null; }
+        const loadMoreButton = reviewList.querySelector('.review-load-more');
+        if (cursor) {
+            if (!loadMoreButton || loadMoreButton.disabled) return; // 已在載入中
+            loadMoreButton.disabled = true; loadMoreButton.textContent = '載入中...';
+        } else {
+            reviewList.innerHTML = '<p>載入心得中...</p>'; // Loading indicator
+        }
+        reviewList.dataset.animalId = animalId;
 
         const baseUrl = URLS.add_review;
         if (!baseUrl) { console.error("Review URL not found"); reviewList.innerHTML = '<p>錯誤：URL配置錯誤</p>'; return; }
-        const url = `${baseUrl}?animal_id=${animalId}`;
+        const url = `${baseUrl}?animal_id=${animalId}${cursor ? `&cursor=${encodeURIComponent(cursor)}` : ''}`;
 
         fetch(url, {
             method: 'GET',
@@ -783,83 +942,21 @@ document.addEventListener('DOMContentLoaded', function() {
             return response.json();
         })
         .then(data => {
-            reviewList.innerHTML = "";
+            if (reviewList.dataset.animalId !== String(animalId)) return; // 已切換到其他美容師
+            if (cursor) { loadMoreButton?.remove(); } else { reviewList.innerHTML = ""; }
             if (data?.reviews?.length > 0) {
-                data.reviews.forEach(review => {
-                    const card = document.createElement('div');
-                    card.className = 'review-card';
-                    card.dataset.reviewId = review.id;
-                    card.dataset.authorId = review.author_id || 'none';
-
-                    const userTitleSpan = review.user_title ? `<span class="review-user-title">${escapeHtml(review.user_title)}</span>` : '';
-
-                    const createReviewLine = (label, value) => {
-                        if (value === null || value === undefined || value === '' || (typeof value === 'string' && value.trim() === '')) return '';
-                        let displayValue = value;
-                        if (['臉蛋', '氣質', '尺度'].includes(label) && typeof value === 'string') {
-                             displayValue = value.split(',').map(s => s.trim()).filter(s => s).join(', ');
-                        }
-                        if (label === '罩杯' && typeof value === 'object') {
-                            displayValue = `${value.cup || ''}${value.cup && value.cup_size ? ' - ' : ''}${value.cup_size || ''}`.trim();
-                            if (!displayValue) return '';
-                        }
-                         if ((label === '音樂' || label === '體育') && typeof value === 'object') {
-                            displayValue = `${value.type || ''}${value.type && value.price ? ` (${value.price})` : ''}`.trim();
-                            if (!displayValue) return '';
-                        }
-                         const valueSpan = document.createElement('span');
-                         valueSpan.className = 'review-value';
-                         const decodedDisplayValue = decodeUnicodeEscapes(displayValue);
-                         valueSpan.textContent = decodedDisplayValue;
-                        return `<div class="review-line"><span class="review-label">${escapeHtml(label)}:</span>${valueSpan.outerHTML}</div>`;
-                    };
-
-                    // MODIFIED: Feedback buttons text
-                    const feedbackButtonsHTML = `
-                        <div class="review-feedback-buttons">
-                            <button class="feedback-btn" data-review-id="${review.id}" data-type="good_to_have_you" ${USER_ID === review.author_id ? 'disabled' : ''}>
-                                <i class="fas fa-heart"></i> 好人
-                                <span class="feedback-count" id="count-gthy-${review.id}">${review.good_to_have_you_count || 0}</span>
-                            </button>
-                            <button class="feedback-btn" data-review-id="${review.id}" data-type="good_looking" ${USER_ID === review.author_id ? 'disabled' : ''}>
-                                <i class="fas fa-thumbs-up"></i> 帥哥
-                                <span class="feedback-count" id="count-gl-${review.id}">${review.good_looking_count || 0}</span>
-                            </button>
-                        </div>
-                    `;
-
-                    card.innerHTML = `
-                        <div class="review-header">
-                            <div class="review-user-info">
-                                <span class="review-user">${escapeHtml(review.user || '匿名用戶')}</span>
-                                ${userTitleSpan}
-                            </div>
-                            <span class="review-date">${escapeHtml(review.display_date || '日期未知')}</span>
-                        </div>
-                        <div class="review-body">
-                            ${createReviewLine('年紀', review.age)}
-                            ${createReviewLine('顏值', review.looks)}
-                            ${createReviewLine('臉蛋', review.face)}
-                            ${createReviewLine('氣質', review.temperament)}
-                            ${createReviewLine('體態', review.physique)}
-                            ${createReviewLine('罩杯', { cup: review.cup, cup_size: review.cup_size })}
-                            ${createReviewLine('膚質', review.skin_texture)}
-                            ${createReviewLine('膚色', review.skin_color)}
-                            ${createReviewLine('音樂', { type: review.music, price: review.music_price })}
-                            ${createReviewLine('體育', { type: review.sports, price: review.sports_price })}
-                            ${createReviewLine('尺度', review.scale)}
-                            ${createReviewLine('心得', review.content)}
-                            ${feedbackButtonsHTML}
-                        </div>
-                    `;
-                    reviewList.appendChild(card);
-                });
-            } else {
+                data.reviews.forEach(review => reviewList.appendChild(buildReviewCard(review)));
+                if (data.next_cursor) appendReviewLoadMore(reviewList, animalId, data.next_cursor);
+            } else if (!cursor) {
                 reviewList.innerHTML = '<p>目前沒有相關評論。</p>';
             }
         })
         .catch(error => {
             console.error("Load Reviews Error:", error);
+            if (cursor && loadMoreButton?.isConnected) {
+                loadMoreButton.disabled = false; loadMoreButton.textContent = '載入失敗，點此重試';
+                return;
+            }
             reviewList.innerHTML = `<p>載入心得時發生錯誤: ${error.message}</p>`;
         });
     }
@@ -987,7 +1084,7 @@ document.addEventListener('DOMContentLoaded', function() {
 
          const baseUrl = URLS.ajax_get_daily_schedule;
          if (!baseUrl) { console.error("Daily schedule URL not found"); tbody.innerHTML = `<tr class="empty-table-message"><td colspan="5">錯誤：URL配置錯誤</td></tr>`; return; }
-         const url = `${baseUrl}?hall_id=${hallId}`;
+         const url = withRowFormat(`${baseUrl}?hall_id=${hallId}`);
 
          fetch(url, {
              headers: {
@@ -1002,7 +1099,7 @@ document.addEventListener('DOMContentLoaded', function() {
              return response.json();
          })
          .then(data => {
-             if (data.table_html !== undefined) {
+             if (ensureTableHtml(data).table_html !== undefined) {
                  tbody.innerHTML = data.table_html || '<tr class="empty-table-message"><td colspan="5">此館別目前無班表</td></tr>';
                  processTimeSlotCellsInContainer(tbody);
 
@@ -1055,7 +1152,7 @@ document.addEventListener('DOMContentLoaded', function() {
 
          const baseUrl = URLS.ajax_get_my_notes;
          if (!baseUrl) { console.error("My Notes URL not found"); tbody.innerHTML = `<tr class="empty-table-message"><td colspan="5">錯誤：URL配置錯誤</td></tr>`; return; }
-         const url = `${baseUrl}?hall_id=${hallId}`;
+         const url = withRowFormat(`${baseUrl}?hall_id=${hallId}`);
 
          fetch(url, {
              headers: {
@@ -1070,7 +1167,7 @@ document.addEventListener('DOMContentLoaded', function() {
              return response.json();
          })
          .then(data => {
-             if (data.table_html !== undefined) {
+             if (ensureTableHtml(data).table_html !== undefined) {
                  tbody.innerHTML = data.table_html || `<tr class="empty-table-message"><td colspan="5">${hallId === 'all' ? '尚無筆記' : '此館別尚無筆記'}</td></tr>`;
                  processTimeSlotCellsInContainer(tbody);
 
@@ -1131,7 +1228,7 @@ document.addEventListener('DOMContentLoaded', function() {
         updateIntroArea(introArea, '載入中...');
         if (checkbox) checkbox.disabled = true;
 
-        fetch(ajaxUrl, {
+        fetch(withRowFormat(ajaxUrl), {
             headers: {
                 'X-Requested-With': 'XMLHttpRequest',
                 'Accept': 'application/json'
@@ -1144,7 +1241,7 @@ document.addEventListener('DOMContentLoaded', function() {
             return response.json();
         })
         .then(data => {
-            if (data.table_html !== undefined) {
+            if (ensureTableHtml(data).table_html !== undefined) {
                 tableBody.innerHTML = data.table_html || `<tr class="empty-table-message"><td colspan="5">列表是空的</td></tr>`;
                 processTimeSlotCellsInContainer(tableBody);
 
@@ -1786,7 +1883,7 @@ document.addEventListener('DOMContentLoaded', function() {
 
          const baseUrl = URLS.ajax_search_beauticians;
          if (!baseUrl) { console.error("Search URL not found"); tbody.innerHTML = `<tr class="empty-table-message"><td colspan="5">錯誤：URL配置錯誤</td></tr>`; if(checkbox) checkbox.disabled = false; return; }
-         const url = `${baseUrl}?${params.toString()}`;
+         const url = withRowFormat(`${baseUrl}?${params.toString()}`);
 
         fetch(url, {
             headers: {
@@ -1805,7 +1902,7 @@ document.addEventListener('DOMContentLoaded', function() {
             return response.json();
         })
         .then(data => {
-            if (data.table_html !== undefined) {
+            if (ensureTableHtml(data).table_html !== undefined) {
                 tbody.innerHTML = data.table_html || '<tr class="empty-table-message"><td colspan="5">找不到符合條件的美容師</td></tr>';
                 processTimeSlotCellsInContainer(tbody);
 
@@ -1938,7 +2035,7 @@ document.addEventListener('DOMContentLoaded', function() {
             if (checkbox) checkbox.disabled = false;
             return;
         }
-        const url = `${baseUrl}?date=${dateString}`;
+        const url = withRowFormat(`${baseUrl}?date=${dateString}`);
 
         fetch(url, { headers: { 'X-Requested-With': 'XMLHttpRequest', 'Accept': 'application/json' } })
             .then(response => {
@@ -1948,7 +2045,7 @@ document.addEventListener('DOMContentLoaded', function() {
                 return response.json();
             })
             .then(data => {
-                if (data.table_html !== undefined) {
+                if (ensureTableHtml(data).table_html !== undefined) {
                     tbody.innerHTML = data.table_html || `<tr class="empty-table-message"><td colspan="5">此日期目前無可預約時段</td></tr>`;
                     processTimeSlotCellsInContainer(tbody);
 
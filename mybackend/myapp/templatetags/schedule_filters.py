@@ -1,68 +1,108 @@
 # D:\bkgg\mybackend\myapp\templatetags\schedule_filters.py
 from django import template
-import re
+from django.conf import settings
 from django.utils.safestring import mark_safe
+from functools import lru_cache
 import html
 import logging
+import threading
+import time
 
 register = template.Library()
 logger = logging.getLogger(__name__)
 
-@register.filter(name='format_slots', is_safe=True)
-def format_slots(value):
-    """
-    將內部時段字串 (e.g., "14.23.100.101") 轉換為顯示格式 (e.g., "14", "23", "24", "01")。
-    處理特殊值如 '預約滿', '人到再約', 空值。
-    修正：確保 100 顯示為 24，>100 顯示為 01, 02...
-    """
-    if value is None: value = ""
-    if not isinstance(value, str):
-        try: value = str(value)
-        except Exception: logger.warning(f"無法轉換 format_slots 輸入 '{value}' 為字串"); return "--"
-    value_stripped = value.strip()
+# --- 設定 ---
+# 同一個時段字串只轉換一次 (LRU，以原始字串為 key)；每日班表的相異字串數量很少
+FORMAT_SLOTS_CACHE_SIZE = getattr(settings, 'FORMAT_SLOTS_CACHE_SIZE', 4096)
+# 非預期內部值的警告：可關閉，開啟時每個間隔最多輸出一則 (其餘計數後合併在下一則)
+FORMAT_SLOTS_LOG_WARNINGS = getattr(settings, 'FORMAT_SLOTS_LOG_WARNINGS', True)
+FORMAT_SLOTS_WARNING_INTERVAL = getattr(settings, 'FORMAT_SLOTS_WARNING_INTERVAL', 60)
 
-    if value_stripped == "預約滿": return mark_safe('<span class="time-slot" style="color: red; font-weight: bold;">預約滿</span>')
-    elif value_stripped == "人到再約": return mark_safe('<span class="time-slot" style="color: orange;">人到再約</span>')
-    elif not value_stripped: return "" # 或 "--"
+_warning_lock = threading.Lock()
+_last_warning_at = None
+_suppressed_warnings = 0
+
+
+def _warn(message):
+    global _last_warning_at, _suppressed_warnings
+    if not FORMAT_SLOTS_LOG_WARNINGS: return
+    now = time.monotonic()
+    with _warning_lock:
+        if _last_warning_at is not None and now - _last_warning_at < FORMAT_SLOTS_WARNING_INTERVAL:
+            _suppressed_warnings += 1
+            return
+        suppressed, _suppressed_warnings, _last_warning_at = _suppressed_warnings, 0, now
+    if suppressed: message += f" (另有 {suppressed} 則 format_slots 警告已略過)"
+    logger.warning(message)
 
-    processed_display_slots = []
-    # 假設數據庫存儲的是點分隔的內部值 (12-23, 100-105...)，且已排序
-    internal_slots = value_stripped.split('.')
 
-    for s in internal_slots:
+def _display_hour(num):
+    """內部值 (12-23, 100, 101...) -> 顯示字串；非預期值回傳 None。"""
+    if 12 <= num <= 23: return f"{num:02d}" # 當天時段 12:00 - 23:00
+    if num == 100: return "24"               # 內部值 100 代表 24:00 (或 00:00)
+    if num > 100: return f"{num - 100:02d}"  # 內部值 > 100 代表凌晨 01:00, 02:00...
+    return None
+
+
+@lru_cache(maxsize=FORMAT_SLOTS_CACHE_SIZE)
+def _format_slots_html(value_stripped):
+    """已去除前後空白的時段字串 -> HTML 字串 (結果以 LRU 快取，警告只在第一次轉換時發生)。"""
+    if value_stripped == "預約滿": return '<span class="time-slot" style="color: red; font-weight: bold;">預約滿</span>'
+    if value_stripped == "人到再約": return '<span class="time-slot" style="color: orange;">人到再約</span>'
+    if not value_stripped: return ""
+
+    # 假設數據庫存儲的是點分隔的內部值 (12-23, 100-105...)，且已排序
+    slot_spans = []
+    for s in value_stripped.split('.'):
         s_cleaned = s.strip()
         if not s_cleaned: continue
         try:
-            num = int(s_cleaned) # 讀取內部值 (12-23, 100, 101, 102...)
-
-            # --- *** 再次修正：根據內部值轉換為正確的顯示值 *** ---
-            display_hour_str = ""
-            if 12 <= num <= 23: # 當天時段 12:00 - 23:00
-                display_hour_str = f"{num:02d}" # 顯示 "12" - "23"
-            elif num == 100:    # 內部值 100 代表 24:00 (或 00:00)
-                display_hour_str = "24"   # <--- 直接顯示 "24"
-            elif num > 100:     # 內部值 > 100 代表凌晨 01:00, 02:00... (101, 102...)
-                hour = num - 100 # 減去偏移量得到實際小時 (1, 2...)
-                display_hour_str = f"{hour:02d}" # 顯示 "01", "02"...
-            # 忽略其他值 (例如 < 12 或非預期值)
-            else:
-                logger.warning(f"format_slots 遇到非預期內部值: {num} (來自 '{s_cleaned}')，已忽略")
-                continue # 跳過不顯示
-
-            processed_display_slots.append(display_hour_str)
-            # --- *** 修正結束 *** ---
-
+            num = int(s_cleaned)
         except ValueError:
-            logger.warning(f"format_slots 無法轉換內部值數字: '{s_cleaned}'")
+            _warn(f"format_slots 無法轉換內部值數字: '{s_cleaned}'")
+            continue
+        display_hour_str = _display_hour(num)
+        if display_hour_str is None:
+            _warn(f"format_slots 遇到非預期內部值: {num} (來自 '{s_cleaned}')，已忽略")
             continue
+        slot_spans.append(f'<span class="time-slot">{display_hour_str}</span>')
+
+    if not slot_spans:
+        _warn(f"format_slots 未能從內部值 '{value_stripped}' 解析出有效時段，返回原始值。")
+        return f'<span class="time-slot other-status">{html.escape(value_stripped)}</span>'
+    return "".join(slot_spans)
+
+
+def _normalize(value):
+    if value is None: return ""
+    if not isinstance(value, str):
+        try: value = str(value)
+        except Exception: return None
+    return value.strip()
+
+
+@register.filter(name='format_slots', is_safe=True)
+def format_slots(value):
+    """
+    將內部時段字串 (e.g., "14.23.100.101") 轉換為顯示格式 (e.g., "14", "23", "24", "01")。
+    處理特殊值如 '預約滿', '人到再約', 空值。
+    修正：確保 100 顯示為 24，>100 顯示為 01, 02...
+    """
+    value_stripped = _normalize(value)
+    if value_stripped is None:
+        _warn(f"無法轉換 format_slots 輸入 '{value!r}' 為字串")
+        return "--"
+    return mark_safe(_format_slots_html(value_stripped))
 
-    if not processed_display_slots:
-        escaped_value = html.escape(value_stripped)
-        logger.warning(f"format_slots 未能從內部值 '{value_stripped}' 解析出有效時段，返回原始值。")
-        return mark_safe(f'<span class="time-slot other-status">{escaped_value}</span>')
 
-    # 按從數據庫讀取的順序（已按內部值排序）生成 HTML
-    slot_spans = [f'<span class="time-slot">{slot}</span>' for slot in processed_display_slots]
-    return mark_safe("".join(slot_spans))
+def format_slots_bulk(values):
+    """一次轉換整頁的時段字串，回傳與 values 對應的 HTML 列表 (相同字串只轉換一次)。"""
+    converted = {}
+    results = []
+    for value in values:
+        key = value if isinstance(value, str) or value is None else repr(value)
+        if key not in converted: converted[key] = format_slots(value)
+        results.append(converted[key])
+    return results
 
-# --- schedule_filters.py 文件結束 ---
\ No newline at end of file
+# --- schedule_filters.py 文件結束 ---
@@ -0,0 +1,66 @@
+# D:\bkgg\mybackend\myapp\time_slots.py
+"""
+時段字串 <-> 結構化欄位 (24 位元小時遮罩 + 狀態)。
+
+內部時段字串 (DailySchedule / PreBookingSlot.time_slots) 以點分隔內部值：
+12-23 為當天時段，100 代表 24:00 (00:00)，101 以上代表凌晨 01:00、02:00...
+編碼後 bit h 代表 h 點 (0-23)，例如 "14.15.100.101" -> bit 14、15、0、1。
+format_slots 濾鏡忽略的值 (非數字、< 12 或 24~99) 這裡同樣忽略。
+"""
+from django.db import models
+
+FULL_TEXT = "預約滿"
+ON_ARRIVAL_TEXT = "人到再約"
+ALL_HOURS_MASK = (1 << 24) - 1
+
+
+class SlotStatus(models.IntegerChoices):
+    EMPTY = 0, "未排班"
+    HOURS = 1, "有時段"
+    FULL = 2, FULL_TEXT
+    ON_ARRIVAL = 3, ON_ARRIVAL_TEXT
+    OTHER = 4, "其他"
+
+
+def internal_to_hour(num):
+    """內部值 -> 小時 (0-23)，非預期值回傳 None。"""
+    if 12 <= num <= 23: return num
+    if 100 <= num <= 123: return num - 100
+    return None
+
+
+def hour_to_internal(hour):
+    """小時 (0-24) -> 內部值；12-23 保持原值，其餘加上 100 (24 視為 0)。"""
+    hour = hour % 24
+    return hour if hour >= 12 else hour + 100
+
+
+def hour_bit(hour):
+    return 1 << (hour % 24)
+
+
+def encode_time_slots(value):
+    """回傳 (slot_mask, slot_status)。"""
+    value = (value or "").strip() if isinstance(value, str) else ("" if value is None else str(value).strip())
+    if not value: return 0, SlotStatus.EMPTY
+    if value == FULL_TEXT: return 0, SlotStatus.FULL
+    if value == ON_ARRIVAL_TEXT: return 0, SlotStatus.ON_ARRIVAL
+    mask = 0
+    for token in value.split('.'):
+        try:
+            hour = internal_to_hour(int(token.strip()))
+        except ValueError:
+            continue
+        if hour is not None: mask |= hour_bit(hour)
+    return (mask, SlotStatus.HOURS) if mask else (0, SlotStatus.OTHER)
+
+
+def mask_to_hours(mask):
+    """遮罩 -> 小時列表 (依營業時間順序：12-23 之後接 0-11)。"""
+    return [h % 24 for h in range(12, 36) if mask & hour_bit(h)]
+
+
+def apply_slot_fields(instance):
+    """依 instance.time_slots 更新 slot_mask / slot_status (save() 與 bulk 寫入前呼叫)。"""
+    instance.slot_mask, instance.slot_status = encode_time_slots(instance.time_slots)
+    return instance
@@ -47,6 +47,7 @@ urlpatterns = [
     # --- 新增：搶約專區的 AJAX URLs --- NEW ---
     path('ajax/pre_booking_dates/', views.ajax_get_pre_booking_dates, name='ajax_get_pre_booking_dates'),
     path('ajax/pre_booking_slots/', views.ajax_get_pre_booking_slots, name='ajax_get_pre_booking_slots'),
+    path('ajax/free_at_hour/', views.ajax_get_free_at_hour, name='ajax_get_free_at_hour'),
     # --- ---
 
     # --- 新增：其他常用列表的獨立 AJAX URLs (取代 home view 的 fetch 參數) ---
@@ -1,6 +1,62 @@
 # D:\bkgg\mybackend\myapp\utils.py
+import logging
+import threading
+import time
+from bisect import bisect_right
+
+from django.conf import settings
+
 from .models import UserTitleRule
 
+logger = logging.getLogger(__name__)
+
+# --- 稱號對照表 (每個 process 載入一次) ---
+# 依 min_review_count 由小到大排序的門檻與稱號，以 bisect 查詢。
+# 同 process 內由 UserTitleRule 的 post_save/post_delete signal 清除；
+# 其他 process (多個 worker) 則依 USER_TITLE_TABLE_TTL 秒數自動重新載入。
+USER_TITLE_TABLE_TTL = getattr(settings, 'USER_TITLE_TABLE_TTL', 5 * 60)
+
+_title_table = None  # (thresholds, titles, loaded_at)
+_title_table_lock = threading.Lock()
+
+
+def _load_title_table():
+    rules = UserTitleRule.objects.filter(is_active=True).order_by('min_review_count').values_list('min_review_count', 'title_name')
+    thresholds, titles = [], []
+    for min_count, title_name in rules:
+        thresholds.append(min_count)
+        titles.append(title_name)
+    return tuple(thresholds), tuple(titles), time.monotonic()
+
+
+def _get_title_table():
+    global _title_table
+    table = _title_table
+    if table is not None and time.monotonic() - table[2] < USER_TITLE_TABLE_TTL:
+        return table
+    with _title_table_lock:
+        table = _title_table
+        if table is None or time.monotonic() - table[2] >= USER_TITLE_TABLE_TTL:
+            table = _load_title_table()
+            _title_table = table
+            logger.debug(f"Loaded user title table with {len(table[0])} active rules.")
+    return table
+
+
+def invalidate_title_cache():
+    """清除本 process 的稱號對照表，下次查詢時重新載入。"""
+    global _title_table
+    with _title_table_lock:
+        _title_table = None
+
+
+def _resolve_title(thresholds, titles, count):
+    if not isinstance(count, int) or count < 1:
+        return None
+    idx = bisect_right(thresholds, count) - 1
+    return titles[idx] if idx >= 0 else None
+
+
 def get_user_title_from_count(count):
     """
     根據資料庫中定義的 UserTitleRule 取得使用者稱號。
@@ -9,12 +65,23 @@ def get_user_title_from_count(count):
         return None
 
     try:
-        active_rules = UserTitleRule.objects.filter(is_active=True) # Already ordered by Meta
-        for rule in active_rules:
-            if count >= rule.min_review_count:
-                return rule.title_name
+        thresholds, titles, _ = _get_title_table()
+        return _resolve_title(thresholds, titles, count)
+    except Exception as e:
+        logger.error(f"Error fetching UserTitleRule: {e}", exc_info=True)
         return None
+
+
+def titles_for_counts(counts_by_key):
+    """
+    批次版本：傳入 {user_id: 心得數}，回傳 {user_id: 稱號或 None}。
+    對照表已載入時不會產生任何查詢。
+    """
+    if not counts_by_key:
+        return {}
+    try:
+        thresholds, titles, _ = _get_title_table()
     except Exception as e:
-        print(f"Error fetching UserTitleRule: {e}")
-        # Consider logging the error: logger.error(...)
-        return None
\ No newline at end of file
+        logger.error(f"Error fetching UserTitleRule: {e}", exc_info=True)
+        return {key: None for key in counts_by_key}
+    return {key: _resolve_title(thresholds, titles, count) for key, count in counts_by_key.items()}
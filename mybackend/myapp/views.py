@@ -1,16 +1,20 @@
 # D:\bkgg\mybackend\myapp\views.py (完整版 - 修改 render_animal_rows, 新增搶約專區視圖)
 
 from django.shortcuts import render, redirect, get_object_or_404
+from django.conf import settings
 from django.utils import timezone
 from django.utils.dateformat import format as format_date
+from django.utils.dateparse import parse_datetime
+from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.contrib.auth import authenticate, login, logout, get_user_model
 from django.http import JsonResponse, Http404
 from django.contrib.auth.decorators import login_required
-from django.db.models import Count, Q, Prefetch, Max, F, OuterRef, Subquery # Ensure F is imported
+from django.db.models import Count, Q, Prefetch, Max, Sum, F, OuterRef, Subquery # Ensure F is imported
 from django.db.models.functions import Coalesce
 from django.db import transaction # Ensure transaction is imported
 from django.views.decorators.http import require_POST, require_GET
-from django.template.loader import render_to_string
+from django.template.loader import render_to_string, get_template
+from django.template import RequestContext
 from datetime import date # <<<--- 導入 date
 
 # Import necessary models
@@ -18,11 +22,17 @@ from .models import (
     Animal, Hall, Review, PendingAppointment, Note, Announcement,
     StoryReview, WeeklySchedule, ReviewFeedback, UserTitleRule, UserProfile,
     PreBookingSlot, # <<<--- 導入 PreBookingSlot
-    SiteConfiguration
+    SiteConfiguration, UserContributionStats, LeaderboardSnapshot
 )
 import traceback
 import html
 import logging
+from .time_slots import SlotStatus, hour_bit
+from .templatetags.schedule_filters import format_slots_bulk
+from .serializers import AnimalRowSerializer
+from .http_cache import conditional_json_response, version_etag_condition
+from . import data_version, leaderboard, active_stories, profile_stats
+from .data_version import TOPIC_HALLS, TOPIC_TITLES
 from django.contrib.admin.views.decorators import staff_member_required
 from django.urls import reverse
 from django.contrib import messages
@@ -36,7 +46,7 @@ except ImportError:
     print("Warning: MergeTransferForm not found in myapp.forms")
 # --- Util import (keep as is) ---
 try:
-    from .utils import get_user_title_from_count
+    from .utils import get_user_title_from_count, titles_for_counts
 except ImportError:
     def get_user_title_from_count(count):
         print("Warning: get_user_title_from_count not found in myapp.utils. Using basic fallback.")
@@ -45,10 +55,13 @@ except ImportError:
         if count >= 5: return "評論能手"
         if count >= 1: return "新手上路"
         return None
+    def titles_for_counts(counts_by_key):
+        return {key: get_user_title_from_count(count) for key, count in counts_by_key.items()}
     print("Warning: get_user_title_from_count not found in myapp.utils")
 
 from collections import defaultdict
 from django.db import models as db_models
+from . import row_cache
 
 logger = logging.getLogger(__name__)
 User = get_user_model()
@@ -71,11 +84,15 @@ PENDING_ACTION_COST = 1
 NOTE_ACTION_COST = 1
 # --- ---
 
-# --- render_animal_rows function (MODIFIED - Added slots_override_dict) ---
-def render_animal_rows(request, animals_qs, fetch_daily_slots=False, slots_override_dict=None):
+# --- render_animal_rows function (MODIFIED - Added slots_override_dict, batched rendering) ---
+ANIMAL_ROW_TEMPLATE = 'myapp/partials/_animal_table_rows.html'
+
+def render_animal_rows(request, animals_qs, fetch_daily_slots=False, slots_override_dict=None, batched=True, use_cache=False):
     """
     Renders HTML table rows for a queryset of Animals.
     Optionally uses slots_override_dict instead of fetching daily slots.
+    batched=True renders all rows in one template pass (same output as the per-row path).
+    use_cache=True serves each row from the versioned fragment cache (myapp.row_cache) when possible.
     """
     animal_slots_for_template = {}
     animal_ids_on_page = [a.id for a in animals_qs if a]
@@ -84,43 +101,28 @@ def render_animal_rows(request, animals_qs, fetch_daily_slots=False, slots_overr
         # Use provided slots directly
         animal_slots_for_template = slots_override_dict
         logger.debug(f"Using slots_override_dict for animal IDs: {list(animal_slots_for_template.keys())}")
-    elif fetch_daily_slots and SCHEDULE_PARSER_ENABLED and DailySchedule is not None and animal_ids_on_page:
+    elif fetch_daily_slots:
         # Fetch daily slots if override not provided and daily schedule is enabled
-        try:
-            daily_schedules_qs = DailySchedule.objects.filter(
-                animal_id__in=animal_ids_on_page
-            ).values('animal_id', 'time_slots')
-            animal_slots_for_template = {schedule['animal_id']: schedule['time_slots'] for schedule in daily_schedules_qs}
-            logger.debug(f"Fetched daily slots for animal IDs: {list(animal_slots_for_template.keys())}")
-        except Exception as slot_err:
-            logger.error(f"Error fetching daily slots inside render_animal_rows: {slot_err}", exc_info=True)
+        animal_slots_for_template = _load_daily_slots(animal_ids_on_page)
     else:
         logger.debug("No slots override provided and daily slots not fetched.")
 
 
-    pending_ids = set()
-    notes_by_animal = {}
-    if request.user.is_authenticated and animal_ids_on_page:
-        try:
-            pending_ids = set(str(pa.animal_id) for pa in PendingAppointment.objects.filter(user=request.user, animal_id__in=animal_ids_on_page))
-            notes_qs = Note.objects.filter(user=request.user, animal_id__in=animal_ids_on_page)
-            notes_by_animal = {str(note.animal_id): note for note in notes_qs}
-            logger.debug(f"Fetched pending IDs: {pending_ids} and note IDs: {list(notes_by_animal.keys())} for user {request.user.username}")
-        except Exception as e:
-            logger.error(f"Error fetching pending/notes for user {request.user.username}: {e}", exc_info=True)
+    pending_ids, notes_by_animal = _load_user_row_state(request, animal_ids_on_page)
 
-    rendered_rows_html_list = []
+    # 整頁的時段 HTML 一次轉換 (相同字串只轉一次，且有跨請求的 LRU)，模板直接輸出
+    page_animals = [a for a in animals_qs if a]
+    slots_html_by_id = dict(zip(
+        [a.id for a in page_animals],
+        format_slots_bulk([animal_slots_for_template.get(a.id) for a in page_animals])
+    ))
+
+    row_contexts = []
     for animal_instance in animals_qs:
         if not animal_instance:
              logger.warning("Skipping None animal instance in render_animal_rows")
              continue
-        review_count = getattr(animal_instance, 'approved_review_count', None)
-        if review_count is None:
-            try:
-                review_count = Review.objects.filter(animal=animal_instance, approved=True).count()
-            except Exception as count_err:
-                logger.error(f"Error counting reviews for animal {animal_instance.id}: {count_err}", exc_info=True)
-                review_count = 0
+        review_count = animal_instance.approved_review_count or 0
         animal_id_str = str(animal_instance.id)
 
         # Get slots from the prepared dictionary (either override or daily)
@@ -131,6 +133,7 @@ def render_animal_rows(request, animals_qs, fetch_daily_slots=False, slots_overr
             'animal': animal_instance,
             'user': request.user,
             'today_slots': time_slots_to_use, # Use the determined slots
+            'today_slots_html': slots_html_by_id.get(animal_instance.id),
             'is_pending': animal_id_str in pending_ids,
             'note': note_instance,
             'review_count': review_count,
@@ -142,14 +145,179 @@ def render_animal_rows(request, animals_qs, fetch_daily_slots=False, slots_overr
                  'pending': animal_id_str in pending_ids
             }
         }
+        row_contexts.append((animal_instance, row_context))
+
+    if use_cache:
+        return _render_animal_rows_cached(request, row_contexts)
+    if batched:
+        return _render_animal_rows_batched(request, row_contexts)
+    return _render_animal_rows_per_row(request, row_contexts)
+
+
+def _load_daily_slots(animal_ids):
+    """回傳 {animal_id: time_slots}；每日班表未啟用時為空。"""
+    if not (SCHEDULE_PARSER_ENABLED and DailySchedule is not None and animal_ids):
+        return {}
+    try:
+        slots_by_animal = dict(DailySchedule.objects.filter(animal_id__in=animal_ids).values_list('animal_id', 'time_slots'))
+        logger.debug(f"Fetched daily slots for animal IDs: {list(slots_by_animal.keys())}")
+        return slots_by_animal
+    except Exception as slot_err:
+        logger.error(f"Error fetching daily slots: {slot_err}", exc_info=True)
+        return {}
+
+
+def _load_user_row_state(request, animal_ids):
+    """回傳 (待約 animal_id 字串集合, {animal_id 字串: Note})；未登入時皆為空。"""
+    pending_ids = set()
+    notes_by_animal = {}
+    if request.user.is_authenticated and animal_ids:
         try:
-            rendered_html = render_to_string('myapp/partials/_animal_table_rows.html', row_context, request=request)
+            pending_ids = set(str(pa.animal_id) for pa in PendingAppointment.objects.filter(user=request.user, animal_id__in=animal_ids))
+            notes_qs = Note.objects.filter(user=request.user, animal_id__in=animal_ids)
+            notes_by_animal = {str(note.animal_id): note for note in notes_qs}
+            logger.debug(f"Fetched pending IDs: {pending_ids} and note IDs: {list(notes_by_animal.keys())} for user {request.user.username}")
+        except Exception as e:
+            logger.error(f"Error fetching pending/notes for user {request.user.username}: {e}", exc_info=True)
+    return pending_ids, notes_by_animal
+
+
+# --- 列表回應格式 (format=html|json) ---
+ROW_FORMATS = ('html', 'json')
+# 首頁前端預設向列表 API 要求的格式 ('json' 時由 main.js 在前端渲染資料列)
+ANIMAL_ROWS_CLIENT_FORMAT = getattr(settings, 'ANIMAL_ROWS_CLIENT_FORMAT', 'html')
+INVALID_ROW_FORMAT_ERROR = '無效的 format (需為 html 或 json)'
+
+
+def _get_row_format(request):
+    """format 參數 (預設 html)；不支援的值回傳 None。"""
+    row_format = (request.GET.get('format') or 'html').strip().lower()
+    return row_format if row_format in ROW_FORMATS else None
+
+
+def _include_user_state(request):
+    # include_user=0 時只回傳共用部分 (不讀取 session)，可被共用快取
+    return request.GET.get('include_user', '1').strip().lower() not in ('0', 'false', 'no')
+
+
+def animal_rows_json_response(request, animals, fetch_daily_slots=False, slots_override_dict=None, extra=None, include_user=True, shareable=True):
+    """
+    format=json：以 AnimalRowSerializer 輸出精簡的資料列 (由前端自行渲染)，加上內容 ETag。
+    共用部分 (rows) 與使用者狀態 (user_state：待約、筆記) 分開；不含 user_state 的回應可被共用快取。
+    shareable=False：列表本身就是個人的 (待約清單、我的筆記)，即使不含 user_state 也只能 private。
+    不提供 Last-Modified：資料列離開列表 (班表同步移除、取消推薦...) 時列表中剩下資料的 updated_at 不會改變。
+    """
+    animals = [a for a in animals if a]
+    animal_ids = [a.id for a in animals]
+    if slots_override_dict is not None:
+        slots_by_animal = slots_override_dict
+    elif fetch_daily_slots:
+        slots_by_animal = _load_daily_slots(animal_ids)
+    else:
+        slots_by_animal = {}
+
+    payload = {'format': 'json', 'rows': AnimalRowSerializer(animals, many=True, context={'slots_by_animal': slots_by_animal}).data}
+    payload.update(extra or {})
+    with_user_state = include_user and request.user.is_authenticated
+    shared = shareable and not with_user_state
+    if with_user_state:
+        pending_ids, notes_by_animal = _load_user_row_state(request, animal_ids)
+        payload['user_state'] = {
+            'pending_ids': sorted(int(a_id) for a_id in pending_ids),
+            'notes': {a_id: {'id': note.id, 'content': note.content} for a_id, note in notes_by_animal.items()},
+        }
+    return conditional_json_response(request, payload, shared=shared)
+
+
+def animal_list_response(request, row_format, animals, fetch_daily_slots=False, slots_override_dict=None, use_cache=False, extra=None, empty_html=None, shareable=True):
+    """列表 AJAX 視圖共用的回應：format=html 為原本的 table_html，format=json 見 animal_rows_json_response。"""
+    if row_format == 'json':
+        return animal_rows_json_response(request, animals, fetch_daily_slots=fetch_daily_slots, slots_override_dict=slots_override_dict,
+                                         extra=extra, include_user=_include_user_state(request), shareable=shareable)
+    table_html = render_animal_rows(request, animals, fetch_daily_slots=fetch_daily_slots, slots_override_dict=slots_override_dict, use_cache=use_cache)
+    if empty_html and not table_html.strip(): table_html = empty_html
+    return JsonResponse({'table_html': table_html, **(extra or {})})
+
+
+def _animal_row_error_html(animal_instance):
+    return f'<tr><td colspan="5" style="color:red; font-style:italic;">渲染錯誤: {animal_instance.name} (ID: {animal_instance.id})</td></tr>'
+
+
+def _render_animal_rows_per_row(request, row_contexts):
+    """
+    逐行渲染：每一行都呼叫一次 render_to_string (模板查找 + 建立 RequestContext + 執行 context processors)。
+    保留作為對照組 (benchmark) 與除錯用途。
+    """
+    rendered_rows_html_list = []
+    for animal_instance, row_context in row_contexts:
+        try:
+            rendered_html = render_to_string(ANIMAL_ROW_TEMPLATE, row_context, request=request)
             rendered_rows_html_list.append(rendered_html)
         except Exception as render_err:
             logger.error(f"Error rendering partial _animal_table_rows.html for animal {animal_instance.id}: {render_err}", exc_info=True)
-            rendered_rows_html_list.append(f'<tr><td colspan="5" style="color:red; font-style:italic;">渲染錯誤: {animal_instance.name} (ID: {animal_instance.id})</td></tr>')
+            rendered_rows_html_list.append(_animal_row_error_html(animal_instance))
     return "".join(rendered_rows_html_list)
 
+
+def _render_animal_rows_batched(request, row_contexts):
+    """
+    批次渲染：模板只查找/編譯一次，RequestContext 與 context processors 也只建立/執行一次，
+    每一行只 push 自己的變數後直接渲染已編譯的模板。輸出與逐行渲染逐位元組相同。
+    """
+    return "".join(_render_animal_row_fragments(request, row_contexts))
+
+
+def _render_animal_row_fragments(request, row_contexts):
+    """批次渲染的核心，返回每一行的 HTML 列表 (順序與 row_contexts 相同)。"""
+    if not row_contexts:
+        return []
+    compiled_template = get_template(ANIMAL_ROW_TEMPLATE).template
+    context = RequestContext(request)
+    rendered_rows_html_list = []
+    with context.bind_template(compiled_template):
+        for animal_instance, row_context in row_contexts:
+            try:
+                with context.push(row_context):
+                    rendered_rows_html_list.append(compiled_template.render(context))
+            except Exception as render_err:
+                logger.error(f"Error rendering partial _animal_table_rows.html (batched) for animal {animal_instance.id}: {render_err}", exc_info=True)
+                rendered_rows_html_list.append(_animal_row_error_html(animal_instance))
+    return rendered_rows_html_list
+
+
+def _render_animal_rows_cached(request, row_contexts):
+    """
+    片段快取渲染：沒有待約/筆記狀態的行使用所有人共用的匿名片段，
+    有狀態的行使用該使用者的覆蓋層片段；只有未命中的行才進入模板 (批次渲染)。
+    """
+    if not row_contexts:
+        return ""
+    user_id = request.user.id if request.user.is_authenticated else None
+    generation, versions = row_cache.load_versions([animal.id for animal, _ in row_contexts])
+
+    row_keys = []
+    for animal_instance, row_context in row_contexts:
+        key = row_cache.anonymous_row_key(
+            animal_instance, row_context['today_slots'], row_context['review_count'],
+            generation, versions.get(animal_instance.id, 1)
+        )
+        if user_id is not None and (row_context['is_pending'] or row_context['note']):
+            key = row_cache.user_row_key(key, user_id, row_context['is_pending'], row_context['note'])
+        row_keys.append(key)
+
+    cached_rows = row_cache.get_rows(row_keys)
+    misses = [i for i, key in enumerate(row_keys) if key not in cached_rows]
+    if misses:
+        fresh_fragments = _render_animal_row_fragments(request, [row_contexts[i] for i in misses])
+        to_store = {}
+        for i, fragment in zip(misses, fresh_fragments):
+            cached_rows[row_keys[i]] = fragment
+            if fragment != _animal_row_error_html(row_contexts[i][0]):
+                to_store[row_keys[i]] = fragment
+        row_cache.set_rows(to_store)
+    logger.debug(f"Animal row cache: {len(row_keys) - len(misses)} hit(s), {len(misses)} miss(es).")
+    return "".join(cached_rows[key] for key in row_keys)
+
 # --- ajax_get_daily_schedule (Ensure it calls render_animal_rows correctly) ---
 @require_GET
 def ajax_get_daily_schedule(request):
@@ -159,6 +327,8 @@ def ajax_get_daily_schedule(request):
     if not hall_id:
         logger.warning("[AJAX Daily] Request missing hall_id.")
         return JsonResponse({'error': '請求缺少館別 ID (hall_id)'}, status=400)
+    row_format = _get_row_format(request)
+    if row_format is None: return JsonResponse({'error': INVALID_ROW_FORMAT_ERROR}, status=400)
     try:
         hall_id_int = int(hall_id)
         selected_hall = get_object_or_404(Hall, id=hall_id_int, is_active=True)
@@ -178,9 +348,7 @@ def ajax_get_daily_schedule(request):
 
         prefetch_animal = Prefetch(
             'animal',
-            queryset=Animal.objects.select_related('hall').filter(is_active=True).annotate(
-                approved_review_count=Count('reviews', filter=Q(reviews__approved=True))
-            )
+            queryset=Animal.objects.select_related('hall').filter(is_active=True)
         )
         # Note: We fetch DailySchedule here to get the *animals* that have a schedule today.
         # The actual time slots will be re-fetched *inside* render_animal_rows if needed.
@@ -188,10 +356,6 @@ def ajax_get_daily_schedule(request):
         animals_for_render = [ds.animal for ds in daily_schedules_qs if ds.animal]
         logger.debug(f"[AJAX Daily] Found {len(animals_for_render)} active animals for Hall ID {hall_id_int}")
 
-        # *** MODIFIED CALL: Ensure fetch_daily_slots=True and no override ***
-        table_html = render_animal_rows(request, animals_for_render, fetch_daily_slots=True, slots_override_dict=None)
-        # *** ***
-
         first_animal_data = {}
         if animals_for_render:
             first_animal_obj = animals_for_render[0]
@@ -204,7 +368,8 @@ def ajax_get_daily_schedule(request):
             except Exception as e:
                 logger.warning(f"[AJAX Daily] Error getting first animal data (Animal ID {first_animal_obj.id}): {e}")
 
-        return JsonResponse({'table_html': table_html, 'first_animal': first_animal_data})
+        # *** Fetch daily slots, no override (format=json 時回傳資料列) ***
+        return animal_list_response(request, row_format, animals_for_render, fetch_daily_slots=True, use_cache=True, extra={'first_animal': first_animal_data})
 
     except RuntimeError as r_err:
          logger.warning(f"[AJAX Daily] Feature disabled: {r_err}")
@@ -244,9 +409,7 @@ def home(request):
     featured_animal = None
     site_logo_url = None
     try:
-        featured_animal = Animal.objects.select_related('hall').annotate(
-             approved_review_count=Count('reviews', filter=Q(reviews__approved=True))
-        ).filter(
+        featured_animal = Animal.objects.select_related('hall').filter(
              is_featured=True, is_active=True, photo__isnull=False
          ).exclude(photo='').order_by('order', 'name').first()
         if featured_animal: logger.debug(f"[Home View] Featured animal found: {featured_animal.name}")
@@ -277,6 +440,7 @@ def home(request):
         logger.debug(f"[Home View] Login error message passed to context: {login_error}")
 
     context['selected_hall_id'] = 'all'
+    context['animal_rows_format'] = ANIMAL_ROWS_CLIENT_FORMAT
     template_path = 'myapp/index.html'
     try:
         return render(request, template_path, context)
@@ -292,20 +456,21 @@ def home(request):
 def ajax_get_pending_list(request):
     """處理獲取待約列表的 AJAX 請求"""
     logger.info(f"[AJAX Pending] User {request.user.username} requesting list.")
+    row_format = _get_row_format(request)
+    if row_format is None: return JsonResponse({'error': INVALID_ROW_FORMAT_ERROR}, status=400)
     try:
         pending_appointments_qs = PendingAppointment.objects.filter(user=request.user).select_related('animal', 'animal__hall').order_by('-added_at')
         animal_ids = list(pending_appointments_qs.values_list('animal_id', flat=True))
-        animals_qs = Animal.objects.filter(id__in=animal_ids).filter(Q(is_active=True) & (Q(hall__isnull=True) | Q(hall__is_active=True))).annotate(approved_review_count=Count('reviews', filter=Q(reviews__approved=True)))
+        animals_qs = Animal.objects.filter(id__in=animal_ids).filter(Q(is_active=True) & (Q(hall__isnull=True) | Q(hall__is_active=True)))
         animals_dict = {a.id: a for a in animals_qs}
         animals_list_ordered = [animals_dict.get(pa.animal_id) for pa in pending_appointments_qs if pa.animal_id in animals_dict]
         logger.debug(f"[AJAX Pending] Found {len(animals_list_ordered)} active animals for user {request.user.username}.")
-        # *** MODIFIED CALL: Fetch daily slots, no override ***
-        table_html = render_animal_rows(request, animals_list_ordered, fetch_daily_slots=True, slots_override_dict=None)
         first_animal_data = {}
         if animals_list_ordered:
             first_animal = animals_list_ordered[0]
             first_animal_data = {'photo_url': first_animal.photo.url if first_animal.photo else '', 'name': first_animal.name or '', 'introduction': first_animal.introduction or ''}
-        return JsonResponse({'table_html': table_html, 'first_animal': first_animal_data})
+        # *** Fetch daily slots, no override ***
+        return animal_list_response(request, row_format, animals_list_ordered, fetch_daily_slots=True, extra={'first_animal': first_animal_data}, shareable=False)
     except Exception as e:
         logger.error(f"[AJAX Pending] Error for user {request.user.username}: {e}", exc_info=True)
         error_html = '<tr class="empty-table-message"><td colspan="5">載入待約清單時發生錯誤</td></tr>'
@@ -318,6 +483,8 @@ def ajax_get_my_notes(request):
     hall_id = request.GET.get('hall_id')
     selected_hall_id = hall_id or 'all'
     logger.info(f"[AJAX Notes] User {request.user.username} requesting notes. Hall filter: {selected_hall_id}")
+    row_format = _get_row_format(request)
+    if row_format is None: return JsonResponse({'error': INVALID_ROW_FORMAT_ERROR}, status=400)
     try:
         notes_base_qs = Note.objects.filter(user=request.user).filter(Q(animal__is_active=True) & (Q(animal__hall__isnull=True) | Q(animal__hall__is_active=True))).select_related('animal', 'animal__hall')
         if selected_hall_id != "all":
@@ -335,17 +502,16 @@ def ajax_get_my_notes(request):
         animal_ids = list(notes_qs.values_list('animal_id', flat=True))
         animals_list_ordered = []
         if animal_ids:
-            animals_qs = Animal.objects.filter(id__in=animal_ids).annotate(approved_review_count=Count('reviews', filter=Q(reviews__approved=True)))
+            animals_qs = Animal.objects.filter(id__in=animal_ids)
             animals_dict = {a.id: a for a in animals_qs}
             animals_list_ordered = [animals_dict.get(note.animal_id) for note in notes_qs if note.animal_id in animals_dict]
             logger.debug(f"[AJAX Notes] Found {len(animals_list_ordered)} animals with notes.")
-        # *** MODIFIED CALL: Fetch daily slots, no override ***
-        table_html = render_animal_rows(request, animals_list_ordered, fetch_daily_slots=True, slots_override_dict=None)
         first_animal_data = {}
         if animals_list_ordered:
             first_animal = animals_list_ordered[0]
             first_animal_data = {'photo_url': first_animal.photo.url if first_animal.photo else '', 'name': first_animal.name or '', 'introduction': first_animal.introduction or ''}
-        return JsonResponse({'table_html': table_html, 'first_animal': first_animal_data})
+        # *** Fetch daily slots, no override ***
+        return animal_list_response(request, row_format, animals_list_ordered, fetch_daily_slots=True, extra={'first_animal': first_animal_data}, shareable=False)
     except Exception as e:
         logger.error(f"[AJAX Notes] Error for user {request.user.username} (Hall: {selected_hall_id}): {e}", exc_info=True)
         error_html = '<tr class="empty-table-message"><td colspan="5">載入筆記時發生錯誤</td></tr>'
@@ -355,41 +521,56 @@ def ajax_get_my_notes(request):
 def ajax_get_latest_reviews(request):
     """處理獲取最新心得列表的 AJAX 請求"""
     logger.info("[AJAX LatestReviews] Requesting list.")
+    row_format = _get_row_format(request)
+    if row_format is None: return JsonResponse({'error': INVALID_ROW_FORMAT_ERROR}, status=400)
     try:
-        latest_approved_time_subquery = Review.objects.filter(animal=OuterRef('pk'), approved=True).order_by('-approved_at', '-created_at').values('approved_at')[:1]
-        latest_created_time_subquery = Review.objects.filter(animal=OuterRef('pk'), approved=True).order_by('-approved_at', '-created_at').values('created_at')[:1]
-        latest_reviewed_animals_qs = Animal.objects.filter(is_active=True, hall__is_active=True, reviews__approved=True).annotate(latest_approved_time=Subquery(latest_approved_time_subquery), latest_created_time=Subquery(latest_created_time_subquery), approved_review_count=Count('reviews', filter=Q(reviews__approved=True))).filter(latest_approved_time__isnull=False).select_related('hall').order_by('-latest_approved_time', '-latest_created_time')[:20]
+        # 使用 Animal 上維護的 last_review_approved_at / approved_review_count，不再於讀取時聚合
+        latest_reviewed_animals_qs = Animal.objects.filter(is_active=True, hall__is_active=True, approved_review_count__gt=0, last_review_approved_at__isnull=False).select_related('hall').order_by('-last_review_approved_at', 'order', 'name')[:20]
         results_list = list(latest_reviewed_animals_qs)
         logger.debug(f"[AJAX LatestReviews] Found {len(results_list)} animals.")
-        # *** MODIFIED CALL: Fetch daily slots, no override ***
-        table_html = render_animal_rows(request, results_list, fetch_daily_slots=True, slots_override_dict=None)
         first_animal_data = {}
         if results_list:
              first_animal = results_list[0]
              logger.debug(f"[AJAX LatestReviews] First animal: {first_animal.name}")
              first_animal_data = {'photo_url': first_animal.photo.url if first_animal.photo else '', 'name': first_animal.name or '', 'introduction': first_animal.introduction or ''}
-        return JsonResponse({'table_html': table_html, 'first_animal': first_animal_data})
+        # *** Fetch daily slots, no override ***
+        return animal_list_response(request, row_format, results_list, fetch_daily_slots=True, use_cache=True, extra={'first_animal': first_animal_data})
     except Exception as e:
         logger.error(f"[AJAX LatestReviews] Error: {e}", exc_info=True)
         error_html = '<tr class="empty-table-message"><td colspan="5">載入最新心得時發生錯誤</td></tr>'
         return JsonResponse({'table_html': error_html, 'first_animal': {}}, status=500)
 
+def _recommendations_etag(request):
+    """推薦列表的版本戳記：推薦美容師與其今日班表一次聚合查詢；登入者另加待約/筆記各一次查詢。"""
+    aggregates = {'last': Max('updated_at'), 'count': Count('id', distinct=True), 'reviews': Sum('approved_review_count'), 'last_review': Max('last_review_approved_at')}
+    if SCHEDULE_PARSER_ENABLED and DailySchedule is not None:
+        aggregates.update(slots_last=Max('daily_schedules_records__updated_at'), slots_count=Count('daily_schedules_records', distinct=True))
+    stamp = Animal.objects.filter(is_active=True, is_recommended=True, hall__is_active=True).aggregate(**aggregates)
+    parts = ['recommendations', request.GET.urlencode(), *sorted(stamp.items()), *data_version.generations(TOPIC_HALLS)]
+    if request.user.is_authenticated and (_get_row_format(request) != 'json' or _include_user_state(request)):
+        pending = PendingAppointment.objects.filter(user=request.user).aggregate(count=Count('id'), last=Max('added_at'))
+        notes = Note.objects.filter(user=request.user).aggregate(count=Count('id'), last=Max('updated_at'))
+        parts += [request.user.id, *sorted(pending.items()), *sorted(notes.items())]
+    return data_version.make_etag(*parts)
+
 @require_GET
+@version_etag_condition(_recommendations_etag)
 def ajax_get_recommendations(request):
     """處理獲取每日推薦列表的 AJAX 請求"""
     logger.info("[AJAX Recommendations] Requesting list.")
+    row_format = _get_row_format(request)
+    if row_format is None: return JsonResponse({'error': INVALID_ROW_FORMAT_ERROR}, status=400)
     try:
-        recommended_animals_qs = Animal.objects.filter(is_active=True, is_recommended=True, hall__is_active=True).select_related('hall').annotate(approved_review_count=Count('reviews', filter=Q(reviews__approved=True))).order_by('hall__order', 'order', 'name')
+        recommended_animals_qs = Animal.objects.filter(is_active=True, is_recommended=True, hall__is_active=True).select_related('hall').order_by('hall__order', 'order', 'name')
         results_list = list(recommended_animals_qs)
         logger.debug(f"[AJAX Recommendations] Found {len(results_list)} animals.")
-        # *** MODIFIED CALL: Fetch daily slots, no override ***
-        table_html = render_animal_rows(request, results_list, fetch_daily_slots=True, slots_override_dict=None)
         first_animal_data = {}
         if results_list:
              first_animal = results_list[0]
              logger.debug(f"[AJAX Recommendations] First animal: {first_animal.name}")
              first_animal_data = {'photo_url': first_animal.photo.url if first_animal.photo else '', 'name': first_animal.name or '', 'introduction': first_animal.introduction or ''}
-        return JsonResponse({'table_html': table_html, 'first_animal': first_animal_data})
+        # *** Fetch daily slots, no override ***
+        return animal_list_response(request, row_format, results_list, fetch_daily_slots=True, use_cache=True, extra={'first_animal': first_animal_data})
     except Exception as e:
         logger.error(f"[AJAX Recommendations] Error: {e}", exc_info=True)
         error_html = '<tr class="empty-table-message"><td colspan="5">載入每日推薦時發生錯誤</td></tr>'
@@ -498,9 +679,40 @@ def add_story_review(request):
         logger.error(f"Error creating story review for animal {animal_id} by user {user.username}: {e}", exc_info=True)
         return JsonResponse({"success": False, "error": "儲存限時動態心得時發生內部錯誤"}, status=500)
 
-# --- add_review 函數 (Unchanged) ---
+# --- 心得列表分頁 (keyset cursor) ---
+REVIEW_FEED_PAGE_SIZE = getattr(settings, 'REVIEW_FEED_PAGE_SIZE', 20)
+REVIEW_FEED_MAX_PAGE_SIZE = getattr(settings, 'REVIEW_FEED_MAX_PAGE_SIZE', 50)
+
+
+def _get_review_page_size(request):
+    """page_size 參數 (預設 REVIEW_FEED_PAGE_SIZE，超過上限時取上限)；無效值回傳 None。"""
+    raw = request.GET.get('page_size')
+    if not raw: return REVIEW_FEED_PAGE_SIZE
+    try:
+        page_size = int(raw)
+    except (ValueError, TypeError):
+        return None
+    return min(page_size, REVIEW_FEED_MAX_PAGE_SIZE) if page_size > 0 else None
+
+
+def _encode_review_cursor(review):
+    """本頁最後一筆的 (approved_at, id) -> 不透明的 cursor 字串。"""
+    return urlsafe_base64_encode(f"{review.approved_at.isoformat()}|{review.id}".encode('utf-8'))
+
+
+def _decode_review_cursor(cursor):
+    """cursor -> (approved_at, id)；格式錯誤回傳 None。"""
+    try:
+        approved_at_str, review_id = urlsafe_base64_decode(cursor).decode('utf-8').split('|')
+        approved_at = parse_datetime(approved_at_str)
+        return (approved_at, int(review_id)) if approved_at else None
+    except (ValueError, TypeError, UnicodeDecodeError):
+        return None
+
+
+# --- add_review 函數 ---
 def add_review(request):
-    """處理提交一般心得 (POST) 或獲取某美容師的心得列表 (GET)"""
+    """處理提交一般心得 (POST) 或獲取某美容師的心得列表 (GET，以 cursor / page_size 分頁)"""
     if request.method == "POST":
         if not request.user.is_authenticated:
             logger.warning("Anonymous user attempted to post a review.")
@@ -592,33 +804,39 @@ def add_review(request):
             logger.warning(f"Animal not found or invalid ID for fetching reviews: {animal_id}")
             return JsonResponse({"error": "找不到或無效的 animal_id"}, status=404)
 
-        reviews_qs = Review.objects.filter(
-            animal=animal, approved=True
-        ).select_related('user').annotate(
-            good_to_have_you_count=Count('feedback', filter=Q(feedback__feedback_type='good_to_have_you')),
-            good_looking_count=Count('feedback', filter=Q(feedback__feedback_type='good_looking'))
-        ).order_by("-approved_at", "-created_at")
-
-        user_ids = list(reviews_qs.values_list('user_id', flat=True).distinct())
+        page_size = _get_review_page_size(request)
+        cursor = request.GET.get("cursor")
+        position = _decode_review_cursor(cursor) if cursor else None
+        if page_size is None or (cursor and position is None):
+            logger.warning(f"Invalid review feed params for animal {animal_id}: page_size={request.GET.get('page_size')!r}, cursor={cursor!r}")
+            return JsonResponse({"error": "無效的 page_size 或 cursor"}, status=400)
+
+        # keyset 分頁：依 (approved_at DESC, id DESC) 取 cursor 之後的下一頁 (review_feed_idx)，多取一筆判斷是否還有下一頁
+        reviews_qs = Review.objects.filter(animal=animal, approved=True, approved_at__isnull=False).select_related('user').order_by('-approved_at', '-id')
+        if position is not None:
+            after_time, after_id = position
+            reviews_qs = reviews_qs.filter(Q(approved_at__lt=after_time) | Q(approved_at=after_time, id__lt=after_id))
+        page = list(reviews_qs[:page_size + 1])
+        has_more = len(page) > page_size
+        page = page[:page_size]
+
+        # 稱號只計算本頁出現的作者
+        user_ids = {r.user_id for r in page if r.user_id}
         user_total_counts = defaultdict(int)
         user_titles = {}
         if user_ids:
              logger.debug(f"Fetching total counts for user IDs: {user_ids}")
              try:
-                 review_counts_query = Review.objects.filter(user_id__in=user_ids, approved=True).values('user_id').annotate(count=Count('id'))
-                 story_counts_query = StoryReview.objects.filter(user_id__in=user_ids, approved=True).values('user_id').annotate(count=Count('id'))
-                 for item in review_counts_query:
-                     user_total_counts[item['user_id']] += item['count']
-                 for item in story_counts_query:
-                     user_total_counts[item['user_id']] += item['count']
-                 for user_id, total_count in user_total_counts.items():
-                     user_titles[user_id] = get_user_title_from_count(total_count)
+                 stats_query = UserContributionStats.objects.filter(user_id__in=user_ids).values_list('user_id', 'approved_reviews', 'approved_stories')
+                 for stats_user_id, reviews_count, stories_count in stats_query:
+                     user_total_counts[stats_user_id] = reviews_count + stories_count
+                 user_titles = titles_for_counts(user_total_counts)
                  logger.debug(f"Calculated user titles: {user_titles}")
              except Exception as count_err:
                  logger.error(f"Error fetching user total review counts: {count_err}", exc_info=True)
 
         data = []
-        for r in reviews_qs:
+        for r in page:
             user_display_name = "匿名"; display_date = ""; user_title = None; author_id = None
             if hasattr(r, 'user') and r.user:
                 user_display_name = r.user.first_name or r.user.username
@@ -627,13 +845,9 @@ def add_review(request):
             else:
                 logger.warning(f"Review {r.id} is missing user information.")
 
-            if r.approved_at:
-                 try: display_date = timezone.localtime(r.approved_at).strftime("%Y-%m-%d")
-                 except Exception as date_err: logger.error(f"Error formatting approved_at for review {r.id}: {date_err}"); display_date = "日期錯誤"
-            elif r.created_at:
-                 try: display_date = timezone.localtime(r.created_at).strftime("%Y-%m-%d"); logger.warning(f"Review {r.id} approved but missing approved_at, using created_at.")
-                 except Exception as date_err: logger.error(f"Error formatting created_at fallback for review {r.id}: {date_err}"); display_date = "日期錯誤"
-            else: display_date = "日期未知"
+            # 查詢已限定 approved_at 不為空 (keyset 分頁依 approved_at 排序)
+            try: display_date = timezone.localtime(r.approved_at).strftime("%Y-%m-%d")
+            except Exception as date_err: logger.error(f"Error formatting approved_at for review {r.id}: {date_err}"); display_date = "日期錯誤"
 
             data.append({
                 "id": r.id, "author_id": author_id, "user": user_display_name, "user_title": user_title,
@@ -646,7 +860,8 @@ def add_review(request):
                 "good_to_have_you_count": r.good_to_have_you_count,
                 "good_looking_count": r.good_looking_count,
             })
-        return JsonResponse({"reviews": data})
+        next_cursor = _encode_review_cursor(page[-1]) if has_more else None
+        return JsonResponse({"reviews": data, "next_cursor": next_cursor, "has_more": has_more})
 
     logger.warning(f"Unsupported method {request.method} for add_review view.")
     return JsonResponse({"error": "請求方法不支援"}, status=405)
@@ -1050,31 +1265,31 @@ def update_note(request):
     except Exception as e: logger.error(f"Error updating note {note_id} for {user.username}: {e}", exc_info=True); return JsonResponse({"success": False, "error": "更新筆記時發生錯誤"}, status=500)
 
 # --- AJAX Views (Stories, Schedule, HOF, Feedback - Unchanged) ---
+def _active_stories_for_request(request):
+    """(now, 版本號, 有效項目)：ETag 與視圖共用，每個請求只讀取一次工作集 (一次世代號查詢)。"""
+    if not hasattr(request, '_active_stories'):
+        now = timezone.now()
+        request._active_stories = (now, *active_stories.get_active(now))
+    return request._active_stories
+
+def _active_stories_etag(request):
+    """由記憶體中的工作集 (myapp.active_stories) 組成戳記：版本號 + 各動態的剩餘時間文字 (剩餘時間改變時 ETag 也會變)。"""
+    now, version, entries = _active_stories_for_request(request)
+    return data_version.make_etag('stories', version, *(f"{e['id']}:{active_stories.remaining_time(e, now)}" for e in entries))
+
 @require_GET
+@version_etag_condition(_active_stories_etag)
 def ajax_get_active_stories(request):
     logger.info("[ajax_get_active_stories] Fetching active stories.")
     try:
-        now = timezone.now()
+        # 工作集在動態審核時計算、到期的項目讀取時移除，穩定狀態下只查一次世代號 (與 ETag 共用)
+        now, _, entries = _active_stories_for_request(request)
         logger.debug(f"[ajax_get_active_stories] Current time (UTC): {now}")
-
-        active_stories_qs = StoryReview.objects.filter(
-            animal__is_active=True, animal__hall__is_active=True, approved=True, expires_at__gt=now
-        ).select_related('animal', 'animal__hall', 'user').order_by('-approved_at')
-        story_count = active_stories_qs.count()
-        logger.info(f"[ajax_get_active_stories] Found {story_count} potential stories in DB.")
-
-        stories_data = []
-        for s in active_stories_qs:
-             logger.debug(f"[ajax_get_active_stories] Processing Story ID: {s.id}")
-             try:
-                 animal_name = s.animal.name if s.animal else '未知美容師'
-                 animal_photo_url = s.animal.photo.url if s.animal and s.animal.photo else None
-                 hall_name = s.animal.hall.name if s.animal and s.animal.hall else '未知館別'
-                 user_name = s.user.first_name or s.user.username if s.user else '匿名'
-                 remaining_time = s.remaining_time_display
-                 stories_data.append({ 'id': s.id, 'animal_id': s.animal_id, 'animal_name': animal_name, 'animal_photo_url': animal_photo_url, 'hall_name': hall_name, 'user_name': user_name, 'remaining_time': remaining_time })
-             except Exception as serial_err:
-                  logger.error(f"[ajax_get_active_stories] Error processing story ID {s.id}: {serial_err}", exc_info=True)
+        stories_data = [
+            { 'id': e['id'], 'animal_id': e['animal_id'], 'animal_name': e['animal_name'], 'animal_photo_url': e['animal_photo_url'],
+              'hall_name': e['hall_name'], 'user_name': e['user_name'], 'remaining_time': active_stories.remaining_time(e, now) }
+            for e in entries
+        ]
 
         logger.info(f"[ajax_get_active_stories] Returning {len(stories_data)} stories in JSON response.")
         return JsonResponse({'stories': stories_data})
@@ -1090,10 +1305,7 @@ def ajax_get_story_detail(request, story_id):
         story = get_object_or_404(
             StoryReview.objects.filter(
                 animal__is_active=True, animal__hall__is_active=True, approved=True, expires_at__gt=now
-            ).select_related('animal', 'animal__hall', 'user').annotate(
-                good_to_have_you_count=Count('feedback', filter=Q(feedback__feedback_type='good_to_have_you')),
-                good_looking_count=Count('feedback', filter=Q(feedback__feedback_type='good_looking'))
-            ),
+            ).select_related('animal', 'animal__hall', 'user'),
             pk=story_id
         )
         animal = story.animal; user = story.user
@@ -1101,10 +1313,7 @@ def ajax_get_story_detail(request, story_id):
         author_id = user.id if user else None; user_title = None
         if user:
             try:
-                review_count = Review.objects.filter(user=user, approved=True).count()
-                story_review_count = StoryReview.objects.filter(user=user, approved=True).count()
-                total_count = review_count + story_review_count
-                user_title = get_user_title_from_count(total_count)
+                user_title = get_user_title_from_count(UserContributionStats.for_user(user.id).total_reviews)
             except Exception as count_err: logger.error(f"Error fetching total count for user {user.id}: {count_err}", exc_info=True)
         story_data = {
             'id': story.id, 'author_id': author_id, 'animal_id': animal.id, 'animal_name': animal.name,
@@ -1123,7 +1332,16 @@ def ajax_get_story_detail(request, story_id):
     except Http404: logger.warning(f"Story detail fetch failed: Story ID {story_id} not found/inactive/expired."); return JsonResponse({'success': False, 'error': '找不到該動態、或動態已過期'}, status=404)
     except Exception as e: logger.error(f"Error in ajax_get_story_detail for ID {story_id}: {e}", exc_info=True); return JsonResponse({'success': False, 'error': '無法載入動態詳情'}, status=500)
 
+def _weekly_schedule_etag(request):
+    try:
+        hall_id_int = int(request.GET.get('hall_id'))
+    except (ValueError, TypeError):
+        return None  # 交給視圖回 400
+    stamp = WeeklySchedule.objects.filter(hall_id=hall_id_int).aggregate(last=Max('updated_at'), count=Count('id'))
+    return data_version.make_etag('weekly', hall_id_int, stamp['last'], stamp['count'], *data_version.generations(TOPIC_HALLS))
+
 @require_GET
+@version_etag_condition(_weekly_schedule_etag)
 def ajax_get_weekly_schedule(request):
     hall_id = request.GET.get('hall_id')
     logger.debug(f"Fetching weekly schedule for hall_id: {hall_id}")
@@ -1147,33 +1365,18 @@ def ajax_get_weekly_schedule(request):
         else: logger.info(f"No weekly schedule images found for hall {hall_name} (ID: {hall_id})."); return JsonResponse({'success': False, 'schedule_urls': [], 'hall_name': hall_name, 'message': f'{hall_name} 未上傳班表圖片'})
     except Exception as e: logger.error(f"Error fetching weekly schedule images for Hall ID {hall_id}: {e}", exc_info=True); return JsonResponse({'success': False, 'error': '載入每週班表圖片出錯'}, status=500)
 
+def _hall_of_fame_etag(request):
+    # 排名 (含顯示名稱) 都在快照裡；稱號規則另以世代號判斷
+    stamp = LeaderboardSnapshot.objects.aggregate(last=Max('updated_at'), count=Count('pk'))
+    return data_version.make_etag('hall_of_fame', stamp['last'], stamp['count'], *data_version.generations(TOPIC_TITLES))
+
 @require_GET
+@version_etag_condition(_hall_of_fame_etag)
 def ajax_get_hall_of_fame(request):
     logger.info("Fetching Hall of Fame data (multi-category).")
-    rankings = {}; top_n = 10; all_top_user_ids = set()
     try:
-        logger.debug("Calculating Review ranking...")
-        review_ranks_qs = Review.objects.filter(approved=True, user__isnull=False).values('user').annotate(count=Count('id')).filter(count__gt=0).order_by('-count', 'user__username')[:top_n]
-        review_ranks = list(review_ranks_qs); all_top_user_ids.update(r['user'] for r in review_ranks); logger.debug(f"Review ranking: {len(review_ranks)} users.")
-        logger.debug("Calculating StoryReview ranking...")
-        story_ranks_qs = StoryReview.objects.filter(approved=True, user__isnull=False).values('user').annotate(count=Count('id')).filter(count__gt=0).order_by('-count', 'user__username')[:top_n]
-        story_ranks = list(story_ranks_qs); all_top_user_ids.update(s['user'] for s in story_ranks); logger.debug(f"StoryReview ranking: {len(story_ranks)} users.")
-        feedback_ranks_data = {}; feedback_types = ['good_looking', 'good_to_have_you']
-        for fb_type in feedback_types:
-            logger.debug(f"Calculating {fb_type} feedback ranking (received)...")
-            recipient_id_annotation = Coalesce('review__user_id', 'story_review__user_id')
-            feedback_ranks_qs = ReviewFeedback.objects.filter(feedback_type=fb_type).annotate(recipient_id=recipient_id_annotation).filter(recipient_id__isnull=False).values('recipient_id').annotate(count=Count('id')).filter(count__gt=0).order_by('-count', 'recipient_id')[:top_n]
-            feedback_ranks_list = list(feedback_ranks_qs); feedback_ranks_data[fb_type] = feedback_ranks_list; all_top_user_ids.update(f['recipient_id'] for f in feedback_ranks_list); logger.debug(f"{fb_type} feedback ranking: {len(feedback_ranks_list)} users.")
-        logger.debug(f"Fetching details for {len(all_top_user_ids)} users."); all_user_details = {u.id: u for u in User.objects.filter(id__in=all_top_user_ids)}
-        user_total_counts = defaultdict(int); review_counts_all = Review.objects.filter(user_id__in=all_top_user_ids, approved=True).values('user_id').annotate(count=Count('id')); story_counts_all = StoryReview.objects.filter(user_id__in=all_top_user_ids, approved=True).values('user_id').annotate(count=Count('id'))
-
-        for item in review_counts_all: user_total_counts[item['user_id']] += item['count']
-        for item in story_counts_all: user_total_counts[item['user_id']] += item['count']
-
-        all_user_titles = {user_id: get_user_title_from_count(user_total_counts.get(user_id, 0)) for user_id in all_top_user_ids}; logger.debug("User titles calculated.")
-        rankings['reviews'] = [{'rank': i + 1, 'user_name': all_user_details[r['user']].first_name or all_user_details[r['user']].username, 'user_title': all_user_titles.get(r['user']), 'count': r['count'], 'user_id': r['user']} for i, r in enumerate(review_ranks) if r['user'] in all_user_details]
-        rankings['stories'] = [{'rank': i + 1, 'user_name': all_user_details[s['user']].first_name or all_user_details[s['user']].username, 'user_title': all_user_titles.get(s['user']), 'count': s['count'], 'user_id': s['user']} for i, s in enumerate(story_ranks) if s['user'] in all_user_details]
-        for fb_type, ranks_list in feedback_ranks_data.items(): rankings[fb_type] = [{'rank': i + 1, 'user_name': all_user_details[f['recipient_id']].first_name or all_user_details[f['recipient_id']].username, 'user_title': all_user_titles.get(f['recipient_id']), 'count': f['count'], 'user_id': f['recipient_id']} for i, f in enumerate(ranks_list) if f['recipient_id'] in all_user_details]
+        # 讀取預先計算的排行榜快照 (myapp.leaderboard)，一次查詢
+        rankings = leaderboard.read_rankings()
         logger.debug(f"Final rankings data prepared: {list(rankings.keys())}"); return JsonResponse({'success': True, 'rankings': rankings})
     except Exception as e: logger.error(f"Error in ajax_get_hall_of_fame: {e}", exc_info=True); return JsonResponse({'success': False, 'error': '無法載入名人堂數據'}, status=500)
 
@@ -1225,9 +1428,11 @@ def add_review_feedback(request):
 
         with transaction.atomic():
             obj, created = ReviewFeedback.objects.get_or_create(**feedback_data)
-            target_filter = Q(review=target_review) if review_id else Q(story_review=target_story_review)
-            good_to_have_you_count = ReviewFeedback.objects.filter(target_filter, feedback_type='good_to_have_you').count()
-            good_looking_count = ReviewFeedback.objects.filter(target_filter, feedback_type='good_looking').count()
+            # 計數已由 signals 在同一個交易中更新，讀一列即可
+            target = target_review or target_story_review
+            counts = type(target).get_feedback_counts(target.pk)
+            good_to_have_you_count = counts['good_to_have_you_count']
+            good_looking_count = counts['good_looking_count']
 
             if not created:
                 logger.info(f"User {user.username} already gave feedback '{feedback_type}' on {target_description}.")
@@ -1260,26 +1465,21 @@ def ajax_get_profile_data(request):
         'first_name': user.first_name or '',
     }
     try:
-        profile = UserProfile.objects.get(user=user)
-        logger.debug(f"Profile object fetched: {profile}")
-        approved_reviews_count = Review.objects.filter(user=user, approved=True).count()
-        approved_stories_count = StoryReview.objects.filter(user=user, approved=True).count()
-        total_reviews = approved_reviews_count + approved_stories_count
-        good_to_have_you_received = ReviewFeedback.objects.filter( Q(review__user=user) | Q(story_review__user=user), feedback_type='good_to_have_you' ).count()
-        good_looking_received = ReviewFeedback.objects.filter( Q(review__user=user) | Q(story_review__user=user), feedback_type='good_looking' ).count()
-        pending_count = PendingAppointment.objects.filter(user=user).count()
-        notes_count = Note.objects.filter(user=user).count()
-        user_title = get_user_title_from_count(total_reviews)
+        # 所有統計一次查詢取回並依使用者快取 (myapp.profile_stats)
+        stats = profile_stats.get(user.id)
+        if stats is None: raise UserProfile.DoesNotExist
+        logger.debug(f"Profile stats fetched: {stats}")
+        user_title = get_user_title_from_count(stats['total_reviews'])
 
         # ***返回慾望幣，移除舊 limit***
-        profile_data['desire_coins'] = profile.desire_coins
-        profile_data['approved_reviews_count'] = approved_reviews_count
-        profile_data['approved_stories_count'] = approved_stories_count
+        profile_data['desire_coins'] = stats['desire_coins']
+        profile_data['approved_reviews_count'] = stats['approved_reviews']
+        profile_data['approved_stories_count'] = stats['approved_stories']
         profile_data['user_title'] = user_title
-        profile_data['good_to_have_you_received'] = good_to_have_you_received
-        profile_data['good_looking_received'] = good_looking_received
-        profile_data['pending_count'] = pending_count # 仍返回項目數
-        profile_data['notes_count'] = notes_count # 仍返回項目數
+        profile_data['good_to_have_you_received'] = stats['good_to_have_you_received']
+        profile_data['good_looking_received'] = stats['good_looking_received']
+        profile_data['pending_count'] = stats['pending_count'] # 仍返回項目數
+        profile_data['notes_count'] = stats['notes_count'] # 仍返回項目數
         # *** ***
 
         logger.info(f"Profile data prepared for {user.username}: {profile_data}")
@@ -1309,7 +1509,11 @@ def ajax_search_beauticians(request):
     logger.info( f"[AJAX Search] Term: '{term}', Filters: H({min_height_str}-{max_height_str}) W({min_weight_str}-{max_weight_str}) C({cup_min_str}-{cup_max_str}) F({min_fee_str}-{max_fee_str})" )
     has_keyword = bool(term)
     has_filters = bool(min_height_str or max_height_str or min_weight_str or max_weight_str or cup_min_str or cup_max_str or min_fee_str or max_fee_str)
-    if not has_keyword and not has_filters: return JsonResponse({'table_html': '<tr class="empty-table-message"><td colspan="5">請輸入姓名或使用篩選器</td></tr>', 'first_animal': {}})
+    row_format = _get_row_format(request)
+    if row_format is None: return JsonResponse({'error': INVALID_ROW_FORMAT_ERROR}, status=400)
+    if not has_keyword and not has_filters:
+        if row_format == 'json': return JsonResponse({'format': 'json', 'rows': [], 'first_animal': {}, 'message': '請輸入姓名或使用篩選器'})
+        return JsonResponse({'table_html': '<tr class="empty-table-message"><td colspan="5">請輸入姓名或使用篩選器</td></tr>', 'first_animal': {}})
     try:
         min_height, max_height, min_weight, max_weight, min_fee, max_fee = None, None, None, None, None, None
         try:
@@ -1346,41 +1550,46 @@ def ajax_search_beauticians(request):
         if min_fee is not None: search_query = search_query.filter(fee__gte=min_fee)
         if max_fee is not None: search_query = search_query.filter(fee__lte=max_fee)
 
-        final_query = search_query.select_related('hall').annotate(
-            approved_review_count=Count('reviews', filter=Q(reviews__approved=True))
-        ).order_by('hall__order', 'order', 'name')
+        final_query = search_query.select_related('hall').order_by('hall__order', 'order', 'name')
         results_limit = 50
         search_results = list(final_query[:results_limit])
         result_count = len(search_results)
         logger.debug(f"Found {result_count} beauticians (limit {results_limit})")
 
-        # *** MODIFIED CALL: Fetch daily slots, no override ***
-        table_html = render_animal_rows(request, search_results, fetch_daily_slots=True, slots_override_dict=None)
-
         first_animal_data = {}
         if search_results:
             first_animal_obj = search_results[0]
             try: first_animal_data = {'photo_url': first_animal_obj.photo.url if first_animal_obj.photo else '', 'name': first_animal_obj.name or '', 'introduction': first_animal_obj.introduction or ''}
             except Exception as e: logger.warning(f"Error getting first animal data: {e}")
-        if not table_html.strip() and result_count == 0: table_html = '<tr class="empty-table-message"><td colspan="5">找不到符合條件的美容師</td></tr>'
-        return JsonResponse({'table_html': table_html, 'first_animal': first_animal_data})
+        # *** Fetch daily slots, no override ***
+        return animal_list_response(request, row_format, search_results, fetch_daily_slots=True, extra={'first_animal': first_animal_data},
+                                    empty_html='<tr class="empty-table-message"><td colspan="5">找不到符合條件的美容師</td></tr>' if result_count == 0 else None)
     except Exception as e: logger.error(f"Error during search AJAX for term '{term}': {e}", exc_info=True); error_html = '<tr class="empty-table-message"><td colspan="5">搜尋時發生內部錯誤</td></tr>'; return JsonResponse({'table_html': error_html, 'first_animal': {}}, status=500)
 
 
 # --- START: New Pre-booking Zone AJAX Views --- NEW ---
 
+def _pre_booking_dates_qs(today):
+    return PreBookingSlot.objects.filter(
+        date__gte=today,
+        animal__is_active=True # 只考慮活躍美容師的日期
+    ).filter(
+        Q(animal__hall__isnull=True) | Q(animal__hall__is_active=True) # 活躍館別或未分館
+    )
+
+def _pre_booking_dates_etag(request):
+    today = date.today()
+    stamp = _pre_booking_dates_qs(today).aggregate(last=Max('updated_at'), count=Count('id'), animals_last=Max('animal__updated_at'))
+    return data_version.make_etag('pre_booking_dates', today, stamp['last'], stamp['count'], stamp['animals_last'])
+
 @require_GET
+@version_etag_condition(_pre_booking_dates_etag)
 def ajax_get_pre_booking_dates(request):
     """獲取搶約專區可用的日期列表 (今天及未來)"""
     today = date.today()
     try:
         # 查詢 PreBookingSlot 中今天及未來的日期，去重並排序
-        dates_qs = PreBookingSlot.objects.filter(
-            date__gte=today,
-            animal__is_active=True # 只考慮活躍美容師的日期
-        ).filter(
-            Q(animal__hall__isnull=True) | Q(animal__hall__is_active=True) # 活躍館別或未分館
-        ).values_list('date', flat=True).distinct().order_by('date')
+        dates_qs = _pre_booking_dates_qs(today).values_list('date', flat=True).distinct().order_by('date')
 
         # 轉換為 'YYYY-MM-DD' 格式的列表
         available_dates = [d.isoformat() for d in dates_qs]
@@ -1399,6 +1608,8 @@ def ajax_get_pre_booking_slots(request):
     if not date_str:
         logger.warning("[AJAX PreBooking Slots] Request missing date.")
         return JsonResponse({'error': '請求缺少日期參數 (date)'}, status=400)
+    row_format = _get_row_format(request)
+    if row_format is None: return JsonResponse({'error': INVALID_ROW_FORMAT_ERROR}, status=400)
 
     try:
         selected_date = date.fromisoformat(date_str)
@@ -1416,8 +1627,6 @@ def ajax_get_pre_booking_slots(request):
             Q(animal__hall__isnull=True) | Q(animal__hall__is_active=True) # 活躍館別或未分館
         ).select_related(
             'animal', 'animal__hall'
-        ).annotate(
-            approved_review_count=Count('animal__reviews', filter=Q(animal__reviews__approved=True)) # Annotate review count on animal
         ).order_by(
             'animal__hall__order', 'animal__order', 'animal__name'
         )
@@ -1431,10 +1640,6 @@ def ajax_get_pre_booking_slots(request):
 
         logger.debug(f"[AJAX PreBooking Slots] Found {len(animals_for_render)} active animals for Date {selected_date.isoformat()}")
 
-        # *** MODIFIED CALL: Pass the slots_override_dict ***
-        table_html = render_animal_rows(request, animals_for_render, fetch_daily_slots=False, slots_override_dict=slots_override)
-        # *** ***
-
         first_animal_data = {}
         if animals_for_render:
             first_animal_obj = animals_for_render[0]
@@ -1447,13 +1652,66 @@ def ajax_get_pre_booking_slots(request):
             except Exception as e:
                 logger.warning(f"[AJAX PreBooking Slots] Error getting first animal data (Animal ID {first_animal_obj.id}): {e}")
 
-        return JsonResponse({'table_html': table_html, 'first_animal': first_animal_data})
+        # *** Pass the slots_override_dict ***
+        return animal_list_response(request, row_format, animals_for_render, slots_override_dict=slots_override, use_cache=True, extra={'first_animal': first_animal_data})
 
     except Exception as e:
         logger.error(f"[AJAX PreBooking Slots] Error processing for Date {date_str}: {e}", exc_info=True)
         error_html = f'<tr class="empty-table-message"><td colspan="5">載入搶約時段時發生內部錯誤</td></tr>'
         return JsonResponse({'table_html': error_html, 'first_animal': {}}, status=500)
 
+# --- 「某小時有空」搜尋 (使用 slot_status / slot_mask 索引欄位) ---
+@require_GET
+def ajax_get_free_at_hour(request):
+    """
+    列出指定小時有空的美容師 (跨館別)。
+    參數: hour (0-24，24 與 0 相同)，hall_id (選填，限定館別)，date (選填，YYYY-MM-DD，改查搶約專區)。
+    """
+    hour_str = request.GET.get('hour'); hall_id = request.GET.get('hall_id'); date_str = request.GET.get('date')
+    try:
+        hour = int(hour_str)
+        if not 0 <= hour <= 24: raise ValueError
+    except (ValueError, TypeError):
+        return JsonResponse({'error': '無效的小時 (hour 需為 0-24)'}, status=400)
+    try:
+        hall_id_int = int(hall_id) if hall_id else None
+        selected_date = date.fromisoformat(date_str) if date_str else None
+    except (ValueError, TypeError):
+        return JsonResponse({'error': '無效的館別 ID 或日期格式 (需要 YYYY-MM-DD)'}, status=400)
+    row_format = _get_row_format(request)
+    if row_format is None: return JsonResponse({'error': INVALID_ROW_FORMAT_ERROR}, status=400)
+    bit = hour_bit(hour)
+    logger.info(f"[AJAX Free At Hour] hour={hour}, hall_id={hall_id_int}, date={selected_date}")
+
+    try:
+        if selected_date:
+            slot_qs = PreBookingSlot.objects.filter(date=selected_date)
+        elif SCHEDULE_PARSER_ENABLED and DailySchedule is not None:
+            slot_qs = DailySchedule.objects.all()
+        else:
+            return JsonResponse({'table_html': '<tr class="empty-table-message"><td colspan="5">每日班表功能未啟用</td></tr>', 'count': 0}, status=501)
+        slot_qs = slot_qs.filter(slot_status=SlotStatus.HOURS).alias(
+            hour_match=F('slot_mask').bitand(bit)
+        ).filter(
+            hour_match=bit, animal__is_active=True
+        ).filter(
+            Q(animal__hall__isnull=True) | Q(animal__hall__is_active=True)
+        )
+        if hall_id_int: slot_qs = slot_qs.filter(animal__hall_id=hall_id_int)
+        slot_qs = slot_qs.select_related('animal', 'animal__hall').order_by('animal__hall__order', 'animal__order', 'animal__name')
+
+        animals_for_render = []; slots_override = {}
+        for slot in slot_qs:
+            if slot.animal_id in slots_override: continue
+            animals_for_render.append(slot.animal)
+            slots_override[slot.animal_id] = slot.time_slots
+        return animal_list_response(request, row_format, animals_for_render, slots_override_dict=slots_override, use_cache=True,
+                                    extra={'count': len(animals_for_render), 'hour': hour % 24})
+    except Exception as e:
+        logger.error(f"[AJAX Free At Hour] Error for hour {hour_str}: {e}", exc_info=True)
+        error_html = '<tr class="empty-table-message"><td colspan="5">搜尋時段時發生內部錯誤</td></tr>'
+        return JsonResponse({'table_html': error_html, 'count': 0}, status=500)
+
 # --- END: New Pre-booking Zone AJAX Views ---
 
 
@@ -1623,6 +1881,11 @@ def merge_transfer_animal_view(request, animal_id):
                         if history_marker not in current_aliases_set:
                             current_aliases_set.add(history_marker); logger.debug(f"{log_prefix} Added history marker '{history_marker}'.")
                     animal_original.aliases = list(current_aliases_set)
+                    # 心得已用 queryset.update() 轉移 (不觸發 signal)，在最後儲存前重新計算心得統計
+                    count_sq, latest_sq = Animal.review_stats_subqueries()
+                    review_stats = Animal.objects.filter(pk=animal_original.pk).annotate(stats_count=count_sq, stats_latest=latest_sq).values('stats_count', 'stats_latest').first() or {}
+                    animal_original.approved_review_count = review_stats.get('stats_count') or 0
+                    animal_original.last_review_approved_at = review_stats.get('stats_latest')
                     logger.debug(f"{log_prefix} Final state: Hall={animal_original.hall.name}, Name={animal_original.name}, Active={animal_original.is_active}, Aliases={animal_original.aliases}"); animal_original.save(); logger.info(f"{log_prefix} Final animal saved.")
 
                     # 7. Delete Duplicate
@@ -1662,7 +1925,7 @@ def _get_merge_view_context(request, animal_original, form):
     """輔助函數：準備合併/轉移表單模板的上下文數據"""
     approved_review_count = '錯誤'; story_review_count = '錯誤'; notes_count = '錯誤'; pending_count = '錯誤'; aliases_display_text = '錯誤'; daily_schedule_info = '未啟用或錯誤'
     try:
-        approved_review_count = Review.objects.filter(animal=animal_original, approved=True).count()
+        approved_review_count = animal_original.approved_review_count
         story_review_count = StoryReview.objects.filter(animal=animal_original, approved=True).count()
         notes_count = Note.objects.filter(animal=animal_original).count()
         pending_count = PendingAppointment.objects.filter(animal=animal_original).count()
@@ -68,12 +68,25 @@ ASGI_APPLICATION = 'mybackend.asgi.application' # <<<--- 指定 ASGI 應用入
 
 # --- Channel Layers 設定 (必要) ---
 # 使用記憶體作為 Channel Layer (適合開發，無需 Redis)
+# 同一台主機上的多個 Daphne worker 透過本機的 SQLite (WAL) 檔案 + Unix domain socket 通知互相廣播 (chat/layers.py)
+# path：所有 worker 共用的資料庫檔案 (每個專案各自一個，放在專案的 run 資料夾，不加入 git)；capacity / expiry / group_expiry 與 channels_redis 的意義相同
 CHANNEL_LAYERS = {
     "default": {
-        "BACKEND": "channels.layers.InMemoryChannelLayer"
+        "BACKEND": "chat.layers.LocalChannelLayer",
+        "CONFIG": {
+            "path": os.path.join(BASE_DIR, "run", "channel-layer.sqlite3"),
+            "capacity": 100,
+            "expiry": 60,
+        },
     }
 }
-# --- (如果你要用 Redis，請註解掉上面的 InMemory 設定，並取消下面區塊的註解) ---
+# --- (只跑一個 worker 時也可以改用 InMemory，不需要任何檔案) ---
+# CHANNEL_LAYERS = {
+#     "default": {
+#         "BACKEND": "channels.layers.InMemoryChannelLayer"
+#     }
+# }
+# --- (如果你要用 Redis，請註解掉上面的設定，並取消下面區塊的註解) ---
 # CHANNEL_LAYERS = {
 #     "default": {
 #         "BACKEND": "channels_redis.core.RedisChannelLayer",
@@ -82,6 +95,47 @@ CHANNEL_LAYERS = {
 #         },
 #     },
 # }
+# 聊天室：引用訊息用的最近訊息 LRU 大小 (每個行程一份，chat/consumers.py)
+CHAT_QUOTE_CACHE_SIZE = 1000
+# 聊天室：連線時送出的最近訊息數 (每個行程一份 ring buffer，chat/consumers.py MessageHistory)
+CHAT_HISTORY_SIZE = 50
+# 聊天室：訊息 write-behind 批次寫入 (chat/persistence.py)，每隔 INTERVAL_MS 毫秒或累積 BATCH_SIZE 則寫入一次
+CHAT_WRITE_BEHIND = True
+CHAT_WRITE_BEHIND_INTERVAL_MS = 200
+CHAT_WRITE_BEHIND_BATCH_SIZE = 200
+
+# --- 快取設定 ---
+# 預設使用記憶體快取 (每個行程各自一份)
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "bkgg-default",
+        "OPTIONS": {"MAX_ENTRIES": 5000},
+    }
+}
+# --- (單機多個 worker 想共用快取時，可改用下面的檔案快取) ---
+# CACHES = {
+#     "default": {
+#         "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+#         "LOCATION": os.path.join(BASE_DIR, "cache"),
+#         "OPTIONS": {"MAX_ENTRIES": 20000},
+#     }
+# }
+# 美容師列表單行 HTML 片段快取 (myapp/row_cache.py)
+ANIMAL_ROW_CACHE_ALIAS = "default"
+ANIMAL_ROW_CACHE_TIMEOUT = 60 * 60 # 秒
+# 有效限時動態工作集 (myapp/active_stories.py)；版本號存在資料庫，各 worker 讀取時自行移除到期項目
+ACTIVE_STORIES_CACHE_ALIAS = "default"
+ACTIVE_STORIES_CACHE_TIMEOUT = 60 * 60 # 秒 (每個版本各自一個 key，舊版本自然過期)
+# 個人檔案統計快取 (myapp/profile_stats.py)，相關資料寫入時由 signals 失效
+PROFILE_STATS_CACHE_ALIAS = "default"
+PROFILE_STATS_CACHE_TIMEOUT = 5 * 60 # 秒
+# 列表 AJAX 的 JSON 格式 (format=json)：首頁前端預設格式 ('html' 或 'json')，與不含使用者狀態的回應可被共用快取的秒數
+ANIMAL_ROWS_CLIENT_FORMAT = "html"
+AJAX_SHARED_MAX_AGE = 30 # 秒
+# 美容師心得列表 (add_review GET) 每頁筆數與 page_size 上限
+REVIEW_FEED_PAGE_SIZE = 20
+REVIEW_FEED_MAX_PAGE_SIZE = 50
 
 # --- 資料庫設定 ---
 DATABASES = {
@@ -0,0 +1,257 @@
+# D:\bkgg\mybackend\schedule_parser\bulk_import.py
+"""
+多館別班表批次匯入 (import_schedules 指令與 bulk_import_view 共用)。
+
+流程：
+1. collect_sources()：從資料夾或壓縮檔 (.zip / .tar / .tar.gz) 讀出 *.txt，對應到館別。
+   對應方式優先使用其中的 halls.json ({"檔名.txt": 館別 ID/名稱 或 {"hall": ..., "format": ...}})，
+   否則以檔名 (不含副檔名) 比對館別 ID 或名稱。
+2. parse_sources()：以 process pool 平行解析 (只做純文字處理，不碰資料庫)。
+   指令使用預設的 fork；網頁請求 (多執行緒的伺服器) 不可 fork，改用 spawn 並限制行程數 (見 bulk_import_view)。
+3. save_hall_schedule()：每個館別一個 transaction，以 HallAnimalIndex 一次查詢預取該館美容師做名字比對，
+   再以 DailySchedule.sync_hall() 只寫入有變動的班表。
+"""
+import io
+import json
+import logging
+import os
+import tarfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from django.db import transaction
+
+from myapp.models import Hall, Animal
+from .matching import HallAnimalIndex
+from .models import DailySchedule
+from .registry import parse_in_worker
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = 'halls.json'
+
+
+class BulkImportError(Exception):
+    """來源無法讀取或檔案無法對應到館別。"""
+
+
+class ScheduleSource:
+    """一個待匯入的班表檔案。"""
+
+    def __init__(self, filename, text, hall, format_key):
+        self.filename = filename
+        self.text = text
+        self.hall = hall
+        self.format_key = format_key
+
+
+# --- 讀取來源 ---
+def _decode(raw, filename):
+    try:
+        return raw.decode('utf-8-sig')
+    except UnicodeDecodeError as e:
+        raise BulkImportError(f"{filename}: 不是 UTF-8 文字檔 ({e})")
+
+
+def _read_directory(path):
+    files = {}
+    for file_path in sorted(path.rglob('*')):
+        if file_path.is_file():
+            files[file_path.relative_to(path).as_posix()] = file_path.read_bytes()
+    return files
+
+
+def _read_zip(fileobj):
+    files = {}
+    with zipfile.ZipFile(fileobj) as archive:
+        for info in archive.infolist():
+            if not info.is_dir(): files[info.filename] = archive.read(info)
+    return files
+
+
+def _read_tar(fileobj):
+    files = {}
+    with tarfile.open(fileobj=fileobj, mode='r:*') as archive:
+        for member in archive.getmembers():
+            if member.isfile(): files[member.name] = archive.extractfile(member).read()
+    return files
+
+
+def read_archive(fileobj, name=''):
+    """由上傳的壓縮檔 (file-like) 讀出 {路徑: bytes}。"""
+    data = fileobj.read()
+    if zipfile.is_zipfile(io.BytesIO(data)):
+        return _read_zip(io.BytesIO(data))
+    try:
+        return _read_tar(io.BytesIO(data))
+    except tarfile.TarError:
+        raise BulkImportError(f"{name or '上傳檔案'}: 不支援的壓縮格式 (僅支援 zip / tar / tar.gz)")
+
+
+def read_path(path):
+    path = Path(path)
+    if path.is_dir(): return _read_directory(path)
+    if not path.is_file(): raise BulkImportError(f"{path}: 找不到檔案或資料夾")
+    with open(path, 'rb') as f:
+        return read_archive(f, name=str(path))
+
+
+def _build_hall_lookup():
+    halls = list(Hall.objects.filter(is_active=True))
+    by_id = {str(h.id): h for h in halls}
+    by_name = {}
+    for h in halls: by_name.setdefault(h.name.strip().lower(), h)
+    return by_id, by_name
+
+
+def _resolve_hall(ref, by_id, by_name):
+    ref = str(ref).strip()
+    return by_id.get(ref) or by_name.get(ref.lower())
+
+
+def collect_sources(files, format_override=None):
+    """
+    files: {路徑: bytes}。回傳 (sources, errors)。
+    format_override 指定時 (例如 'auto') 取代各館別設定的格式。
+    """
+    manifest = {}
+    manifest_path = next((p for p in files if os.path.basename(p) == MANIFEST_NAME), None)
+    if manifest_path:
+        try:
+            manifest = json.loads(_decode(files[manifest_path], manifest_path))
+            assert isinstance(manifest, dict)
+        except (ValueError, AssertionError) as e:
+            raise BulkImportError(f"{manifest_path}: 格式錯誤 ({e})")
+        manifest = {os.path.basename(k): v for k, v in manifest.items()}
+
+    by_id, by_name = _build_hall_lookup()
+    sources, errors = [], []
+    for path, raw in sorted(files.items()):
+        filename = os.path.basename(path)
+        if not filename.lower().endswith('.txt') or filename.startswith('.'): continue
+        entry = manifest.get(filename, os.path.splitext(filename)[0])
+        hall_ref, format_key = (entry.get('hall'), entry.get('format')) if isinstance(entry, dict) else (entry, None)
+        hall = _resolve_hall(hall_ref, by_id, by_name)
+        if hall is None:
+            errors.append({'file': filename, 'error': f'找不到對應的啟用館別: {hall_ref}'})
+            continue
+        try:
+            text = _decode(raw, filename)
+        except BulkImportError as e:
+            errors.append({'file': filename, 'hall': hall.name, 'error': str(e)})
+            continue
+        sources.append(ScheduleSource(filename, text, hall, format_override or format_key or hall.schedule_format_type))
+    return sources, errors
+
+
+# --- 解析 ---
+def parse_sources(sources, workers=None, mp_context=None):
+    """
+    平行解析所有來源，回傳與 sources 對應的 [(格式, 區塊, 錯誤), ...]。
+    workers <= 1 或只有一個來源時直接在目前行程解析。mp_context 為 None 時使用平台預設 (Linux 為 fork)。
+    """
+    if not sources: return []
+    if workers is None: workers = min(len(sources), os.cpu_count() or 1)
+    if workers <= 1 or len(sources) == 1:
+        return [parse_in_worker(s.format_key, s.text) for s in sources]
+    with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context) as pool:
+        return list(pool.map(parse_in_worker, [s.format_key for s in sources], [s.text for s in sources]))
+
+
+# --- 比對與寫入 ---
+def save_hall_schedule(hall, blocks, create_missing=False, update_fee=False, dry_run=False):
+    """
+    以名字 (不分大小寫、限定館別，其次別名) 比對美容師並覆寫該館今日班表。
+    回傳統計 dict；dry_run 時只比對不寫入。
+    """
+    summary = {'hall_id': hall.id, 'hall': hall.name, 'blocks': len(blocks), 'matched': 0, 'created': 0,
+               'fee_updated': 0, 'schedules': 0, 'unmatched': [], 'duplicates': []}
+
+    with transaction.atomic():
+        # 一次查詢預取該館所有啟用中的美容師 (名字優先，其次別名，與預覽相同)
+        name_index = HallAnimalIndex.load(hall)
+
+        slots_by_animal = {}  # animal_id -> 時段 (保留班表中的順序)
+        fee_updates = []
+        for block in blocks:
+            name = (block or {}).get('name')
+            if not name: continue
+            animal, _ = name_index.match(name)
+            if animal is None:
+                if not create_missing or dry_run:
+                    summary['unmatched'].append(name)  # dry run 時列為未比對 (實際執行會新增)
+                    continue
+                alias = block.get('alias_suggestion')
+                animal = Animal.objects.create(
+                    name=name, hall=hall, fee=block.get('parsed_fee'), height=block.get('height'),
+                    weight=block.get('weight'), cup_size=block.get('cup'), introduction=block.get('introduction'),
+                    is_active=True, order=999, aliases=[alias] if isinstance(alias, str) and alias else [],
+                )
+                name_index.add(animal)
+                summary['created'] += 1
+                logger.info(f"Bulk import created Animal ID {animal.id} '{name}' in hall '{hall.name}'")
+            else:
+                summary['matched'] += 1
+                new_fee = block.get('parsed_fee')
+                if update_fee and new_fee is not None and animal.fee != new_fee:
+                    animal.fee = new_fee
+                    fee_updates.append(animal)
+            if animal.id in slots_by_animal:
+                summary['duplicates'].append(name)
+                continue
+            slots_by_animal[animal.id] = block.get('time_slots') or ""
+
+        summary['fee_updated'] = len(fee_updates)
+        summary['schedules'] = len(slots_by_animal)
+        if dry_run:
+            transaction.set_rollback(True)
+            return summary
+
+        # 逐筆 save 以觸發 signals (美容師列表快取淘汰)；每日需更新費用的筆數很少
+        for animal in fee_updates:
+            animal.save(update_fields=['fee'])
+        diff = DailySchedule.sync_hall(hall, slots_by_animal)
+        summary['diff'] = diff.as_dict()
+        logger.info(f"Bulk import synced schedules for hall '{hall.name}': {diff!r}")
+    return summary
+
+
+def run_bulk_import(files, workers=None, create_missing=False, update_fee=False, dry_run=False, format_override=None, mp_context=None):
+    """
+    完整流程：對應館別 -> 平行解析 -> 逐館寫入。
+    回傳 {'halls': [...每館統計...], 'errors': [...], 'totals': {...}}；單一館別失敗不影響其他館別。
+    """
+    sources, errors = collect_sources(files, format_override=format_override)
+    seen_halls = set()
+    unique_sources = []
+    for source in sources:
+        if source.hall.id in seen_halls:
+            errors.append({'file': source.filename, 'hall': source.hall.name, 'error': '同一館別有多個班表檔案，已略過'})
+            continue
+        seen_halls.add(source.hall.id)
+        unique_sources.append(source)
+
+    results = []
+    for source, (format_key, blocks, parse_error) in zip(unique_sources, parse_sources(unique_sources, workers, mp_context)):
+        if parse_error or not format_key:
+            errors.append({'file': source.filename, 'hall': source.hall.name,
+                           'error': parse_error or '無法自動判斷班表格式'})
+            continue
+        if not blocks:
+            # 解析不出任何區塊時不覆寫班表，避免格式錯誤清空整館
+            errors.append({'file': source.filename, 'hall': source.hall.name, 'error': f'以格式 {format_key} 解析不到任何區塊'})
+            continue
+        try:
+            summary = save_hall_schedule(source.hall, blocks, create_missing=create_missing,
+                                         update_fee=update_fee, dry_run=dry_run)
+        except Exception as e:
+            logger.error(f"Bulk import failed for hall '{source.hall.name}' ({source.filename})", exc_info=True)
+            errors.append({'file': source.filename, 'hall': source.hall.name, 'error': f"{type(e).__name__}: {e}"})
+            continue
+        summary.update({'file': source.filename, 'format': format_key})
+        results.append(summary)
+
+    totals = {k: sum(r[k] for r in results) for k in ('blocks', 'matched', 'created', 'fee_updated', 'schedules')}
+    totals.update({'halls': len(results), 'errors': len(errors)})
+    return {'halls': results, 'errors': errors, 'totals': totals, 'dry_run': dry_run}
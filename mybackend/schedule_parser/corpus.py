@@ -0,0 +1,90 @@
+# D:\bkgg\mybackend\schedule_parser\corpus.py
+"""
+班表解析器的標準樣本 (golden corpus) 與合成班表產生器。
+
+- golden/<格式>.txt：各格式的真實樣式班表文字。
+- golden/<格式>.expected.json：該文字經對應解析器的預期輸出，由 bench_schedule_parsers --update-golden 產生。
+- generate_schedule()：依格式產生任意數量區塊的合成班表，用於量測吞吐量。
+"""
+import json
+import random
+from pathlib import Path
+
+GOLDEN_DIR = Path(__file__).resolve().parent / 'golden'
+
+# 合成名字用的字 (不含數字與符號，避免被各格式誤判為費用/時段)
+_NAME_CHARS = "美花雪雲月星晴琪萱妍婷涵瑤詩語心安樂甜柔"
+_CUPS = "BCDEF"
+
+# 各格式單一區塊的模板，欄位: name, fee, height, weight, cup, slots (點分隔時段), intro
+_BLOCK_TEMPLATES = {
+    'format_a': "({fee}) {name} 👙 {height}/{weight}/{cup}\n{intro}\n⏰ {slots}",
+    'chatanghui': "({index:02d})【{name}】{fee}\n{slots}\n{height}/{weight}/{cup}\n{intro}",
+    'xinyuan': "《{fee}》{name} {height}.{weight}.{cup}\n{slots_dash}\n{intro}",
+    'shouzhongqing': "({fee}) {name} 👙 {height} / {weight} / {cup}\n⏰ {slots}\n{intro}",
+    'pokemon': "({fee}) {name} {height}.{weight}.{cup}\n🈳{slots}\n{intro}",
+    'aibao': "({fee}) {name} {slots}\n({height}.{weight}.{cup}) {intro}",
+    'hanxiang': "({fee}) {name} {height}/{weight}/{cup}\n◆ {intro}\n{slots}",
+    'pandora': "【{fee}】{name} {height}.{weight}.{cup}\n<{intro}>\n🈳{slots}",
+    'wangfei': "{name} {fee}\n{intro}\n⏰{slots_comma}",
+    'lezuan': "{name} ({fee_tens})({fee_ones})單\n⏰ {slots}\n{intro}",
+}
+# 部分格式在第一個區塊前有公告文字
+_HEADERS = {
+    'wangfei': "注意事項\n請提前預約",
+}
+
+
+def golden_formats():
+    """有樣本文字的格式 key (依檔名排序)。"""
+    return sorted(p.stem for p in GOLDEN_DIR.glob('*.txt'))
+
+
+def load_sample(format_key):
+    return (GOLDEN_DIR / f"{format_key}.txt").read_text(encoding='utf-8')
+
+
+def load_expected(format_key):
+    """回傳預期解析結果 (list of dict)，尚未產生時回傳 None。"""
+    path = GOLDEN_DIR / f"{format_key}.expected.json"
+    if not path.exists(): return None
+    return json.loads(path.read_text(encoding='utf-8'))
+
+
+def write_expected(format_key, blocks):
+    path = GOLDEN_DIR / f"{format_key}.expected.json"
+    path.write_text(json.dumps(blocks, ensure_ascii=False, indent=2, sort_keys=True) + "\n", encoding='utf-8')
+    return path
+
+
+def normalize_blocks(blocks):
+    """轉為與 JSON 檔相同的型別 (tuple -> list 等)，方便直接比較。"""
+    return json.loads(json.dumps(blocks, ensure_ascii=False, sort_keys=True))
+
+
+def _synthetic_name(index):
+    # 以 20 進位將序號轉為 2~3 個字的名字，保證不重複
+    chars = []
+    n = index + len(_NAME_CHARS)
+    while n:
+        n, r = divmod(n, len(_NAME_CHARS))
+        chars.append(_NAME_CHARS[r])
+    return ''.join(reversed(chars))
+
+
+def generate_schedule(format_key, block_count, seed=0):
+    """產生 block_count 個區塊的合成班表文字；格式不支援時拋出 KeyError。"""
+    template = _BLOCK_TEMPLATES[format_key]
+    rng = random.Random(seed)
+    parts = [_HEADERS[format_key]] if format_key in _HEADERS else []
+    for index in range(1, block_count + 1):
+        fee = rng.randint(25, 45)
+        start = rng.randint(12, 20)
+        hours = [str(h if h < 24 else h - 24) for h in range(start, start + rng.randint(2, 6))]
+        parts.append(template.format(
+            index=index % 100, name=_synthetic_name(index), fee=fee, fee_tens=fee // 10, fee_ones=fee % 10,
+            height=rng.randint(150, 175), weight=rng.randint(40, 60), cup=rng.choice(_CUPS),
+            slots='.'.join(hours), slots_dash='-'.join(hours), slots_comma='、'.join(hours),
+            intro=rng.choice(["甜美可愛", "溫柔體貼", "好聊", "氣質", "活潑 新人"]),
+        ))
+    return "\n".join(parts) + "\n"
@@ -0,0 +1,146 @@
+# D:\bkgg\mybackend\schedule_parser\management\commands\bench_schedule_parsers.py
+import json
+import logging
+import os
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from schedule_parser.corpus import (
+    golden_formats, load_sample, load_expected, write_expected, normalize_blocks, generate_schedule,
+)
+from schedule_parser.registry import registered_formats
+
+
+class Command(BaseCommand):
+    help = ("檢查各班表解析器的輸出是否與 golden 樣本相同，並以合成班表量測吞吐量 (blocks/sec)、"
+            "每行延遲與記憶體峰值 (含由檔案串流解析的峰值)；輸出漂移或吞吐量退步時以非零狀態結束 (不需資料庫)。")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--formats', default='', help="只測試指定格式，以逗號分隔 (預設全部)")
+        parser.add_argument('--blocks', type=int, default=2000, help="合成班表的區塊數 (預設 2000)")
+        parser.add_argument('--repeat', type=int, default=3, help="每個格式重複次數，取最佳值 (預設 3)")
+        parser.add_argument('--baseline', help="吞吐量基準 JSON 檔；低於基準 (扣除容忍度) 時失敗")
+        parser.add_argument('--tolerance', type=float, default=0.25, help="可容忍的吞吐量退步比例 (預設 0.25)")
+        parser.add_argument('--save-baseline', help="將本次 blocks/sec 寫入指定 JSON 檔作為之後的基準")
+        parser.add_argument('--update-golden', action='store_true', help="以目前解析結果覆寫 golden/*.expected.json")
+        parser.add_argument('--skip-bench', action='store_true', help="只比對 golden 樣本，不跑吞吐量測試")
+
+    def handle(self, *args, **options):
+        formats = registered_formats()
+        if options['formats']:
+            wanted = {k.strip() for k in options['formats'].split(',') if k.strip()}
+            unknown = wanted - {f.key for f in formats}
+            if unknown: raise CommandError(f"未登記的格式: {', '.join(sorted(unknown))}")
+            formats = [f for f in formats if f.key in wanted]
+
+        # 解析器會對不完整區塊大量輸出 warning，量測期間關閉
+        logging.disable(logging.WARNING)
+        try:
+            failures = self._check_golden(formats, options['update_golden'])
+            results = {} if options['skip_bench'] else self._bench(formats, max(1, options['blocks']), max(1, options['repeat']))
+        finally:
+            logging.disable(logging.NOTSET)
+
+        if results and options['baseline']:
+            failures += self._compare_baseline(results, options['baseline'], options['tolerance'])
+        if results and options['save_baseline']:
+            Path(options['save_baseline']).write_text(
+                json.dumps({k: round(r['blocks_per_sec'], 1) for k, r in results.items()}, indent=2, sort_keys=True) + "\n",
+                encoding='utf-8')
+            self.stdout.write(f"Baseline written to {options['save_baseline']}")
+
+        if failures:
+            for msg in failures: self.stderr.write(self.style.ERROR(msg))
+            raise CommandError(f"{len(failures)} check(s) failed.")
+        self.stdout.write(self.style.SUCCESS("All parser checks passed."))
+
+    def _check_golden(self, formats, update):
+        failures = []
+        available = set(golden_formats())
+        for fmt in formats:
+            if fmt.key not in available:
+                failures.append(f"[{fmt.key}] 缺少 golden 樣本 golden/{fmt.key}.txt")
+                continue
+            actual = normalize_blocks(fmt.parse(load_sample(fmt.key)))
+            if update:
+                path = write_expected(fmt.key, actual)
+                self.stdout.write(f"[{fmt.key}] golden updated: {path.name} ({len(actual)} blocks)")
+                continue
+            expected = load_expected(fmt.key)
+            if expected is None:
+                failures.append(f"[{fmt.key}] 缺少預期結果，請先執行 --update-golden")
+            elif actual != expected:
+                failures.append(f"[{fmt.key}] 解析結果與 golden 不同: {self._first_diff(expected, actual)}")
+            else:
+                self.stdout.write(f"[{fmt.key}] golden OK ({len(actual)} blocks)")
+        return failures
+
+    def _first_diff(self, expected, actual):
+        if len(expected) != len(actual): return f"區塊數 {len(expected)} -> {len(actual)}"
+        for i, (e, a) in enumerate(zip(expected, actual)):
+            if e == a: continue
+            keys = sorted(k for k in set(e or {}) | set(a or {}) if (e or {}).get(k) != (a or {}).get(k))
+            return f"block {i}: " + ", ".join(f"{k}: {(e or {}).get(k)!r} -> {(a or {}).get(k)!r}" for k in keys)
+        return "unknown"
+
+    def _bench(self, formats, block_count, repeat):
+        results = {}
+        self.stdout.write(f"\n{'format':<14} {'blocks':>7} {'lines':>7} {'blocks/sec':>12} {'us/line':>9} {'peak KiB':>10} {'stream KiB':>11}")
+        for fmt in formats:
+            text = generate_schedule(fmt.key, block_count)
+            line_count = text.count('\n')
+            best = None; parsed = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                parsed = fmt.parse(text)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            if len(parsed) != block_count:
+                raise CommandError(f"[{fmt.key}] 合成班表應解析出 {block_count} 個區塊，實際 {len(parsed)}")
+            # 記憶體峰值另外量一次，避免 tracemalloc 的開銷影響計時
+            tracemalloc.start()
+            fmt.parse(text)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            stream_peak = self._stream_peak(fmt, text) if fmt.stream else None
+            blocks_per_sec = block_count / best if best else float('inf')
+            per_line_us = best / line_count * 1e6 if line_count else 0.0
+            results[fmt.key] = {'blocks_per_sec': blocks_per_sec, 'per_line_us': per_line_us, 'peak_kib': peak / 1024,
+                                'stream_peak_kib': stream_peak / 1024 if stream_peak is not None else None}
+            stream_col = f"{stream_peak / 1024:>11.1f}" if stream_peak is not None else f"{'-':>11}"
+            self.stdout.write(f"{fmt.key:<14} {block_count:>7} {line_count:>7} {blocks_per_sec:>12.0f} {per_line_us:>9.2f} {peak / 1024:>10.1f} {stream_col}")
+        return results
+
+    def _stream_peak(self, fmt, text):
+        """由暫存檔逐行串流解析 (不保留結果) 的記憶體峰值。"""
+        fd, path = tempfile.mkstemp(suffix='.txt')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f: f.write(text)
+            tracemalloc.start()
+            with open(path, encoding='utf-8') as f:
+                count = sum(1 for _ in fmt.stream(f))
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        finally:
+            os.unlink(path)
+        if count != len(fmt.parse(text)):
+            raise CommandError(f"[{fmt.key}] 串流解析的區塊數 ({count}) 與一次解析不同")
+        return peak
+
+    def _compare_baseline(self, results, baseline_path, tolerance):
+        try:
+            baseline = json.loads(Path(baseline_path).read_text(encoding='utf-8'))
+        except (OSError, ValueError) as e:
+            raise CommandError(f"無法讀取基準檔 {baseline_path}: {e}")
+        failures = []
+        for key, result in results.items():
+            reference = baseline.get(key)
+            if not reference: continue
+            floor = reference * (1 - tolerance)
+            if result['blocks_per_sec'] < floor:
+                failures.append(f"[{key}] 吞吐量退步: {result['blocks_per_sec']:.0f} blocks/sec < {floor:.0f} (基準 {reference:.0f}, 容忍 {tolerance:.0%})")
+        return failures
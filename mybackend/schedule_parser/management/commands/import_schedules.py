@@ -0,0 +1,60 @@
+# D:\bkgg\mybackend\schedule_parser\management\commands\import_schedules.py
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from schedule_parser.bulk_import import BulkImportError, read_path, run_bulk_import
+
+
+class Command(BaseCommand):
+    help = ("由資料夾或壓縮檔 (.zip / .tar / .tar.gz) 批次匯入多館別今日班表。"
+            "檔名 (不含 .txt) 為館別 ID 或名稱，或以 halls.json 指定對應；每館一個 transaction。")
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="班表資料夾或壓縮檔路徑")
+        parser.add_argument('--workers', type=int, default=None, help="平行解析的行程數 (預設為 CPU 數，1 表示不平行)")
+        parser.add_argument('--format', dest='format_override', default=None,
+                            help="以指定格式 (或 auto 自動判斷) 取代各館別設定的格式")
+        parser.add_argument('--create-missing', action='store_true', help="找不到的美容師自動新增 (預設只略過並列出)")
+        parser.add_argument('--update-fee', action='store_true', help="以班表中的費用更新已存在的美容師")
+        parser.add_argument('--dry-run', action='store_true', help="只解析與比對，不寫入資料庫")
+        parser.add_argument('--json', action='store_true', help="以 JSON 輸出完整報告")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            files = read_path(options['path'])
+            report = run_bulk_import(
+                files, workers=options['workers'], create_missing=options['create_missing'],
+                update_fee=options['update_fee'], dry_run=options['dry_run'], format_override=options['format_override'],
+            )
+        except BulkImportError as e:
+            raise CommandError(str(e))
+        elapsed = time.perf_counter() - start
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
+        else:
+            self._write_summary(report, elapsed)
+        if report['errors'] and not report['halls']:
+            raise CommandError("沒有任何館別匯入成功。")
+
+    def _write_summary(self, report, elapsed):
+        self.stdout.write(f"{'hall':<16} {'format':<14} {'blocks':>6} {'matched':>7} {'created':>7} {'fee':>4} {'saved':>6} {'+/~/-':>10}  unmatched")
+        for r in report['halls']:
+            unmatched = ', '.join(r['unmatched'][:5]) + (' ...' if len(r['unmatched']) > 5 else '')
+            diff = r.get('diff')
+            diff_col = f"{len(diff['created'])}/{len(diff['updated'])}/{len(diff['deleted'])}" if diff else '-'
+            self.stdout.write(f"{r['hall'][:16]:<16} {r['format']:<14} {r['blocks']:>6} {r['matched']:>7} {r['created']:>7} "
+                              f"{r['fee_updated']:>4} {r['schedules']:>6} {diff_col:>10}  {unmatched}")
+        for err in report['errors']:
+            self.stderr.write(self.style.ERROR(f"{err['file']}: {err['error']}"))
+        totals = report['totals']
+        prefix = "Dry run: " if report['dry_run'] else ""
+        style = self.style.WARNING if report['errors'] else self.style.SUCCESS
+        self.stdout.write(style(
+            f"{prefix}{totals['halls']} halls, {totals['schedules']} schedules "
+            f"({totals['created']} animals created, {totals['fee_updated']} fees updated), "
+            f"{totals['errors']} errors in {elapsed:.2f}s."
+        ))
@@ -0,0 +1,55 @@
+# D:\bkgg\mybackend\schedule_parser\matching.py
+"""
+班表名字比對：每個請求 (或每個館別) 只查詢一次該館所有啟用中的美容師，之後全部在記憶體中比對。
+
+- 主要 key：名字 (casefold，等同過去的 name__iexact)。
+- 次要 key：Animal.aliases 中的別名，只在沒有同名美容師時使用。
+同一個 key 對到多位美容師時，取預設排序 (order, name) 的第一位，與過去 .first() 的結果一致。
+"""
+from myapp.models import Animal
+
+MATCHED_BY_NAME = 'name'
+MATCHED_BY_ALIAS = 'alias'
+
+
+def normalize_name(name):
+    return name.strip().casefold() if isinstance(name, str) else ''
+
+
+class HallAnimalIndex:
+    """單一館別的美容師名字索引。"""
+
+    def __init__(self, hall, animals):
+        self.hall = hall
+        self.by_id = {}
+        self.by_name = {}
+        self.by_alias = {}
+        for animal in animals:
+            self.add(animal)
+
+    @classmethod
+    def load(cls, hall):
+        """一次查詢載入該館所有啟用中的美容師。"""
+        return cls(hall, Animal.objects.filter(hall=hall, is_active=True))
+
+    def add(self, animal):
+        """加入 (例如剛新增的) 美容師；已存在的 key 不會被覆蓋。"""
+        self.by_id.setdefault(animal.id, animal)
+        key = normalize_name(animal.name)
+        if key: self.by_name.setdefault(key, animal)
+        for alias in animal.aliases if isinstance(animal.aliases, list) else []:
+            alias_key = normalize_name(alias)
+            if alias_key: self.by_alias.setdefault(alias_key, animal)
+
+    def match(self, name):
+        """回傳 (Animal 或 None, 'name' / 'alias' / None)。名字優先於別名。"""
+        key = normalize_name(name)
+        if not key: return None, None
+        animal = self.by_name.get(key)
+        if animal is not None: return animal, MATCHED_BY_NAME
+        animal = self.by_alias.get(key)
+        if animal is not None: return animal, MATCHED_BY_ALIAS
+        return None, None
+
+    def __len__(self):
+        return len(self.by_id)
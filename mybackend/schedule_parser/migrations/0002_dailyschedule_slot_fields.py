@@ -0,0 +1,40 @@
+# Generated by Django 5.1.7 on 2026-10-18 09:46
+
+from django.db import migrations, models
+
+from myapp.time_slots import encode_time_slots
+
+
+def populate_slot_fields(apps, schema_editor):
+    DailySchedule = apps.get_model('schedule_parser', 'DailySchedule')
+    rows = []
+    for row in DailySchedule.objects.only('id', 'time_slots').iterator(chunk_size=500):
+        row.slot_mask, row.slot_status = encode_time_slots(row.time_slots)
+        rows.append(row)
+    DailySchedule.objects.bulk_update(rows, ['slot_mask', 'slot_status'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapp', '0036_prebookingslot_slot_fields'),
+        ('schedule_parser', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailyschedule',
+            name='slot_mask',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='bit h 代表 h 點有空 (0-23)', verbose_name='時段遮罩'),
+        ),
+        migrations.AddField(
+            model_name='dailyschedule',
+            name='slot_status',
+            field=models.PositiveSmallIntegerField(choices=[(0, '未排班'), (1, '有時段'), (2, '預約滿'), (3, '人到再約'), (4, '其他')], default=0, editable=False, verbose_name='時段狀態'),
+        ),
+        migrations.AddIndex(
+            model_name='dailyschedule',
+            index=models.Index(fields=['slot_status', 'slot_mask'], name='dailysched_status_mask_idx'),
+        ),
+        migrations.RunPython(populate_slot_fields, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,35 @@
 # D:\bkgg\mybackend\schedule_parser\models.py
-from django.db import models
+from django.db import models, transaction
 from myapp.models import Hall, Animal # 從 myapp 導入 Hall 和 Animal
+from myapp.time_slots import SlotStatus, apply_slot_fields, hour_bit
 from django.utils import timezone
 
+from .signals import daily_schedule_changed
+
+
+class ScheduleDiff:
+    """DailySchedule.sync_hall() 的結果：各類變動的美容師 ID 列表。"""
+
+    def __init__(self, created=(), updated=(), deleted=(), unchanged=()):
+        self.created = list(created)
+        self.updated = list(updated)
+        self.deleted = list(deleted)
+        self.unchanged = list(unchanged)
+
+    @property
+    def changed_animal_ids(self):
+        return self.created + self.updated + self.deleted
+
+    def __bool__(self):
+        return bool(self.created or self.updated or self.deleted)
+
+    def as_dict(self):
+        return {'created': self.created, 'updated': self.updated, 'deleted': self.deleted, 'unchanged': len(self.unchanged)}
+
+    def __repr__(self):
+        return f"<ScheduleDiff +{len(self.created)} ~{len(self.updated)} -{len(self.deleted)} ={len(self.unchanged)}>"
+
+
 class DailySchedule(models.Model):
     hall = models.ForeignKey(
         Hall,
@@ -23,6 +50,9 @@ class DailySchedule(models.Model):
         null=True,
         help_text='例如 "14.15.16", "預約滿", "人到再約"'
     )
+    # 由 time_slots 推導 (myapp.time_slots)，供「某小時有空」查詢使用；save() / sync_hall() 時自動更新
+    slot_mask = models.PositiveIntegerField("時段遮罩", default=0, editable=False, help_text="bit h 代表 h 點有空 (0-23)")
+    slot_status = models.PositiveSmallIntegerField("時段狀態", choices=SlotStatus.choices, default=SlotStatus.EMPTY, editable=False)
     # 使用 default 可以在創建時設置，並允許後續更新
     updated_at = models.DateTimeField("更新時間", default=timezone.now)
 
@@ -35,6 +65,8 @@ class DailySchedule(models.Model):
         indexes = [
             models.Index(fields=['hall']),
             models.Index(fields=['animal']),
+            # 先以狀態縮小範圍，再對遮罩做位元運算 (每館每位美容師一列，資料量小)
+            models.Index(fields=['slot_status', 'slot_mask'], name='dailysched_status_mask_idx'),
         ]
 
     def __str__(self):
@@ -45,4 +77,54 @@ class DailySchedule(models.Model):
     # 覆蓋 save 以確保 updated_at 更新
     def save(self, *args, **kwargs):
         self.updated_at = timezone.now()
-        super().save(*args, **kwargs)
\ No newline at end of file
+        apply_slot_fields(self)
+        if kwargs.get('update_fields') is not None and 'time_slots' in kwargs['update_fields']:
+            kwargs['update_fields'] = set(kwargs['update_fields']) | {'slot_mask', 'slot_status', 'updated_at'}
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def free_at_hour(cls, hour, queryset=None):
+        """hour 點 (0-23，24 視為 0) 有空的班表。"""
+        queryset = cls.objects.all() if queryset is None else queryset
+        bit = hour_bit(hour)
+        return queryset.filter(slot_status=SlotStatus.HOURS).alias(
+            hour_match=models.F('slot_mask').bitand(bit)
+        ).filter(hour_match=bit)
+
+    @classmethod
+    def sync_hall(cls, hall, slots_by_animal):
+        """
+        將館別的今日班表同步為 slots_by_animal ({animal_id: 時段字串})，只寫入有變動的資料列：
+        新美容師 bulk_create (衝突時改為更新)、時段不同者 bulk_update、不在新班表中者刪除；
+        時段相同的資料列 (含 updated_at) 保持不動。回傳 ScheduleDiff，並在提交後送出 daily_schedule_changed。
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            current = {row.animal_id: row for row in cls.objects.select_for_update().filter(hall=hall)}
+            to_create, to_update, unchanged = [], [], []
+            for animal_id, slots in slots_by_animal.items():
+                slots = slots or ""
+                row = current.pop(animal_id, None)
+                if row is None:
+                    to_create.append(apply_slot_fields(cls(hall=hall, animal_id=animal_id, time_slots=slots, updated_at=now)))
+                elif (row.time_slots or "") != slots:
+                    row.time_slots = slots; row.updated_at = now
+                    to_update.append(apply_slot_fields(row))
+                else:
+                    unchanged.append(animal_id)
+            deleted_ids = list(current.keys())
+
+            if deleted_ids:
+                cls.objects.filter(hall=hall, animal_id__in=deleted_ids).delete()
+            if to_update:
+                cls.objects.bulk_update(to_update, ['time_slots', 'slot_mask', 'slot_status', 'updated_at'])
+            if to_create:
+                # 與其他請求同時寫入同一館別時，衝突的列改為更新
+                cls.objects.bulk_create(to_create, update_conflicts=True, unique_fields=['hall', 'animal'],
+                                        update_fields=['time_slots', 'slot_mask', 'slot_status', 'updated_at'])
+
+            diff = ScheduleDiff(created=[r.animal_id for r in to_create], updated=[r.animal_id for r in to_update],
+                                deleted=deleted_ids, unchanged=unchanged)
+            if diff:
+                transaction.on_commit(lambda: daily_schedule_changed.send(sender=cls, hall=hall, diff=diff))
+        return diff
\ No newline at end of file
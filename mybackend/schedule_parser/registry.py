@@ -0,0 +1,157 @@
+# D:\bkgg\mybackend\schedule_parser\registry.py
+"""
+班表格式註冊表。
+
+每種 Hall.schedule_format_type 對應一個 ScheduleFormat：解析函數 (與其串流版本)、區塊開頭正則與特徵正則。
+utils.py 在模組載入時呼叫 register_format() 登記各解析器，views 透過 get_format() 查表分派，
+不再維護 if/elif 鏈；新增格式只需在 utils.py 實作並登記一次。
+
+detect_format() 用於未指定格式 (format_type=auto) 的情況：以每個解析器實際解析的結果
+(區塊完整度) 加上格式特徵行命中數評分，取最高分者。試解析期間不輸出解析器的警告 (見 DetectionLogFilter)。
+"""
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+class ScheduleFormat:
+    """單一班表格式：key 對應 Hall.SCHEDULE_FORMAT_CHOICES。"""
+
+    def __init__(self, key, parse, block_start, signatures=(), label=None, stream=None):
+        self.key = key
+        self.parse = parse
+        self.stream = stream              # 串流版本：接受字串/檔案物件/行 iterable，逐一 yield 區塊
+        self.block_start = block_start    # 已編譯的區塊開頭正則
+        self.signatures = tuple(signatures)  # 已編譯的特徵正則，命中行數用於自動判斷格式
+        self.label = label or key
+
+    def __repr__(self):
+        return f"<ScheduleFormat {self.key}: {self.parse.__name__}>"
+
+
+_REGISTRY = {}  # key -> ScheduleFormat (保留登記順序，分數相同時先登記者優先)
+_load_lock = threading.Lock()
+_loaded = False
+
+
+def register_format(key, parse, block_start, signatures=(), label=None, stream=None):
+    if key in _REGISTRY:
+        logger.warning(f"Schedule format '{key}' registered twice; replacing {_REGISTRY[key]!r}")
+    fmt = ScheduleFormat(key, parse, block_start, signatures=signatures, label=label, stream=stream)
+    _REGISTRY[key] = fmt
+    return fmt
+
+
+def _ensure_loaded():
+    # 解析器在 utils.py 載入時登記；延遲匯入避免循環引用
+    global _loaded
+    if _loaded: return
+    with _load_lock:
+        if not _loaded:
+            from . import utils  # noqa: F401
+            _loaded = True
+
+
+def get_format(key):
+    """依 key 取得 ScheduleFormat，未登記回傳 None。"""
+    _ensure_loaded()
+    return _REGISTRY.get(key)
+
+
+def registered_formats():
+    _ensure_loaded()
+    return list(_REGISTRY.values())
+
+
+# --- 自動判斷格式 ---
+_detecting = threading.local()
+
+
+class DetectionLogFilter(logging.Filter):
+    """
+    自動判斷格式時每個解析器都會試解析，不相符的格式失敗是預期結果：
+    這段期間 (同一執行緒) 丟棄 WARNING 以上的紀錄。由 utils.py 掛在解析器的 logger 上。
+    """
+    def filter(self, record):
+        return record.levelno < logging.WARNING or not getattr(_detecting, 'active', False)
+
+
+@contextmanager
+def _quiet_parsing():
+    previous = getattr(_detecting, 'active', False)
+    _detecting.active = True
+    try:
+        yield
+    finally:
+        _detecting.active = previous
+
+
+def _block_quality(block):
+    if not block or not block.get('name'): return 0.0
+    score = 1.0
+    if block.get('parsed_fee'): score += 1.0
+    if block.get('time_slots'): score += 1.0
+    if block.get('height'): score += 0.5
+    return score
+
+
+def score_format(fmt, text, lines=None):
+    """回傳 (分數, 區塊數)。分數 = 各區塊完整度總和 + 特徵行命中數；解析失敗為 0。"""
+    if lines is None:
+        lines = [l.strip() for l in text.strip().split('\n') if l.strip()]
+    try:
+        with _quiet_parsing(): blocks = fmt.parse(text) or []
+    except Exception as e:
+        logger.debug(f"Format '{fmt.key}' failed during detection: {e}")
+        return 0.0, 0
+    if not blocks: return 0.0, 0
+    quality = sum(_block_quality(b) for b in blocks)
+    signature_hits = sum(1 for line in lines if any(sig.search(line) for sig in fmt.signatures))
+    return quality + signature_hits, len(blocks)
+
+
+def detect_format(text, candidates=None):
+    """
+    猜測文字班表的格式。
+    回傳 (最佳 key 或 None, [(key, 分數, 區塊數), ...] 依分數排序)。
+    candidates 可限定只比較部分格式 (key 列表)。
+    """
+    _ensure_loaded()
+    if not text or not text.strip(): return None, []
+    lines = [l.strip() for l in text.strip().split('\n') if l.strip()]
+    formats = [_REGISTRY[k] for k in candidates if k in _REGISTRY] if candidates else list(_REGISTRY.values())
+    ranked = []
+    for order, fmt in enumerate(formats):
+        score, block_count = score_format(fmt, text, lines)
+        ranked.append((order, fmt.key, score, block_count))
+    ranked.sort(key=lambda r: (-r[2], r[0]))
+    results = [(key, round(score, 2), block_count) for _, key, score, block_count in ranked]
+    best = results[0][0] if results and results[0][1] > 0 else None
+    return best, results
+
+
+def parse_with_format(key, text):
+    """
+    以指定格式解析文字 (key 為 'auto' 時先自動判斷)，回傳 (實際格式 key, 區塊列表)。
+    不依賴 Django 模型，可直接交給 ProcessPoolExecutor 的 worker 執行。
+    """
+    if key == 'auto':
+        key, _ = detect_format(text)
+        if not key: return None, []
+    fmt = get_format(key)
+    if fmt is None: raise KeyError(f"Unknown schedule format '{key}'")
+    return key, fmt.parse(text)
+
+
+def parse_in_worker(key, text):
+    """
+    process pool 的 worker 函數：回傳 (格式, 區塊, 錯誤訊息)，解析失敗不拋出例外。
+    放在這裡 (不匯入 Django 模型) 是為了 spawn 出來的行程不需要 django.setup() 就能載入。
+    """
+    try:
+        detected, blocks = parse_with_format(key, text)
+        return detected, blocks, None
+    except Exception as e:
+        return key, [], f"{type(e).__name__}: {e}"
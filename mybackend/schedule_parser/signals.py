@@ -0,0 +1,7 @@
+# D:\bkgg\mybackend\schedule_parser\signals.py
+from django.dispatch import Signal
+
+# DailySchedule.sync_hall() 在 transaction 提交後送出，只在有實際變動時觸發。
+# 參數: hall (Hall), diff (ScheduleDiff)。
+# 接收端 (例如列表快取淘汰、websocket 推播) 只需處理 diff.changed_animal_ids。
+daily_schedule_changed = Signal()
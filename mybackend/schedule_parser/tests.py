@@ -1,3 +1,22 @@
-from django.test import TestCase
+from django.test import SimpleTestCase
 
-# Create your tests here.
+from .corpus import golden_formats, load_sample, load_expected, normalize_blocks
+from .registry import detect_format, registered_formats
+
+
+# --- golden corpus (golden/*.txt 與 *.expected.json；預期結果由 bench_schedule_parsers --update-golden 產生) ---
+class GoldenCorpusTests(SimpleTestCase):
+    def test_every_format_has_a_sample(self):
+        self.assertEqual(set(golden_formats()), {fmt.key for fmt in registered_formats()})
+
+    def test_parsers_match_expected_output(self):
+        for fmt in registered_formats():
+            with self.subTest(format=fmt.key):
+                expected = load_expected(fmt.key)
+                self.assertIsNotNone(expected, f"golden/{fmt.key}.expected.json 不存在")
+                self.assertEqual(normalize_blocks(fmt.parse(load_sample(fmt.key))), expected)
+
+    def test_auto_detection_picks_sample_format(self):
+        for key in golden_formats():
+            with self.subTest(format=key):
+                self.assertEqual(detect_format(load_sample(key))[0], key)
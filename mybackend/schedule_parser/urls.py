@@ -7,5 +7,7 @@ app_name = 'schedule_parser'
 urlpatterns = [
     # 指向班表解析視圖
     path('parse/', views.parse_schedule_view, name='parse_schedule'),
+    # 多館別批次匯入 (POST 壓縮檔)
+    path('bulk-import/', views.bulk_import_view, name='bulk_import'),
     # 未來可以添加其他管理功能的 URL
 ]
\ No newline at end of file
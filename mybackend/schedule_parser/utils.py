@@ -3,7 +3,10 @@ import re
 import html
 import logging
 
+from .registry import register_format, DetectionLogFilter
+
 logger = logging.getLogger(__name__) # 創建 logger
+logger.addFilter(DetectionLogFilter()) # format_type=auto 試解析時不輸出警告
 
 # --- Word to Digit Mapping ---
 WORD_TO_DIGIT = {
@@ -13,35 +16,99 @@ WORD_TO_DIGIT = {
     '六': 6, '七': 7, '八': 8, '九': 9, '十': 10,
 }
 
+# --- 共用正則 (模組載入時編譯一次，各解析器逐行使用) ---
+DIGITS_RE = re.compile(r'\d+')  # 連續數字 (時段/費用)
+HAS_DIGIT_RE = re.compile(r'\d')  # 是否含數字
+TIME_DIGITS_LINE_RE = re.compile(r'^[\d\.\s]+$')  # 只含數字、點、空白的時段行
+TRAILING_SYMBOLS_RE = re.compile(r'[^\w\s]+$')  # 名字結尾的符號/表情
+EMOJI_RE = re.compile(r'[\U0001F300-\U0001FAFF]')  # 常見 emoji 範圍
+DOT_SIZE_LINE_RE = re.compile(r'^\s*(\d{3})\s*\.\s*(\d{2,3})\s*\.\s*([A-Za-z\+\-]+)\s*$')  # 整行身材 168.45.C
+SLASH_SIZE_LINE_RE = re.compile(r'^\s*(\d{3})\s*/\s*(\d{2,3})\s*/\s*([A-Za-z\+\-]+)\s*$')  # 整行身材 168/45/C
+CUP_BRACKETS_RE = re.compile(r'[\(\)]')  # 罩杯中的括號
+LEADING_PAREN_FEE_RE = re.compile(r'^\(\s*(\d+)\s*\)')  # 行首 (費用)
+NAME_BEFORE_BIKINI_RE = re.compile(r'\)\s*(.*?)(?:\s*👙|$)')  # ) 之後到 👙 或行尾的名字部分
+PAREN_FEE_RE = re.compile(r'[\(（]\s*(\d+)\s*[\)）]')  # 全/半形括號內的費用
+PAREN_NOTE_RE = re.compile(r'[\(（](.*?)[\)）]')  # 括號內的備註
+
+
+# --- 串流逐行解析共用工具 ---
+def iter_schedule_lines(source):
+    """
+    將班表來源轉為逐行 iterator (不含換行字元)。
+    source 可為字串、檔案物件 (文字或二進位) 或任意行的 iterable。
+    行為與舊的 text.strip().split('\\n') 相同：略過開頭空行，第一個非空行去除前導空白，
+    最後一個非空行去除結尾空白 (只需暫存最後一個非空行與其後的空行數)。
+    """
+    if isinstance(source, str):
+        yield from source.strip().split('\n')
+        return
+    pending = None; pending_blanks = 0
+    for raw in source:
+        if isinstance(raw, bytes): raw = raw.decode('utf-8')
+        line = raw[:-1] if raw.endswith('\n') else raw
+        if not line.strip():
+            if pending is not None: pending_blanks += 1
+            continue
+        if pending is None:
+            line = line.lstrip()
+        else:
+            yield pending
+            for _ in range(pending_blanks): yield ''
+        pending = line; pending_blanks = 0
+    if pending is not None: yield pending.rstrip()
+
+
+def iter_schedule_blocks(lines, block_start_pattern, strip_lines=True):
+    """
+    依區塊開頭正則將逐行資料分組，yield (區塊開頭行號, 區塊內非空行)。
+    第一個區塊之前的行 (公告等) 會被略過；strip_lines=False 時保留原始行 (僅濾掉空行)。
+    """
+    block = []; block_line_no = 0
+    for line_no, line in enumerate(lines, 1):
+        line_strip = line.strip()
+        if not line_strip: continue
+        if block_start_pattern.match(line_strip):
+            if block: yield block_line_no, block
+            block = [line_strip if strip_lines else line]; block_line_no = line_no
+        elif block:
+            block.append(line_strip if strip_lines else line)
+    if block: yield block_line_no, block
+
+
+def _iter_parsed_blocks(source, block_start_pattern, process_block, label, strip_lines=True, warn_failures=False, missing_level=logging.ERROR):
+    """逐一處理區塊並 yield 解析結果 (各格式 iter_*_schedule 的共用實作)；missing_level 為找不到區塊時的紀錄等級。"""
+    found = False
+    for line_no, block in iter_schedule_blocks(iter_schedule_lines(source), block_start_pattern, strip_lines):
+        found = True
+        parsed = process_block(block)
+        if parsed:
+            yield parsed
+        elif warn_failures:
+            logger.warning(f"{label} Parser: Failed to process block starting at line {line_no}: {block[0]}")
+    if not found and warn_failures:
+        logger.log(missing_level, "%s Parser: No block start lines found using pattern: %s", label, block_start_pattern.pattern)
+
+
 # ============================================================
 # --- 函數 1: 解析舊的 LINE 格式 (格式 A) ---
 # ============================================================
+# --- 預先編譯的正則 (模組載入時編譯一次) ---
+FORMAT_A_BLOCK_START_RE = re.compile(r'^\(\s*\d+\s*\)')
+FORMAT_A_ALIAS_RE = re.compile(r'[\(（](.+?)[\)）]')
+FORMAT_A_ALIAS_STRIP_RE = re.compile(r'[\(（].+?[\)）]')
+FORMAT_A_SIZE_RE = re.compile(r'(\d{3})\s*/\s*(\d{2,3})\s*/\s*([A-Za-z\+\-]+)')
+FORMAT_A_SLOT_DIGITS_RE = re.compile(r'\d{1,2}')
+
+def iter_line_schedule(lines):
+    """parse_line_schedule 的串流版本：lines 可為字串、檔案物件或任意行的 iterable，逐一 yield 解析結果。"""
+    yield from _iter_parsed_blocks(lines, FORMAT_A_BLOCK_START_RE, process_animal_block, 'Format A')
+
 def parse_line_schedule(text):
     """
     解析舊格式的 LINE 文字班表 (以 '(數字)' 開頭區塊)。
     返回一個列表，每個元素是一個包含解析信息的字典。
     """
-    results = []
-    current_animal_block = []
-    lines = text.strip().split('\n')
-
-    for line in lines:
-        line = line.strip()
-        if not line: continue # 跳過空行
-
-        if re.match(r'^\(\s*\d+\s*\)', line):
-            if current_animal_block:
-                parsed = process_animal_block(current_animal_block) # 調用舊格式的處理函數
-                if parsed: results.append(parsed)
-            current_animal_block = [line]
-        elif current_animal_block:
-            current_animal_block.append(line)
-
-    if current_animal_block:
-        parsed = process_animal_block(current_animal_block) # 調用旧格式的处理函数
-        if parsed: results.append(parsed)
-
-    return results
+    return list(iter_line_schedule(text))
 
 def process_animal_block(block_lines):
     """處理舊格式的單個美容師文字區塊"""
@@ -51,16 +118,16 @@ def process_animal_block(block_lines):
     try:
         first_line = block_lines[0]
         original_name_text = first_line # 記錄原始第一行
-        fee_match = re.search(r'^\(\s*(\d+)\s*\)', first_line)
+        fee_match = LEADING_PAREN_FEE_RE.search(first_line)
         if fee_match:
             try: fee = int(fee_match.group(1)) * 100
             except ValueError: pass
         # 修改名字提取：從 ')' 後面開始，直到 👙 或行尾
-        name_part_match = re.search(r'\)\s*(.*?)(?:\s*👙|$)', first_line)
+        name_part_match = NAME_BEFORE_BIKINI_RE.search(first_line)
         if name_part_match:
             original_name_text_part = name_part_match.group(1).strip()
             # 嘗試提取括號內的別名
-            alias_match = re.search(r'[\(（](.+?)[\)）]', original_name_text_part)
+            alias_match = FORMAT_A_ALIAS_RE.search(original_name_text_part)
             if alias_match:
                 alias_content = alias_match.group(1).strip()
                 if alias_content.startswith("原"):
@@ -68,7 +135,7 @@ def process_animal_block(block_lines):
                 else:
                     alias_suggestion = alias_content # 如果不是以 "原" 開頭，也記錄下來
                 # 從原始名字部分移除別名括號
-                name = re.sub(r'[\(（].+?[\)）]', '', original_name_text_part).strip()
+                name = FORMAT_A_ALIAS_STRIP_RE.sub('', original_name_text_part).strip()
             else:
                 # 沒有括號別名，直接使用
                 name = original_name_text_part
@@ -81,7 +148,7 @@ def process_animal_block(block_lines):
              name = None # 或設置一個預設值，或根據後續邏輯決定
 
         # 身材提取
-        size_match = re.search(r'(\d{3})\s*/\s*(\d{2,3})\s*/\s*([A-Za-z\+\-]+)', first_line)
+        size_match = FORMAT_A_SIZE_RE.search(first_line)
         if size_match:
             try: height = int(size_match.group(1))
             except ValueError: pass
@@ -98,7 +165,7 @@ def process_animal_block(block_lines):
                 elif time_info == '人到再約' or time_info.startswith('人道'): time_slots_str = "人到再約"
                 elif not time_info: time_slots_str = ""
                 else:
-                    slots = re.findall(r'\d{1,2}', time_info)
+                    slots = FORMAT_A_SLOT_DIGITS_RE.findall(time_info)
                     processed_slots = []
                     for s in slots:
                         try:
@@ -134,42 +201,24 @@ def process_animal_block(block_lines):
 # ============================================================
 # --- 函數 2: 解析新的 "茶湯會" 格式 (格式 B) ---
 # ============================================================
+# --- 預先編譯的正則 (模組載入時編譯一次) ---
+CHATANGHUI_BLOCK_START_RE = re.compile(r'^[(\s]*(?:[\w\s]+|\S+)[)\s]*【.+?】\s*\d+')  # 稍微放寬開頭，主要靠【名字】費用 識別
+CHATANGHUI_NAME_IN_INTRO_RE = re.compile(r'【.+?】')  # 用於判斷是否意外讀到下個人的名字行
+CHATANGHUI_NAME_RE = re.compile(r'【(.+?)】')
+CHATANGHUI_FEE_RE = re.compile(r'】\s*(\d+)')
+CHATANGHUI_ALIAS_RE = re.compile(r'】\s*\d+\s*[\(（](.+?)[\)）]')
+
+def iter_chatanghui_schedule(lines):
+    """parse_chatanghui_schedule 的串流版本：lines 可為字串、檔案物件或任意行的 iterable，逐一 yield 解析結果。"""
+    yield from _iter_parsed_blocks(lines, CHATANGHUI_BLOCK_START_RE, process_chatanghui_block, 'Chatanghui')
+
 def parse_chatanghui_schedule(text):
     """
     解析 "茶湯會休閒會館" 格式的 LINE 文字班表。
     返回與 parse_line_schedule 相同結構的列表。
     修正了區塊分割邏輯。
     """
-    results = []
-    lines = text.strip().split('\n')
-    current_block_lines = []
-    # 修改區塊開始模式：名字用【】包圍，後面可能跟著數字費用
-    block_start_pattern = r'^[(\s]*(?:[\w\s]+|\S+)[)\s]*【.+?】\s*\d+' # 稍微放寬開頭，主要靠【名字】費用 識別
-
-    for line in lines:
-        line_strip = line.strip()
-        if not line_strip: continue # 跳過空行
-
-        # 判斷是否為新區塊的開始行
-        is_start_line = re.match(block_start_pattern, line_strip)
-
-        if is_start_line:
-            # 如果當前有正在處理的區塊，先處理掉
-            if current_block_lines:
-                parsed = process_chatanghui_block(current_block_lines) # 調用處理函數
-                if parsed: results.append(parsed)
-            # 開始新的區塊
-            current_block_lines = [line_strip]
-        elif current_block_lines:
-            # 如果不是開始行，且當前有區塊，則添加到當前區塊
-            current_block_lines.append(line_strip)
-
-    # 處理最後一個區塊
-    if current_block_lines:
-        parsed = process_chatanghui_block(current_block_lines) # 處理最後一個區塊
-        if parsed: results.append(parsed)
-
-    return results
+    return list(iter_chatanghui_schedule(text))
 
 def process_chatanghui_block(block_lines):
     """
@@ -183,7 +232,7 @@ def process_chatanghui_block(block_lines):
     time_slots_str = "" # 初始化為空字串
     height = None; weight = None; cup = None
     other_lines = [] # 用於收集所有其他行 (介紹、禁忌等)
-    name_pattern_in_intro = r'【.+?】' # 用於判斷是否意外讀到下個人的名字行
+    name_pattern_in_intro = CHATANGHUI_NAME_IN_INTRO_RE
 
     # 標記某類信息是否已找到
     time_found = False
@@ -195,18 +244,18 @@ def process_chatanghui_block(block_lines):
         first_line = block_lines[line_index]
         original_name_text = first_line # 記錄原始第一行
 
-        name_match = re.search(r'【(.+?)】', first_line)
+        name_match = CHATANGHUI_NAME_RE.search(first_line)
         if name_match:
             name = name_match.group(1).strip()
             # 費用通常在名字後面
-            fee_match = re.search(r'】\s*(\d+)', first_line)
+            fee_match = CHATANGHUI_FEE_RE.search(first_line)
             if fee_match:
                 try:
                     fee = int(fee_match.group(1)) * 100
                 except ValueError:
                     logger.warning(f"Chatanghui Parser: 無法解析費用數字 '{fee_match.group(1)}'")
             # 嘗試提取緊跟費用後的別名 (原XXX) - 茶湯會格式可能需要保留別名
-            alias_match = re.search(r'】\s*\d+\s*[\(（](.+?)[\)）]', first_line)
+            alias_match = CHATANGHUI_ALIAS_RE.search(first_line)
             if alias_match:
                  alias_raw = alias_match.group(1).strip()
                  if alias_raw.startswith("原"):
@@ -226,7 +275,7 @@ def process_chatanghui_block(block_lines):
 
             # a. 檢查是否意外讀入了下一個區塊的開始行 (包含【名字】模式)
             #    (避免把下個人的名字行當成介紹)
-            if re.search(name_pattern_in_intro, current_line) and line_index > 0:
+            if name_pattern_in_intro.search(current_line) and line_index > 0:
                  logger.debug(f"停止處理茶湯會區塊，因為行 '{current_line}' 包含名字模式，可能是下一個區塊的開始")
                  break # 停止處理當前區塊
 
@@ -242,15 +291,15 @@ def process_chatanghui_block(block_lines):
                 # 匹配 "人到再約" 或 "人到在約"，可能帶括號說明
                 elif current_line.startswith('人到再約') or current_line.startswith('人到在約'):
                     time_display = "人到再約" # 基礎狀態字串
-                    extra_info_match = re.search(r'[\(（](.*?)[\)）]', current_line)
+                    extra_info_match = PAREN_NOTE_RE.search(current_line)
                     if extra_info_match:
                         other_lines.append(f"(備註: {extra_info_match.group(1).strip()})") # 作為備註加入介紹
                     time_slots_str = time_display # 設置 time_slots_str 為 "人到再約"
                     time_found = True
                     is_processed_structurally = True
                 # 嘗試匹配包含數字的時段行
-                elif re.search(r'\d', current_line): # 只要包含數字就可能是時段行
-                    raw_slots = re.findall(r'\d+', current_line)
+                elif HAS_DIGIT_RE.search(current_line): # 只要包含數字就可能是時段行
+                    raw_slots = DIGITS_RE.findall(current_line)
                     processed_slots = []
                     valid_time_line = False
                     for s in raw_slots:
@@ -274,8 +323,8 @@ def process_chatanghui_block(block_lines):
 
             # c. 嘗試匹配身材 (如果還沒找到 且 未被處理為時段)
             if not size_found and not is_processed_structurally:
-                size_match_slash = re.match(r'^\s*(\d{3})\s*/\s*(\d{2,3})\s*/\s*([A-Za-z\+\-]+)\s*$', current_line)
-                size_match_dot = re.match(r'^\s*(\d{3})\s*\.\s*(\d{2,3})\s*\.\s*([A-Za-z\+\-]+)\s*$', current_line)
+                size_match_slash = SLASH_SIZE_LINE_RE.match(current_line)
+                size_match_dot = DOT_SIZE_LINE_RE.match(current_line)
                 size_match = size_match_slash or size_match_dot
                 if size_match:
                     try: height = int(size_match.group(1))
@@ -310,35 +359,23 @@ def process_chatanghui_block(block_lines):
 # ============================================================
 # --- 函數 3: 解析新的 "芯苑館" 格式 (格式 C) ---
 # ============================================================
+# --- 預先編譯的正則 (模組載入時編譯一次) ---
+XINYUAN_BLOCK_START_RE = re.compile(r'^\s*《\s*\d+\s*》')  # 芯苑館區塊開始模式 《 數字 》
+XINYUAN_FEE_RE = re.compile(r'《\s*(\d+)\s*》')
+XINYUAN_FEE_PREFIX_RE = re.compile(r'^\s*《\s*\d+\s*》\s*(\(new\))?\s*')
+XINYUAN_TRAILING_SIZE_RE = re.compile(r'(\d{3}\.\d{2,3}\.[A-Za-z\+\-]+)$')
+XINYUAN_TIME_CLEAN_RE = re.compile(r'[^\d-]+')
+
+def iter_xinyuan_schedule(lines):
+    """parse_xinyuan_schedule 的串流版本：lines 可為字串、檔案物件或任意行的 iterable，逐一 yield 解析結果。"""
+    yield from _iter_parsed_blocks(lines, XINYUAN_BLOCK_START_RE, process_xinyuan_block, 'Xinyuan')
+
 def parse_xinyuan_schedule(text):
     """
     解析 "芯苑館" 格式的 LINE 文字班表。
     返回與 parse_line_schedule 相同結構的列表。
     """
-    results = []
-    lines = text.strip().split('\n')
-    current_block_lines = []
-    block_start_pattern = r'^\s*《\s*\d+\s*》' # 芯苑館區塊開始模式 《 數字 》
-
-    for line in lines:
-        line_strip = line.strip()
-        if not line_strip: continue # 跳過空行
-
-        is_start_line = re.match(block_start_pattern, line_strip)
-
-        if is_start_line:
-            if current_block_lines:
-                parsed = process_xinyuan_block(current_block_lines) # <--- 調用芯苑館的處理函數
-                if parsed: results.append(parsed)
-            current_block_lines = [line_strip]
-        elif current_block_lines:
-            current_block_lines.append(line_strip)
-
-    if current_block_lines:
-        parsed = process_xinyuan_block(current_block_lines) # <--- 調用芯苑館的處理函數
-        if parsed: results.append(parsed)
-
-    return results
+    return list(iter_xinyuan_schedule(text))
 
 def process_xinyuan_block(block_lines):
     """
@@ -351,7 +388,7 @@ def process_xinyuan_block(block_lines):
     fee = None; name = None; original_name_text = ""; alias_suggestion = None # 芯苑格式似乎不明顯有別名
     time_slots_str = ""; height = None; weight = None; cup = None
     other_lines = [] # 收集所有非結構化行
-    xinyuan_block_start_pattern = r'^\s*《\s*\d+\s*》' # 用於判斷區塊結束
+    xinyuan_block_start_pattern = XINYUAN_BLOCK_START_RE
 
     # 標記信息是否已找到
     time_found = False
@@ -364,16 +401,16 @@ def process_xinyuan_block(block_lines):
         original_name_text = first_line # 記錄原始第一行
 
         # 提取費用
-        fee_match = re.search(r'《\s*(\d+)\s*》', first_line)
+        fee_match = XINYUAN_FEE_RE.search(first_line)
         if fee_match:
             try: fee = int(fee_match.group(1)) * 100
             except ValueError: logger.warning(f"Xinyuan Parser: 無法解析費用 '{fee_match.group(1)}'")
 
         # 提取名字部分：去掉費用標籤、(new)標籤，直到可能的身材信息或行尾
-        name_part = re.sub(r'^\s*《\s*\d+\s*》\s*(\(new\))?\s*', '', first_line).strip()
+        name_part = XINYUAN_FEE_PREFIX_RE.sub('', first_line).strip()
 
         # 嘗試在名字部分結尾處查找身材信息 (格式: 168.45.C)
-        size_match_in_first = re.search(r'(\d{3}\.\d{2,3}\.[A-Za-z\+\-]+)$', name_part) # $確保在結尾
+        size_match_in_first = XINYUAN_TRAILING_SIZE_RE.search(name_part) # $確保在結尾
 
         if size_match_in_first:
             # 如果找到，名字是身材信息之前的部分
@@ -391,7 +428,7 @@ def process_xinyuan_block(block_lines):
         else:
              # 如果第一行末尾沒有身材信息，則整個 name_part 視為名字 (可能需要清理末尾非字母數字)
              # 清理掉末尾可能的符號或表情符號
-             name_part_cleaned = re.sub(r'[^\w\s]+$', '', name_part).strip()
+             name_part_cleaned = TRAILING_SYMBOLS_RE.sub('', name_part).strip()
              name = name_part_cleaned
 
         if not name:
@@ -405,7 +442,7 @@ def process_xinyuan_block(block_lines):
             current_line = block_lines[line_index].strip()
 
             # a. 檢查是否是下一區塊的開始行
-            if re.match(xinyuan_block_start_pattern, current_line):
+            if xinyuan_block_start_pattern.match(current_line):
                  break # 停止處理當前區塊
 
             is_processed_structurally = False # 標記當前行是否被識別為結構化信息
@@ -418,18 +455,18 @@ def process_xinyuan_block(block_lines):
                     is_processed_structurally = True
                 elif current_line.startswith('人到再約') or current_line.startswith('人到在約'):
                     time_display = "人到再約"
-                    extra_info_match = re.search(r'[\(（](.*?)[\)）]', current_line)
+                    extra_info_match = PAREN_NOTE_RE.search(current_line)
                     if extra_info_match:
                         other_lines.append(f"(備註: {extra_info_match.group(1).strip()})")
                     time_slots_str = time_display # 設置為 "人到再約"
                     time_found = True
                     is_processed_structurally = True
-                elif re.search(r'\d', current_line): # 只要包含數字就可能是時段行
-                    cleaned_time_info = re.sub(r'[^\d-]+', '', current_line)
+                elif HAS_DIGIT_RE.search(current_line): # 只要包含數字就可能是時段行
+                    cleaned_time_info = XINYUAN_TIME_CLEAN_RE.sub('', current_line)
                     slots = cleaned_time_info.split('-') # 按 '-' 分割
                     processed_slots = []; valid_time_line = False
                     for s in slots:
-                        s_num_part = re.search(r'\d+', s) # 提取數字部分
+                        s_num_part = DIGITS_RE.search(s) # 提取數字部分
                         if s_num_part:
                             s_val = s_num_part.group(0)
                             try:
@@ -451,7 +488,7 @@ def process_xinyuan_block(block_lines):
 
             # c. 嘗試匹配身材 (如果第一行沒找到 且 未被處理為時段)
             if not size_found and not is_processed_structurally:
-                size_match = re.match(r'^\s*(\d{3})\s*\.\s*(\d{2,3})\s*\.\s*([A-Za-z\+\-]+)\s*$', current_line)
+                size_match = DOT_SIZE_LINE_RE.match(current_line)
                 if size_match:
                     try: height = int(size_match.group(1))
                     except ValueError: pass
@@ -484,34 +521,21 @@ def process_xinyuan_block(block_lines):
 # ============================================================
 # --- 函數 4: 解析新的 "手中情" 格式 (格式 D) ---
 # ============================================================
+# --- 預先編譯的正則 (模組載入時編譯一次) ---
+SHOUZHONGQING_BLOCK_START_RE = re.compile(r'^\(\s*\d+\s*\)')
+SHOUZHONGQING_ALIAS_RE = re.compile(r'[\(（](原.+?|85.+?)[\)）]')
+SHOUZHONGQING_SIZE_AFTER_BIKINI_RE = re.compile(r'👙\s*(\d{3})\s*/\s*(\d{2,3})\s*/\s*([A-Za-z\+\-]+)')
+
+def iter_shouzhongqing_schedule(lines):
+    """parse_shouzhongqing_schedule 的串流版本：lines 可為字串、檔案物件或任意行的 iterable，逐一 yield 解析結果。"""
+    yield from _iter_parsed_blocks(lines, SHOUZHONGQING_BLOCK_START_RE, process_shouzhongqing_block, 'Shouzhongqing')
+
 def parse_shouzhongqing_schedule(text):
     """
     解析 "手中情" 格式的 LINE 文字班表。
     返回與 parse_line_schedule 相同結構的列表。
     """
-    results = []
-    lines = text.strip().split('\n')
-    current_block_lines = []
-    # 手中情區塊開始模式：(數字)
-    block_start_pattern = r'^\(\s*\d+\s*\)'
-
-    for line in lines:
-        line_strip = line.strip()
-        if not line_strip: continue # 跳過空行
-
-        if re.match(block_start_pattern, line_strip):
-            if current_block_lines:
-                parsed = process_shouzhongqing_block(current_block_lines) # <--- 調用手中情的處理函數
-                if parsed: results.append(parsed)
-            current_block_lines = [line_strip]
-        elif current_block_lines:
-            current_block_lines.append(line_strip)
-
-    if current_block_lines:
-        parsed = process_shouzhongqing_block(current_block_lines) # <--- 調用手中情的處理函數
-        if parsed: results.append(parsed)
-
-    return results
+    return list(iter_shouzhongqing_schedule(text))
 
 def process_shouzhongqing_block(block_lines):
     """處理單個 "手中情" 格式的美容師區塊"""
@@ -520,9 +544,9 @@ def process_shouzhongqing_block(block_lines):
     fee = None; name = None; original_name_text = ""; alias_suggestion = None
     time_slots_str = ""; height = None; weight = None; cup = None
     other_lines = [] # 收集所有非結構化行
-    shouzhongqing_block_start_pattern = r'^\(\s*\d+\s*\)' # 用於判斷區塊結束
+    shouzhongqing_block_start_pattern = SHOUZHONGQING_BLOCK_START_RE
     # 別名模式：匹配 (原XXX) 或 (85XXX) 等 - 手中情格式可能需要保留別名
-    alias_pattern = r'[\(（](原.+?|85.+?)[\)）]'
+    alias_pattern = SHOUZHONGQING_ALIAS_RE
 
     # 標記信息是否已找到
     time_found = False
@@ -535,25 +559,25 @@ def process_shouzhongqing_block(block_lines):
         original_name_text = first_line # 記錄原始第一行
 
         # 提取費用
-        fee_match = re.search(r'^\(\s*(\d+)\s*\)', first_line)
+        fee_match = LEADING_PAREN_FEE_RE.search(first_line)
         if fee_match:
             try: fee = int(fee_match.group(1)) * 100
             except ValueError: logger.warning(f"Shouzhongqing Parser: 無法解析費用 '{fee_match.group(1)}'")
 
         # 提取名字部分：從 ')' 後面開始，直到 👙 或行尾
-        name_part_match = re.search(r'\)\s*(.*?)(?:\s*👙|$)', first_line)
+        name_part_match = NAME_BEFORE_BIKINI_RE.search(first_line)
         if name_part_match:
             name_part = name_part_match.group(1).strip()
 
             # 嘗試從名字部分提取別名
-            alias_match = re.search(alias_pattern, name_part)
+            alias_match = alias_pattern.search(name_part)
             if alias_match:
                  alias_content = alias_match.group(1).strip()
                  if alias_content.startswith("原"):
                       alias_suggestion = alias_content[1:].strip()
                  else:
                       alias_suggestion = alias_content # 非 "原" 開頭也算別名
-                 name = re.sub(alias_pattern, '', name_part).strip()
+                 name = alias_pattern.sub('', name_part).strip()
             else:
                 name = name_part
 
@@ -562,7 +586,7 @@ def process_shouzhongqing_block(block_lines):
                  alias_suggestion = None
 
             # 嘗試在第一行結尾處查找身材信息 (在 👙 後面，格式: 168 / 45 / C)
-            size_match_in_first = re.search(r'👙\s*(\d{3})\s*/\s*(\d{2,3})\s*/\s*([A-Za-z\+\-]+)', first_line)
+            size_match_in_first = SHOUZHONGQING_SIZE_AFTER_BIKINI_RE.search(first_line)
             if size_match_in_first:
                 try: height = int(size_match_in_first.group(1))
                 except ValueError: pass
@@ -585,7 +609,7 @@ def process_shouzhongqing_block(block_lines):
             current_line = block_lines[line_index].strip()
 
             # a. 檢查是否是下一區塊的開始行
-            if re.match(shouzhongqing_block_start_pattern, current_line):
+            if shouzhongqing_block_start_pattern.match(current_line):
                  break # 停止處理當前區塊
 
             is_processed_structurally = False # 標記當前行是否被識別為結構化信息
@@ -600,7 +624,7 @@ def process_shouzhongqing_block(block_lines):
                 elif not time_info: # 可能是空的 ⏰
                     time_slots_str = ""
                 else:
-                    slots = re.findall(r'\d+', time_info) # 直接提取所有數字
+                    slots = DIGITS_RE.findall(time_info) # 直接提取所有數字
                     processed_slots = []
                     for s in slots:
                         try:
@@ -618,7 +642,7 @@ def process_shouzhongqing_block(block_lines):
 
             # c. 嘗試匹配身材 (如果第一行沒找到 且 未被處理為時段)
             if not size_found and not is_processed_structurally:
-                size_match = re.match(r'^\s*(\d{3})\s*/\s*(\d{2,3})\s*/\s*([A-Za-z\+\-]+)\s*$', current_line)
+                size_match = SLASH_SIZE_LINE_RE.match(current_line)
                 if size_match:
                     try: height = int(size_match.group(1))
                     except ValueError: pass
@@ -633,7 +657,7 @@ def process_shouzhongqing_block(block_lines):
             if not is_processed_structurally and current_line:
                 # 檢查介紹行中是否包含別名，如果第一行沒找到，則記錄
                 if not alias_suggestion:
-                    alias_match_intro = re.search(alias_pattern, current_line)
+                    alias_match_intro = alias_pattern.search(current_line)
                     if alias_match_intro:
                         alias_content = alias_match_intro.group(1).strip()
                         if alias_content.startswith("原"):
@@ -660,34 +684,24 @@ def process_shouzhongqing_block(block_lines):
 # ============================================================
 # --- 函數 5: 解析新的 "寶可夢" 格式 (格式 F) ---
 # ============================================================
+# --- 預先編譯的正則 (模組載入時編譯一次) ---
+POKEMON_BLOCK_START_RE = re.compile(r'^\s*(?:🆕|new|\(new\))?\s*\(\s*\d+\s*\)')  # 更寬鬆的匹配開頭
+POKEMON_ALIAS_RE = re.compile(r'[\(（](原.+?|85.+?|茶湯會.+?)[\)）]')
+POKEMON_FEE_RE = re.compile(r'\(\s*(\d+)\s*\)')
+POKEMON_FEE_PREFIX_RE = re.compile(r'^\s*(?:🆕|new|\(new\))?\s*\(\s*\d+\s*\)\s*')
+POKEMON_SIZE_RE = re.compile(r'(\d{3}\s*\.\s*\d{2,3}\s*\.\s*[A-Za-z\+\-]+)')
+POKEMON_SIZE_SPLIT_RE = re.compile(r'\s*\.\s*')
+
+def iter_pokemon_schedule(lines):
+    """parse_pokemon_schedule 的串流版本：lines 可為字串、檔案物件或任意行的 iterable，逐一 yield 解析結果。"""
+    yield from _iter_parsed_blocks(lines, POKEMON_BLOCK_START_RE, process_pokemon_block, 'Pokemon')
+
 def parse_pokemon_schedule(text):
     """
     解析 "寶可夢" 格式的 LINE 文字班表。
     返回與 parse_line_schedule 相同結構的列表。
     """
-    results = []
-    lines = text.strip().split('\n')
-    current_block_lines = []
-    # 寶可夢區塊開始模式：以 (數字) 開頭，允許包含 🆕 或其他符號
-    block_start_pattern = r'^\s*(?:🆕|new|\(new\))?\s*\(\s*\d+\s*\)' # 更寬鬆的匹配開頭
-
-    for line in lines:
-        line_strip = line.strip()
-        if not line_strip: continue # 跳過空行
-
-        if re.match(block_start_pattern, line_strip):
-            if current_block_lines:
-                parsed = process_pokemon_block(current_block_lines) # <--- 調用寶可夢的處理函數
-                if parsed: results.append(parsed)
-            current_block_lines = [line_strip]
-        elif current_block_lines:
-            current_block_lines.append(line_strip)
-
-    if current_block_lines:
-        parsed = process_pokemon_block(current_block_lines) # <--- 調用寶可夢的處理函數
-        if parsed: results.append(parsed)
-
-    return results
+    return list(iter_pokemon_schedule(text))
 
 def process_pokemon_block(block_lines):
     """處理單個 "寶可夢" 格式的美容師區塊"""
@@ -696,9 +710,9 @@ def process_pokemon_block(block_lines):
     fee = None; name = None; original_name_text = ""; alias_suggestion = None
     time_slots_str = ""; height = None; weight = None; cup = None
     other_lines = [] # 收集所有非結構化行
-    pokemon_block_start_pattern = r'^\s*(?:🆕|new|\(new\))?\s*\(\s*\d+\s*\)'
+    pokemon_block_start_pattern = POKEMON_BLOCK_START_RE
     # 別名模式 - 寶可夢格式可能需要保留別名
-    alias_pattern = r'[\(（](原.+?|85.+?|茶湯會.+?)[\)）]'
+    alias_pattern = POKEMON_ALIAS_RE
 
     # 標記信息是否已找到
     time_found = False
@@ -710,18 +724,18 @@ def process_pokemon_block(block_lines):
         first_line = block_lines[line_index]
         original_name_text = first_line # 記錄原始第一行
 
-        fee_match = re.search(r'\(\s*(\d+)\s*\)', first_line)
+        fee_match = POKEMON_FEE_RE.search(first_line)
         if fee_match:
             try: fee = int(fee_match.group(1)) * 100
             except ValueError: logger.warning(f"Pokemon Parser: 無法解析費用 '{fee_match.group(1)}'")
 
-        name_part = re.sub(r'^\s*(?:🆕|new|\(new\))?\s*\(\s*\d+\s*\)\s*', '', first_line).strip()
-        size_match_in_first = re.search(r'(\d{3}\s*\.\s*\d{2,3}\s*\.\s*[A-Za-z\+\-]+)', name_part)
+        name_part = POKEMON_FEE_PREFIX_RE.sub('', first_line).strip()
+        size_match_in_first = POKEMON_SIZE_RE.search(name_part)
 
         if size_match_in_first:
             name = name_part[:size_match_in_first.start()].strip()
             size_str = size_match_in_first.group(1)
-            parts = re.split(r'\s*\.\s*', size_str) # 用點分割，允許空格
+            parts = POKEMON_SIZE_SPLIT_RE.split(size_str) # 用點分割，允許空格
             if len(parts) == 3:
                 try: height = int(parts[0])
                 except ValueError: pass
@@ -730,16 +744,16 @@ def process_pokemon_block(block_lines):
                 cup = parts[2].strip()
                 size_found = True
         else:
-             alias_match = re.search(alias_pattern, name_part)
+             alias_match = alias_pattern.search(name_part)
              if alias_match:
                  alias_content = alias_match.group(1).strip()
                  if alias_content.startswith("原"):
                       alias_suggestion = alias_content[1:].strip()
                  else:
                       alias_suggestion = alias_content
-                 name = re.sub(alias_pattern, '', name_part).strip()
+                 name = alias_pattern.sub('', name_part).strip()
              else:
-                 name = re.sub(r'[^\w\s]+$', '', name_part).strip()
+                 name = TRAILING_SYMBOLS_RE.sub('', name_part).strip()
 
         if not name and alias_suggestion:
             name = alias_suggestion
@@ -755,7 +769,7 @@ def process_pokemon_block(block_lines):
         while line_index < len(block_lines):
             current_line = block_lines[line_index].strip()
 
-            if re.match(pokemon_block_start_pattern, current_line):
+            if pokemon_block_start_pattern.match(current_line):
                  break # 停止處理當前區塊
 
             is_processed_structurally = False # 標記當前行是否被識別為結構化信息
@@ -769,7 +783,7 @@ def process_pokemon_block(block_lines):
                     elif not time_info: # 可能是空的 🈳
                         time_slots_str = ""
                     else:
-                        slots = re.findall(r'\d+', time_info) # 直接提取所有數字
+                        slots = DIGITS_RE.findall(time_info) # 直接提取所有數字
                         processed_slots = []
                         for s in slots:
                             try:
@@ -791,7 +805,7 @@ def process_pokemon_block(block_lines):
 
             # c. 嘗試匹配身材 (如果第一行沒找到 且 未被處理為時段)
             if not size_found and not is_processed_structurally:
-                size_match = re.match(r'^\s*(\d{3})\s*\.\s*(\d{2,3})\s*\.\s*([A-Za-z\+\-]+)\s*$', current_line)
+                size_match = DOT_SIZE_LINE_RE.match(current_line)
                 if size_match:
                     try: height = int(size_match.group(1))
                     except ValueError: pass
@@ -806,7 +820,7 @@ def process_pokemon_block(block_lines):
             if not is_processed_structurally and current_line:
                  # 檢查介紹行中是否包含別名，如果第一行沒找到，則記錄
                  if not alias_suggestion:
-                     alias_match_intro = re.search(alias_pattern, current_line)
+                     alias_match_intro = alias_pattern.search(current_line)
                      if alias_match_intro:
                          alias_content = alias_match_intro.group(1).strip()
                          if alias_content.startswith("原"):
@@ -836,64 +850,31 @@ def process_pokemon_block(block_lines):
 # --- *** 函數 6: 解析新的 "愛寶館" 格式 (格式 G - Aibao) *** ---
 # ============================================================
 # --- *** 使用優化後的 parse_aibao_schedule *** ---
+# --- 預先編譯的正則 (模組載入時編譯一次) ---
+AIBAO_BLOCK_START_RE = re.compile(r'^\s*(?:\(new\)|（new）)?\s*[\(（]\s*\d+\s*[\)）]')
+AIBAO_SIZE_RE = re.compile(r'\(?\s*(\d{3})\s*[./\s]\s*(\d{2,3})\s*[./\s]\s*([A-Za-z\+\-]+)\s*\)?')  # Adjusted to handle space/dot/slash
+AIBAO_SIZE_ONLY_RE = re.compile(r'^\s*' + r'\(?\s*\d{3}\s*[./\s]\s*\d{2,3}\s*[./\s]\s*[A-Za-z\+\-]+\s*\)?' + r'\s*$')
+AIBAO_TIME_ONLY_RE = re.compile(r'^\s*(?:🈵+|[\d\.\s]+)\s*$')
+AIBAO_FEE_PREFIX_RE = re.compile(r'^\s*(?:\(new\)|（new）)?\s*[\(（]\s*\d+\s*[\)）]\s*')
+AIBAO_TRAILING_TIME_RE = re.compile(r'((?:[\d]+\.?)+|🈵+)\s*$')
+AIBAO_TRAILING_NON_WORD_RE = re.compile(r'\W+$')
+AIBAO_EMPTY_PARENS_RE = re.compile(r'\(\s*\)')
+AIBAO_EMPTY_FULLWIDTH_PARENS_RE = re.compile(r'（\s*）')
+AIBAO_SPACED_PARENS_RE = re.compile(r'\(\s+\)')
+AIBAO_SPACED_FULLWIDTH_PARENS_RE = re.compile(r'（\s+）')
+
+def iter_aibao_schedule(lines):
+    """parse_aibao_schedule 的串流版本：lines 可為字串、檔案物件或任意行的 iterable，逐一 yield 解析結果。"""
+    # 區塊內保留原始行 (僅濾掉空行)。舊版的備用模式 ^(數字) 是主要模式的子集，已移除
+    yield from _iter_parsed_blocks(lines, AIBAO_BLOCK_START_RE, process_aibao_block, 'Aibao', strip_lines=False, warn_failures=True, missing_level=logging.WARNING)
+
 def parse_aibao_schedule(text):
     """
     解析 "愛寶館" 格式的 LINE 文字班表。
     返回與 parse_line_schedule 相同結構的列表。
     採用更健壯的區塊分割邏輯。
     """
-    results = []
-    lines = text.strip().split('\n')
-    if not lines:
-        return results
-
-    # 愛寶區塊開始模式：(數字) 或 (new)(數字)，考慮前後空格和全半形括號
-    block_start_pattern = r'^\s*(?:\(new\)|（new）)?\s*[\(（]\s*\d+\s*[\)）]'
-    start_indices = []
-
-    # 1. 找到所有區塊開始行的索引
-    for i, line in enumerate(lines):
-        line_strip = line.strip()
-        if not line_strip: continue # 跳過空行
-        if re.match(block_start_pattern, line_strip):
-            start_indices.append(i)
-
-    if not start_indices:
-        logger.warning("Aibao Parser: No block start lines found using pattern: %s", block_start_pattern)
-        # 作為備用，嘗試一個更簡單的模式，僅查找行首的 (數字) 或 （數字）
-        block_start_pattern_fallback = r'^\s*[\(（]\s*\d+\s*[\)）]'
-        for i, line in enumerate(lines):
-             line_strip = line.strip()
-             if not line_strip: continue
-             if re.match(block_start_pattern_fallback, line_strip):
-                  start_indices.append(i)
-        if not start_indices:
-             logger.error("Aibao Parser: Still no block start lines found even with fallback pattern.")
-             return results # 如果還是找不到，返回空
-
-    # 2. 根據開始行索引分割區塊
-    num_blocks = len(start_indices)
-    for i in range(num_blocks):
-        start_index = start_indices[i]
-        # 結束索引是下一個開始行的索引，或者是列表的末尾
-        end_index = start_indices[i+1] if (i + 1) < num_blocks else len(lines)
-
-        # 獲取當前區塊的所有行 (從 start_index 到 end_index 之前)
-        current_block_lines = [lines[j] for j in range(start_index, end_index)]
-
-        # 過濾掉純粹的空行或只有空格的行
-        current_block_lines_cleaned = [line for line in current_block_lines if line.strip()]
-
-        if current_block_lines_cleaned:
-            parsed = process_aibao_block(current_block_lines_cleaned) # <--- 調用愛寶館的處理函數
-            if parsed:
-                results.append(parsed)
-            else:
-                logger.warning(f"Aibao Parser: Failed to process block starting at line {start_index+1}: {current_block_lines_cleaned[0] if current_block_lines_cleaned else 'EMPTY'}")
-        else:
-            logger.debug(f"Aibao Parser: Skipping empty block found between lines {start_index} and {end_index}")
-
-    return results
+    return list(iter_aibao_schedule(text))
 
 # --- process_aibao_block 函數 (移除括號清理，別名視為介紹) ---
 def process_aibao_block(block_lines):
@@ -905,10 +886,10 @@ def process_aibao_block(block_lines):
     other_lines = [] # 收集介紹行
 
     # Patterns
-    size_pattern_for_match = r'\(?\s*(\d{3})\s*[./\s]\s*(\d{2,3})\s*[./\s]\s*([A-Za-z\+\-]+)\s*\)?' # Adjusted to handle space/dot/slash
+    size_pattern_for_match = AIBAO_SIZE_RE
     # Patterns to check if a line *only* contains specific info
-    size_only_pattern = r'^\s*' + r'\(?\s*\d{3}\s*[./\s]\s*\d{2,3}\s*[./\s]\s*[A-Za-z\+\-]+\s*\)?' + r'\s*$'
-    time_only_pattern = r'^\s*(?:🈵+|[\d\.\s]+)\s*$'
+    size_only_pattern = AIBAO_SIZE_ONLY_RE
+    time_only_pattern = AIBAO_TIME_ONLY_RE
 
     # Flags
     time_found = False
@@ -919,13 +900,13 @@ def process_aibao_block(block_lines):
         first_line = block_lines[0].strip()
         original_name_text = first_line
 
-        fee_match = re.search(r'[\(（]\s*(\d+)\s*[\)）]', first_line)
+        fee_match = PAREN_FEE_RE.search(first_line)
         if fee_match:
             try: fee = int(fee_match.group(1)) * 100
             except ValueError: logger.warning(f"Aibao Parser: Cannot parse fee '{fee_match.group(1)}' from '{first_line}'")
 
-        content_part = re.sub(r'^\s*(?:\(new\)|（new）)?\s*[\(（]\s*\d+\s*[\)）]\s*', '', first_line).strip()
-        time_match = re.search(r'((?:[\d]+\.?)+|🈵+)\s*$', content_part)
+        content_part = AIBAO_FEE_PREFIX_RE.sub('', first_line).strip()
+        time_match = AIBAO_TRAILING_TIME_RE.search(content_part)
 
         if time_match:
             name_part = content_part[:time_match.start()].strip()
@@ -933,7 +914,7 @@ def process_aibao_block(block_lines):
             if '🈵' in time_info:
                  time_slots_str = "預約滿"
             else:
-                 slots = re.findall(r'\d+', time_info)
+                 slots = DIGITS_RE.findall(time_info)
                  processed_slots = []; valid_time_line_f1 = False
                  for s in slots:
                      try:
@@ -947,10 +928,10 @@ def process_aibao_block(block_lines):
                       processed_slots.sort(); time_slots_str = ".".join(map(str, processed_slots))
                  else: time_slots_str = ""
             time_found = True
-            name = re.sub(r'\W+$', '', name_part).strip()
+            name = AIBAO_TRAILING_NON_WORD_RE.sub('', name_part).strip()
         else:
             name_part = content_part.strip()
-            name = re.sub(r'\W+$', '', name_part).strip()
+            name = AIBAO_TRAILING_NON_WORD_RE.sub('', name_part).strip()
 
         if not name:
              logger.warning(f"Aibao Parser: Could not parse name from first line: '{first_line}'")
@@ -972,8 +953,8 @@ def process_aibao_block(block_lines):
                 is_time_line = False # Local flag for this line
                 if '🈵' in current_line:
                     time_slots_str = "預約滿"; time_found = True; is_time_line = True
-                elif re.match(r'^[\d\.\s]+$', current_line):
-                    slots = re.findall(r'\d+', current_line)
+                elif TIME_DIGITS_LINE_RE.match(current_line):
+                    slots = DIGITS_RE.findall(current_line)
                     processed_slots = []; valid_time_line_sub = False
                     for s in slots:
                         try:
@@ -988,11 +969,11 @@ def process_aibao_block(block_lines):
                     else: time_slots_str = ""
                 if is_time_line:
                     contains_time_this_line = True
-                    if re.match(time_only_pattern, current_line):
+                    if time_only_pattern.match(current_line):
                         is_only_time = True
 
             # --- Check Size ---
-            local_size_match = re.search(size_pattern_for_match, current_line)
+            local_size_match = size_pattern_for_match.search(current_line)
             if local_size_match:
                 contains_size_this_line = True
                 local_size_match_obj = local_size_match # Store match object
@@ -1003,7 +984,7 @@ def process_aibao_block(block_lines):
                     except ValueError: pass
                     cup = local_size_match.group(3).strip()
                     size_found = True
-                if re.match(size_only_pattern, current_line):
+                if size_only_pattern.match(current_line):
                     is_only_size = True
 
             # --- Alias Check Removed ---
@@ -1022,10 +1003,10 @@ def process_aibao_block(block_lines):
 
                 # Clean up remaining whitespace and artifacts like empty brackets
                 intro_text_candidate = intro_text_candidate.strip()
-                intro_text_candidate = re.sub(r'\(\s*\)', '', intro_text_candidate) # Remove ()
-                intro_text_candidate = re.sub(r'（\s*）', '', intro_text_candidate) # Remove （）
-                intro_text_candidate = re.sub(r'\(\s+\)', '', intro_text_candidate) # Remove ( )
-                intro_text_candidate = re.sub(r'（\s+）', '', intro_text_candidate) # Remove （ ）
+                intro_text_candidate = AIBAO_EMPTY_PARENS_RE.sub('', intro_text_candidate) # Remove ()
+                intro_text_candidate = AIBAO_EMPTY_FULLWIDTH_PARENS_RE.sub('', intro_text_candidate) # Remove （）
+                intro_text_candidate = AIBAO_SPACED_PARENS_RE.sub('', intro_text_candidate) # Remove ( )
+                intro_text_candidate = AIBAO_SPACED_FULLWIDTH_PARENS_RE.sub('', intro_text_candidate) # Remove （ ）
                 # *** REMOVED the lines that removed leading/trailing brackets unconditionally ***
                 intro_text_candidate = intro_text_candidate.strip() # Strip again after potential removals
 
@@ -1053,49 +1034,23 @@ def process_aibao_block(block_lines):
 # ============================================================
 # --- *** 函數 7: 解析新的 "含香館" 格式 (格式 H - Hanxiang) *** ---
 # ============================================================
+# --- 預先編譯的正則 (模組載入時編譯一次) ---
+HANXIANG_BLOCK_START_RE = re.compile(r'^\s*(?:🆕)?\s*[\(（]\s*\d+\s*[\)）]')
+HANXIANG_ALIAS_RE = re.compile(r'[\(（]([\u4e00-\u9fa5\w]+\s+[^）\)]+)[\)）]')
+HANXIANG_SIZE_RE = re.compile(r'\(?\s*(\d{3})\s*[./]\s*(\d{2,3})\s*[./]\s*([A-Za-z\+\(\)]+)\s*\)?')  # 加入對括號的兼容性
+HANXIANG_FEE_PREFIX_RE = re.compile(r'^\s*(?:🆕)?\s*[\(（]\s*\d+\s*[\)）]\s*')
+HANXIANG_TRAILING_ALIAS_RE = re.compile(HANXIANG_ALIAS_RE.pattern + r'\s*$')  # 行尾的別名
+
+def iter_hanxiang_schedule(lines):
+    """parse_hanxiang_schedule 的串流版本：lines 可為字串、檔案物件或任意行的 iterable，逐一 yield 解析結果。"""
+    yield from _iter_parsed_blocks(lines, HANXIANG_BLOCK_START_RE, process_hanxiang_block, 'Hanxiang', strip_lines=False, warn_failures=True)
+
 def parse_hanxiang_schedule(text):
     """
     解析 "含香館" 格式的 LINE 文字班表。
     使用與 Aibao 類似的健壯區塊分割邏輯。
     """
-    results = []
-    lines = text.strip().split('\n')
-    if not lines:
-        return results
-
-    # 含香區塊開始模式：(數字) 或 🆕(數字)，考慮前後空格和全半形括號
-    block_start_pattern = r'^\s*(?:🆕)?\s*[\(（]\s*\d+\s*[\)）]'
-    start_indices = []
-
-    # 1. 找到所有區塊開始行的索引
-    for i, line in enumerate(lines):
-        line_strip = line.strip()
-        if not line_strip: continue
-        if re.match(block_start_pattern, line_strip):
-            start_indices.append(i)
-
-    if not start_indices:
-        logger.error("Hanxiang Parser: No block start lines found.")
-        return results
-
-    # 2. 根據開始行索引分割區塊
-    num_blocks = len(start_indices)
-    for i in range(num_blocks):
-        start_index = start_indices[i]
-        end_index = start_indices[i+1] if (i + 1) < num_blocks else len(lines)
-        current_block_lines = [lines[j] for j in range(start_index, end_index)]
-        current_block_lines_cleaned = [line for line in current_block_lines if line.strip()]
-
-        if current_block_lines_cleaned:
-            parsed = process_hanxiang_block(current_block_lines_cleaned) # <--- 調用含香館的處理函數
-            if parsed:
-                results.append(parsed)
-            else:
-                logger.warning(f"Hanxiang Parser: Failed to process block starting at line {start_index+1}: {current_block_lines_cleaned[0] if current_block_lines_cleaned else 'EMPTY'}")
-        else:
-            logger.debug(f"Hanxiang Parser: Skipping empty block found between lines {start_index} and {end_index}")
-
-    return results
+    return list(iter_hanxiang_schedule(text))
 
 # --- process_hanxiang_block 函數 (修正版：保留 ◆) ---
 def process_hanxiang_block(block_lines):
@@ -1109,25 +1064,25 @@ def process_hanxiang_block(block_lines):
     intro_lines = []
 
     # 別名模式: (地點 名字) e.g., (寶可夢 小羽), (紐約 秘書)
-    alias_pattern = r'[\(（]([\u4e00-\u9fa5\w]+\s+[^）\)]+)[\)）]'
+    alias_pattern = HANXIANG_ALIAS_RE
     # 身材模式: XXX/XX/X 或 XXX.XX.X (允許空格和括號)
-    size_pattern = r'\(?\s*(\d{3})\s*[./]\s*(\d{2,3})\s*[./]\s*([A-Za-z\+\(\)]+)\s*\)?' # 加入對括號的兼容性
+    size_pattern = HANXIANG_SIZE_RE
 
     try:
         # 1. Process First Line (Fee, Name, Size, Alias)
         first_line = block_lines[0].strip()
         original_name_text = first_line
 
-        fee_match = re.search(r'[\(（]\s*(\d+)\s*[\)）]', first_line)
+        fee_match = PAREN_FEE_RE.search(first_line)
         if fee_match:
             try: fee = int(fee_match.group(1)) * 100
             except ValueError: logger.warning(f"Hanxiang Parser: Cannot parse fee '{fee_match.group(1)}' from '{first_line}'")
 
         # Extract content after fee and potential 🆕 tag
-        content_after_fee = re.sub(r'^\s*(?:🆕)?\s*[\(（]\s*\d+\s*[\)）]\s*', '', first_line).strip()
+        content_after_fee = HANXIANG_FEE_PREFIX_RE.sub('', first_line).strip()
 
         # Try to extract alias from the end first
-        alias_match = re.search(alias_pattern + r'\s*$', content_after_fee)
+        alias_match = HANXIANG_TRAILING_ALIAS_RE.search(content_after_fee)
         name_and_size_part = content_after_fee # Default
         if alias_match:
             alias_full_text = alias_match.group(1).strip()
@@ -1140,20 +1095,20 @@ def process_hanxiang_block(block_lines):
             name_and_size_part = content_after_fee[:alias_match.start()].strip()
 
         # Try to extract size from the remaining part
-        size_match = re.search(size_pattern, name_and_size_part)
+        size_match = size_pattern.search(name_and_size_part)
         name_part = name_and_size_part # Default
         if size_match:
             try: height = int(size_match.group(1))
             except ValueError: pass
             try: weight = int(size_match.group(2))
             except ValueError: pass
-            cup_raw = size_match.group(3).strip(); cup = re.sub(r'[\(\)]', '', cup_raw) # Clean brackets from cup
+            cup_raw = size_match.group(3).strip(); cup = CUP_BRACKETS_RE.sub('', cup_raw) # Clean brackets from cup
             # Remove size part to get name
             name_part = name_and_size_part[:size_match.start()].strip() + name_and_size_part[size_match.end():].strip()
             name_part = name_part.strip() # Clean spaces left
 
         # Clean name: remove trailing non-word characters (like potential emojis)
-        name = re.sub(r'[^\w\s]+$', '', name_part).strip()
+        name = TRAILING_SYMBOLS_RE.sub('', name_part).strip()
 
         if not name:
              logger.warning(f"Hanxiang Parser: Could not parse name from first line: '{first_line}' (after processing fee/alias/size)")
@@ -1170,8 +1125,8 @@ def process_hanxiang_block(block_lines):
         last_line = block_lines[-1].strip()
         if '🈵' in last_line:
             time_slots_str = "預約滿"
-        elif re.match(r'^[\d\.\s]+$', last_line): # Check if it looks like time slots
-            slots = re.findall(r'\d+', last_line)
+        elif TIME_DIGITS_LINE_RE.match(last_line): # Check if it looks like time slots
+            slots = DIGITS_RE.findall(last_line)
             processed_slots = []
             valid_time_line_last = False
             for s in slots:
@@ -1208,57 +1163,34 @@ def process_hanxiang_block(block_lines):
 # ============================================================
 # --- *** 函數 8: 解析新的 "潘朵拉" 格式 (格式 P - Pandora) *** ---
 # ============================================================
+# --- 預先編譯的正則 (模組載入時編譯一次) ---
+PANDORA_BLOCK_START_RE = re.compile(r'^\s*(?:[\U0001F300-\U0001FAFF\s]+)?\s*【\s*\d+\s*】')  # Allow emojis/spaces before 【】
+PANDORA_SIZE_RE = re.compile(r'\(?\s*(\d{3})\s*[./\s]\s*(\d{2,3})\s*[./\s]\s*([A-Za-z\+\(\)]+)\s*\)?')
+PANDORA_SPECIFIC_ALIAS_RE = re.compile(r'[\(（](?:(原)\s*|([\u4e00-\u9fa5\w]+)\s+)([^）\)]+)[\)）]')
+PANDORA_DESC_RE = re.compile(r'<([^>]+)>')
+PANDORA_SERVICE_TAG_RE = re.compile(r'約\s*(\([\w\s]+\)|\（[\w\s]+\）)(\s*\([\w\s]+\)|\s*（[\w\s]+\）)*')
+PANDORA_EMOJI_PLACEHOLDER_RE = re.compile(r'[\(（]\s*emoji\s*[\)）]', re.IGNORECASE)  # For cleaning like (emoji)
+PANDORA_NAME_BRACKETS_RE = re.compile(r'\s*[\(（][^)）>]*[\)）]\s*')
+PANDORA_FEE_RE = re.compile(r'【\s*(\d+)\s*】')
+PANDORA_FEE_PREFIX_RE = re.compile(r'^\s*(?:[\U0001F300-\U0001FAFF\s]+)?\s*【\s*\d+\s*】\s*')
+PANDORA_NAME_RE = re.compile(r'^([\u4e00-\u9fffA-Za-z0-9]+)')
+PANDORA_TRAILING_NON_WORD_RE = re.compile(r'[^\w]+$')
+PANDORA_TIME_DIGITS_RE = re.compile(r'([\d\.\s]+)')
+PANDORA_DESC_SPLIT_RE = re.compile(r'(<[^>]+>)')
+PANDORA_EMPTY_PARENS_RE = re.compile(r'\(\s*\)|（\s*）|\(\s+\)|（\s+）')
+PANDORA_VIP_TAG_RE = re.compile(r'(\([a-zA-Z]\))+')
+
+def iter_pandora_schedule(lines):
+    """parse_pandora_schedule 的串流版本：lines 可為字串、檔案物件或任意行的 iterable，逐一 yield 解析結果。"""
+    # 區塊內保留原始行 (僅濾掉空行)。舊版另判斷行首【數字】，但主要模式已涵蓋，已移除
+    yield from _iter_parsed_blocks(lines, PANDORA_BLOCK_START_RE, process_pandora_block, 'Pandora', strip_lines=False, warn_failures=True)
+
 def parse_pandora_schedule(text):
     """
     解析 "潘朵拉" 格式的 LINE 文字班表。
     使用與 Aibao/Hanxiang 類似的健壯區塊分割邏輯。
     """
-    results = []
-    lines = text.strip().split('\n')
-    if not lines:
-        return results
-
-    # 潘朵拉區塊開始模式：【數字】，前面可能有 emoji
-    # Allow potential emojis before the block start pattern
-    block_start_pattern = r'^\s*(?:[\U0001F300-\U0001FAFF\s]+)?\s*【\s*\d+\s*】' # Allow emojis/spaces before 【】
-    start_indices = []
-
-    # 1. 找到所有區塊開始行的索引
-    for i, line in enumerate(lines):
-        line_strip = line.strip()
-        if not line_strip: continue
-        if re.match(block_start_pattern, line_strip):
-            start_indices.append(i)
-        # Handle edge case where a block might start without the initial emoji line becoming intro
-        elif i > 0 and re.match(r'^\s*【\s*\d+\s*】', line_strip) and not re.match(block_start_pattern, lines[i-1].strip()):
-             # If this line starts with 【】 but the previous wasn't a start, consider this a start
-             start_indices.append(i)
-
-
-    if not start_indices:
-        logger.error("Pandora Parser: No block start lines found using pattern: %s", block_start_pattern)
-        return results # Return empty if no blocks found
-
-    # *** REMOVED the faulty refinement logic ***
-
-    # 2. 根據開始行索引分割區塊
-    num_blocks = len(start_indices)
-    for i in range(num_blocks):
-        start_index = start_indices[i]
-        end_index = start_indices[i+1] if (i + 1) < num_blocks else len(lines)
-        current_block_lines = [lines[j] for j in range(start_index, end_index)]
-        current_block_lines_cleaned = [line for line in current_block_lines if line.strip()]
-
-        if current_block_lines_cleaned:
-            parsed = process_pandora_block(current_block_lines_cleaned) # <--- 調用潘朵拉的處理函數
-            if parsed:
-                results.append(parsed)
-            else:
-                logger.warning(f"Pandora Parser: Failed to process block starting at line {start_index+1}: {current_block_lines_cleaned[0] if current_block_lines_cleaned else 'EMPTY'}")
-        else:
-            logger.debug(f"Pandora Parser: Skipping empty block found between lines {start_index} and {end_index}")
-
-    return results
+    return list(iter_pandora_schedule(text))
 
 # --- process_pandora_block 函數 (v7: 再次修正名字清理) ---
 def process_pandora_block(block_lines):
@@ -1272,13 +1204,13 @@ def process_pandora_block(block_lines):
     potential_intro_parts = [] # Collect potential intro fragments
 
     # Patterns
-    size_pattern = r'\(?\s*(\d{3})\s*[./\s]\s*(\d{2,3})\s*[./\s]\s*([A-Za-z\+\(\)]+)\s*\)?'
-    specific_alias_pattern = r'[\(（](?:(原)\s*|([\u4e00-\u9fa5\w]+)\s+)([^）\)]+)[\)）]'
-    desc_pattern = r'<([^>]+)>'
-    service_tag_pattern = r'約\s*(\([\w\s]+\)|\（[\w\s]+\）)(\s*\([\w\s]+\)|\s*（[\w\s]+\）)*'
-    emoji_placeholder_pattern = r'[\(（]\s*emoji\s*[\)）]' # For cleaning like (emoji)
+    size_pattern = PANDORA_SIZE_RE
+    specific_alias_pattern = PANDORA_SPECIFIC_ALIAS_RE
+    desc_pattern = PANDORA_DESC_RE
+    service_tag_pattern = PANDORA_SERVICE_TAG_RE
+    emoji_placeholder_pattern = PANDORA_EMOJI_PLACEHOLDER_RE
     # General bracket pattern for cleaning name part, including specific cases like (v)(i)(p)
-    general_bracket_pattern_for_name_cleaning = r'\s*[\(（][^)）>]*[\)）]\s*'
+    general_bracket_pattern_for_name_cleaning = PANDORA_NAME_BRACKETS_RE
 
 
     found_size_str = None
@@ -1288,18 +1220,18 @@ def process_pandora_block(block_lines):
         # 1. Process First Line - Get Fee and Initial Content
         first_line = block_lines[0].strip(); original_name_text = first_line
 
-        fee_match = re.search(r'【\s*(\d+)\s*】', first_line)
+        fee_match = PANDORA_FEE_RE.search(first_line)
         if fee_match:
             try: fee = int(fee_match.group(1)) * 100
             except ValueError: logger.warning(f"Pandora Parser: Cannot parse fee '{fee_match.group(1)}' from '{first_line}'")
 
-        content_after_fee = re.sub(r'^\s*(?:[\U0001F300-\U0001FAFF\s]+)?\s*【\s*\d+\s*】\s*', '', first_line).strip()
+        content_after_fee = PANDORA_FEE_PREFIX_RE.sub('', first_line).strip()
 
         # --- v7 Name Extraction: Match initial CJK/Letters/Digits ---
         name_part = ""
         remainder_first_line = content_after_fee # Default if no name match
         # Match initial sequence of CJK chars, English letters, OR digits
-        name_match = re.match(r'^([\u4e00-\u9fffA-Za-z0-9]+)', content_after_fee)
+        name_match = PANDORA_NAME_RE.match(content_after_fee)
         if name_match:
              name_part = name_match.group(1).strip() # Extract the core name part
              remainder_first_line = content_after_fee[name_match.end():].strip() # Get everything after
@@ -1316,10 +1248,10 @@ def process_pandora_block(block_lines):
 
         # Clean the extracted name_part vigorously
         name = name_part.strip()
-        name = re.sub(r'[\U0001F300-\U0001FAFF]', '', name).strip() # Clean standard emojis
+        name = EMOJI_RE.sub('', name).strip() # Clean standard emojis
         # *** Clean ANY bracketed content from the potential name part ***
-        name = re.sub(general_bracket_pattern_for_name_cleaning, '', name).strip()
-        name = re.sub(r'[^\w]+$', '', name).strip() # Clean trailing non-word chars
+        name = general_bracket_pattern_for_name_cleaning.sub('', name).strip()
+        name = PANDORA_TRAILING_NON_WORD_RE.sub('', name).strip() # Clean trailing non-word chars
 
         if not name:
              logger.error(f"Pandora Parser: Failed to extract name for block: '{first_line}'")
@@ -1339,10 +1271,10 @@ def process_pandora_block(block_lines):
                 time_slots_str = "預約滿"
                 trailing_intro_last_line = content_after_marker
             else: # Starts with 🈳
-                time_match_last = re.match(r'([\d\.\s]+)', content_after_marker)
+                time_match_last = PANDORA_TIME_DIGITS_RE.match(content_after_marker)
                 if time_match_last:
                     time_part = time_match_last.group(1)
-                    slots = re.findall(r'\d+', time_part)
+                    slots = DIGITS_RE.findall(time_part)
                     processed_slots = []; valid_time_line_last = False
                     for s in slots:
                          try:
@@ -1369,16 +1301,16 @@ def process_pandora_block(block_lines):
         all_potential_intro_text = all_potential_intro_text.strip()
 
         # 4. Globally Find First Size and Specific Alias within potential intro text
-        size_match_global = re.search(size_pattern, all_potential_intro_text)
+        size_match_global = size_pattern.search(all_potential_intro_text)
         if size_match_global:
              try: height = int(size_match_global.group(1))
              except ValueError: pass
              try: weight = int(size_match_global.group(2))
              except ValueError: pass
-             cup_raw = size_match_global.group(3).strip(); cup = re.sub(r'[\(\)]', '', cup_raw)
+             cup_raw = size_match_global.group(3).strip(); cup = CUP_BRACKETS_RE.sub('', cup_raw)
              found_size_str = size_match_global.group(0) # Store the exact string found
 
-        alias_match_global = re.search(specific_alias_pattern, all_potential_intro_text)
+        alias_match_global = specific_alias_pattern.search(all_potential_intro_text)
         if alias_match_global:
             is_original = alias_match_global.group(1)
             location = alias_match_global.group(2)
@@ -1404,10 +1336,10 @@ def process_pandora_block(block_lines):
         processed_intro_parts = []
         temp_intro_text = ""
         # Split carefully, handle potential nested or broken tags less likely now
-        parts = re.split(r'(<[^>]+>)', final_intro_text)
+        parts = PANDORA_DESC_SPLIT_RE.split(final_intro_text)
         for part in parts:
             if not part: continue
-            desc_match_part = re.match(r'<([^>]+)>', part)
+            desc_match_part = PANDORA_DESC_RE.match(part)
             if desc_match_part:
                 desc_content = desc_match_part.group(1).strip()
                 if desc_content:
@@ -1420,16 +1352,16 @@ def process_pandora_block(block_lines):
 
         # Rebuild intro, clean emojis and empty brackets/lines
         cleaned_intro_lines = []
-        emoji_placeholder_pattern_intro = r'[\(（]\s*emoji\s*[\)）]' # Specific pattern for intro cleaning
+        emoji_placeholder_pattern_intro = PANDORA_EMOJI_PLACEHOLDER_RE
         for line in processed_intro_parts:
-             cleaned_line = re.sub(r'[\U0001F300-\U0001FAFF]', '', line).strip()
-             cleaned_line = re.sub(emoji_placeholder_pattern_intro, '', cleaned_line, flags=re.IGNORECASE).strip()
-             cleaned_line = re.sub(r'\(\s*\)|（\s*）|\(\s+\)|（\s+）', '', cleaned_line).strip()
+             cleaned_line = EMOJI_RE.sub('', line).strip()
+             cleaned_line = emoji_placeholder_pattern_intro.sub('', cleaned_line).strip()
+             cleaned_line = PANDORA_EMPTY_PARENS_RE.sub('', cleaned_line).strip()
              if cleaned_line:
                  # Remove potential remaining "約 (...)" tags if they weren't cleaned before
-                 cleaned_line = re.sub(service_tag_pattern, '', cleaned_line).strip()
+                 cleaned_line = service_tag_pattern.sub('', cleaned_line).strip()
                  # Remove potential vip tags like (v)(i)(p) from intro text
-                 cleaned_line = re.sub(r'(\([a-zA-Z]\))+', '', cleaned_line).strip()
+                 cleaned_line = PANDORA_VIP_TAG_RE.sub('', cleaned_line).strip()
                  if cleaned_line:
                      cleaned_intro_lines.append(cleaned_line)
 
@@ -1461,60 +1393,21 @@ def process_pandora_block(block_lines):
 # ============================================================
 # --- *** 函數 9: 解析新的 "王妃館" 格式 (格式 W - Wangfei) *** ---
 # ============================================================
+# --- 預先編譯的正則 (模組載入時編譯一次) ---
+WANGFEI_BLOCK_START_RE = re.compile(r'^\s*([^\s]+(?:\s+[^\s]+)*?)\s+(\d{2})\s*$')  # Allow spaces in name
+WANGFEI_NAME_FEE_RE = re.compile(r'^(.+?)\s+(\d{2})\s*$')
+
+def iter_wangfei_schedule(lines):
+    """parse_wangfei_schedule 的串流版本：lines 可為字串、檔案物件或任意行的 iterable，逐一 yield 解析結果。"""
+    # 第一個區塊前的注意事項由 iter_schedule_blocks 略過
+    yield from _iter_parsed_blocks(lines, WANGFEI_BLOCK_START_RE, process_wangfei_block, 'Wangfei', strip_lines=False, warn_failures=True)
+
 def parse_wangfei_schedule(text):
     """
     解析 "王妃館" 格式的 LINE 文字班表。
     跳過開頭的注意事項，然後使用健壯的區塊分割。
     """
-    results = []
-    lines = text.strip().split('\n')
-    if not lines: return results
-
-    start_parsing_index = 0
-    # 王妃區塊開始模式: 名字(非空格開頭) + 空格 + 2位數字費用
-    block_start_pattern = r'^\s*([^\s]+(?:\s+[^\s]+)*?)\s+(\d{2})\s*$' # Allow spaces in name
-    # 找到第一個符合區塊開始模式的行，之前的都跳過
-    for i, line in enumerate(lines):
-        line_strip = line.strip()
-        if re.match(block_start_pattern, line_strip):
-            start_parsing_index = i
-            logger.info(f"Wangfei Parser: Found first block start at line {i+1}: '{line_strip}'")
-            break
-    else: # No block start found at all
-        logger.error("Wangfei Parser: No block start pattern found in the entire text.")
-        return results
-
-    # Find all block start indices from the parsing start point
-    start_indices = []
-    for i in range(start_parsing_index, len(lines)):
-        line_strip = lines[i].strip()
-        if not line_strip: continue
-        if re.match(block_start_pattern, line_strip):
-            start_indices.append(i)
-
-    if not start_indices:
-         logger.error("Wangfei Parser: No block start indices identified after skipping header.")
-         return results
-
-    # Split blocks based on indices
-    num_blocks = len(start_indices)
-    for i in range(num_blocks):
-        start_index = start_indices[i]
-        end_index = start_indices[i+1] if (i + 1) < num_blocks else len(lines)
-        current_block_lines = [lines[j] for j in range(start_index, end_index)]
-        current_block_lines_cleaned = [line for line in current_block_lines if line.strip()]
-
-        if current_block_lines_cleaned:
-            parsed = process_wangfei_block(current_block_lines_cleaned)
-            if parsed:
-                results.append(parsed)
-            else:
-                logger.warning(f"Wangfei Parser: Failed to process block starting at line {start_index+1}: {current_block_lines_cleaned[0] if current_block_lines_cleaned else 'EMPTY'}")
-        else:
-            logger.debug(f"Wangfei Parser: Skipping empty block found between lines {start_index} and {end_index}")
-
-    return results
-
+    return list(iter_wangfei_schedule(text))
 
 def process_wangfei_block(block_lines):
     """處理單個 "王妃館" 格式的美容師區塊"""
@@ -1532,7 +1425,7 @@ def process_wangfei_block(block_lines):
         original_name_text = first_line # Record the raw first line
 
         # Match name (non-space chars, allowing spaces within name) followed by space(s) and 2 digits fee
-        match = re.match(r'^(.+?)\s+(\d{2})\s*$', first_line) # Use non-greedy match for name
+        match = WANGFEI_NAME_FEE_RE.match(first_line) # Use non-greedy match for name
         if match:
             name = match.group(1).strip()
             try:
@@ -1571,7 +1464,7 @@ def process_wangfei_block(block_lines):
                  time_slots_str = ""
             else:
                 # Time slots separated by '、'
-                slots = re.findall(r'\d+', time_info) # Find all numbers
+                slots = DIGITS_RE.findall(time_info) # Find all numbers
                 processed_slots = []
                 valid_time_line_last = False
                 for s in slots:
@@ -1608,48 +1501,20 @@ def process_wangfei_block(block_lines):
 # ============================================================
 # --- *** 函數 10: 解析新的 "樂鑽館" 格式 (格式 L - Lezuan) *** ---
 # ============================================================
+# --- 預先編譯的正則 (模組載入時編譯一次) ---
+LEZUAN_BLOCK_START_RE = re.compile(r'^\s*([^\s\(（]+(?:\s+[^\s\(（]+)*?)\s+[\(（](?:[\w\d\u4e00-\u9fa5]+)[\)）][\(（]\d+[\)）]單')
+LEZUAN_FIRST_LINE_RE = re.compile(r'^\s*(.+?)\s+[\(（]([\w\d\u4e00-\u9fa5]+)[\)）][\(（](\d+)[\)）]單')
+LEZUAN_TIME_LINE_RE = re.compile(r'^\s*(?:\(clock\)|⏰|🕛|🕐|🕑|🕒|🕓|🕔|🕕|🕖|🕗|🕘|🕙|🕚|🕧)\s*(.*)')
+
+def iter_lezuan_schedule(lines):
+    """parse_lezuan_schedule 的串流版本：lines 可為字串、檔案物件或任意行的 iterable，逐一 yield 解析結果。"""
+    yield from _iter_parsed_blocks(lines, LEZUAN_BLOCK_START_RE, process_lezuan_block, 'Lezuan', strip_lines=False, warn_failures=True)
+
 def parse_lezuan_schedule(text):
     """
     解析 "樂鑽館" 格式的 LINE 文字班表。
     """
-    results = []
-    lines = text.strip().split('\n')
-    if not lines: return results
-
-    # 樂鑽區塊開始模式: 名字 (可能含空格) + 空格 + (費用)單
-    # Fee part: (digit/word)(digit)單 e.g., (2)(9)單 or (three)(3)單
-    block_start_pattern = r'^\s*([^\s\(（]+(?:\s+[^\s\(（]+)*?)\s+[\(（](?:[\w\d\u4e00-\u9fa5]+)[\)）][\(（]\d+[\)）]單'
-    start_indices = []
-
-    # 1. Find all block start indices
-    for i, line in enumerate(lines):
-        line_strip = line.strip()
-        if not line_strip: continue
-        if re.match(block_start_pattern, line_strip):
-            start_indices.append(i)
-
-    if not start_indices:
-        logger.error("Lezuan Parser: No block start lines found using pattern: %s", block_start_pattern)
-        return results
-
-    # 2. Split blocks based on indices
-    num_blocks = len(start_indices)
-    for i in range(num_blocks):
-        start_index = start_indices[i]
-        end_index = start_indices[i+1] if (i + 1) < num_blocks else len(lines)
-        current_block_lines = [lines[j] for j in range(start_index, end_index)]
-        current_block_lines_cleaned = [line for line in current_block_lines if line.strip()]
-
-        if current_block_lines_cleaned:
-            parsed = process_lezuan_block(current_block_lines_cleaned)
-            if parsed:
-                results.append(parsed)
-            else:
-                logger.warning(f"Lezuan Parser: Failed to process block starting at line {start_index+1}: {current_block_lines_cleaned[0] if current_block_lines_cleaned else 'EMPTY'}")
-        else:
-             logger.debug(f"Lezuan Parser: Skipping empty block found between lines {start_index} and {end_index}")
-
-    return results
+    return list(iter_lezuan_schedule(text))
 
 def process_lezuan_block(block_lines):
     """處理單個 "樂鑽館" 格式的美容師區塊"""
@@ -1662,16 +1527,16 @@ def process_lezuan_block(block_lines):
     intro_lines = []
 
     # Pattern to extract name and fee parts from the first line
-    first_line_pattern = r'^\s*(.+?)\s+[\(（]([\w\d\u4e00-\u9fa5]+)[\)）][\(（](\d+)[\)）]單'
+    first_line_pattern = LEZUAN_FIRST_LINE_RE
     # Pattern for the time line (flexible with emoji)
-    time_line_pattern = r'^\s*(?:\(clock\)|⏰|🕛|🕐|🕑|🕒|🕓|🕔|🕕|🕖|🕗|🕘|🕙|🕚|🕧)\s*(.*)'
+    time_line_pattern = LEZUAN_TIME_LINE_RE
 
 
     try:
         # 1. Process First Line (Name, Fee)
         first_line = block_lines[0].strip()
         original_name_text = first_line # Keep raw line
-        match = re.match(first_line_pattern, first_line)
+        match = first_line_pattern.match(first_line)
         if match:
             name = match.group(1).strip()
             fee_part1_str = match.group(2).lower() # e.g., "2" or "three" or "三"
@@ -1702,7 +1567,7 @@ def process_lezuan_block(block_lines):
             else: return None # Cannot proceed
 
         # 2. Process Second Line (Time)
-        time_line_match = re.match(time_line_pattern, block_lines[1].strip())
+        time_line_match = time_line_pattern.match(block_lines[1].strip())
         if time_line_match:
             time_info = time_line_match.group(1).strip()
             if '🈵' in time_info:
@@ -1711,7 +1576,7 @@ def process_lezuan_block(block_lines):
                 time_slots_str = ""
             else:
                 # Time slots separated by '.'
-                slots = re.findall(r'\d+', time_info) # Find all numbers
+                slots = DIGITS_RE.findall(time_info) # Find all numbers
                 processed_slots = []; valid_time_line = False
                 for s in slots:
                      try:
@@ -1752,4 +1617,28 @@ def process_lezuan_block(block_lines):
         return None
 
 
+# ============================================================
+# --- 格式註冊 (views 依 Hall.schedule_format_type 查表分派) ---
+# ============================================================
+# 特徵正則：只用於 detect_format() 評分，不影響解析本身
+CLOCK_LINE_RE = re.compile(r'^⏰')  # ⏰ 開頭的時段行
+VACANT_LINE_RE = re.compile(r'^🈳')  # 🈳 開頭的時段行
+CHATANGHUI_SIGNATURE_RE = re.compile(r'【[^】\d]+】\s*\d+')  # 【名字】費用
+XINYUAN_SIGNATURE_RE = re.compile(r'^《\s*\d+\s*》')
+AIBAO_SIGNATURE_RE = re.compile(r'^\s*(?:\(new\)|（new）)?\s*[\(（]\s*\d+\s*[\)）].*?\s(?:\d+\.)*\d+\s*$')  # 首行尾的時段
+HANXIANG_SIGNATURE_RE = re.compile(r'^◆')
+PANDORA_SIGNATURE_RE = re.compile(r'【\s*\d+\s*】')
+LEZUAN_SIGNATURE_RE = re.compile(r'[\)）][\(（]\d+[\)）]單')
+
+register_format('format_a', parse_line_schedule, FORMAT_A_BLOCK_START_RE, signatures=(CLOCK_LINE_RE,), stream=iter_line_schedule)
+register_format('chatanghui', parse_chatanghui_schedule, CHATANGHUI_BLOCK_START_RE, signatures=(CHATANGHUI_SIGNATURE_RE,), stream=iter_chatanghui_schedule)
+register_format('xinyuan', parse_xinyuan_schedule, XINYUAN_BLOCK_START_RE, signatures=(XINYUAN_SIGNATURE_RE,), stream=iter_xinyuan_schedule)
+register_format('shouzhongqing', parse_shouzhongqing_schedule, SHOUZHONGQING_BLOCK_START_RE, signatures=(CLOCK_LINE_RE,), stream=iter_shouzhongqing_schedule)
+register_format('pokemon', parse_pokemon_schedule, POKEMON_BLOCK_START_RE, signatures=(VACANT_LINE_RE,), stream=iter_pokemon_schedule)
+register_format('aibao', parse_aibao_schedule, AIBAO_BLOCK_START_RE, signatures=(AIBAO_SIGNATURE_RE,), stream=iter_aibao_schedule)
+register_format('hanxiang', parse_hanxiang_schedule, HANXIANG_BLOCK_START_RE, signatures=(HANXIANG_SIGNATURE_RE,), stream=iter_hanxiang_schedule)
+register_format('pandora', parse_pandora_schedule, PANDORA_BLOCK_START_RE, signatures=(PANDORA_SIGNATURE_RE, VACANT_LINE_RE), stream=iter_pandora_schedule)
+register_format('wangfei', parse_wangfei_schedule, WANGFEI_BLOCK_START_RE, signatures=(CLOCK_LINE_RE,), stream=iter_wangfei_schedule)
+register_format('lezuan', parse_lezuan_schedule, LEZUAN_BLOCK_START_RE, signatures=(LEZUAN_SIGNATURE_RE,), stream=iter_lezuan_schedule)
+
 # --- utils.py 文件結束 ---
\ No newline at end of file
@@ -1,5 +1,6 @@
 # D:\bkgg\mybackend\schedule_parser\views.py
 import json
+import multiprocessing
 import traceback # 用於打印詳細錯誤
 import logging   # 添加 logging
 from django.shortcuts import render, get_object_or_404
@@ -11,18 +12,9 @@ from django.db.models import Q
 from myapp.models import Hall, Animal # 從 myapp 導入模型 (假設路徑正確)
 from .models import DailySchedule       # 從當前 app 導入
 # --- *** 導入所有需要的解析器 (包括新增的 lezuan) *** ---
-from .utils import (
-    parse_line_schedule,
-    parse_chatanghui_schedule,
-    parse_xinyuan_schedule,
-    parse_shouzhongqing_schedule,
-    parse_pokemon_schedule,
-    parse_aibao_schedule,
-    parse_hanxiang_schedule,
-    parse_pandora_schedule,
-    parse_wangfei_schedule,
-    parse_lezuan_schedule # <--- 導入樂鑽解析函數
-)
+from .registry import get_format, detect_format # 格式註冊表 (解析器於 utils.py 登記)
+from .bulk_import import BulkImportError, read_archive, run_bulk_import
+from .matching import HallAnimalIndex # 館別美容師名字索引 (每請求一次查詢)
 
 logger = logging.getLogger(__name__) # 添加 logger
 
@@ -77,23 +69,20 @@ def parse_schedule_view(request):
             print(f"Parsing schedule text for Hall ID: {selected_hall.id} ({selected_hall.name}), Format Type: {hall_format_type}...")
             logger.info(f"Parsing schedule text for Hall ID: {selected_hall.id} ({selected_hall.name}), Format Type: {hall_format_type}...")
 
-            parser_function = None
-            # (選擇解析器的邏輯不變)
-            if hall_format_type == 'format_a': parser_function = parse_line_schedule
-            elif hall_format_type == 'chatanghui': parser_function = parse_chatanghui_schedule
-            elif hall_format_type == 'xinyuan': parser_function = parse_xinyuan_schedule
-            elif hall_format_type == 'shouzhongqing': parser_function = parse_shouzhongqing_schedule
-            elif hall_format_type == 'pokemon': parser_function = parse_pokemon_schedule
-            elif hall_format_type == 'aibao': parser_function = parse_aibao_schedule
-            elif hall_format_type == 'hanxiang': parser_function = parse_hanxiang_schedule
-            elif hall_format_type == 'pandora': parser_function = parse_pandora_schedule
-            elif hall_format_type == 'wangfei': parser_function = parse_wangfei_schedule
-            elif hall_format_type == 'lezuan': parser_function = parse_lezuan_schedule
-
-            if parser_function:
-                print(f"  Using parser: {parser_function.__name__}")
-                logger.debug(f"Using parser: {parser_function.__name__}")
-                parsed_blocks = parser_function(schedule_text)
+            # format_type=auto 時不依館別設定，改由 detect_format() 判斷
+            detected_format = None
+            if request.POST.get('format_type') == 'auto':
+                detected_format, candidates = detect_format(schedule_text)
+                logger.info(f"Auto-detected schedule format '{detected_format}' (candidates: {candidates[:3]})")
+                if not detected_format:
+                    return JsonResponse({'error': '無法自動判斷班表格式，請確認內容或改用館別設定的格式'}, status=400)
+                hall_format_type = detected_format
+
+            schedule_format = get_format(hall_format_type)
+            if schedule_format:
+                print(f"  Using parser: {schedule_format.parse.__name__}")
+                logger.debug(f"Using parser: {schedule_format.parse.__name__}")
+                parsed_blocks = schedule_format.parse(schedule_text)
             else:
                 logger.error(f"Unknown schedule format type '{hall_format_type}' for Hall ID {selected_hall.id}")
                 return JsonResponse({'error': f'館別 "{selected_hall.name}" 的班表格式類型 ({hall_format_type}) 無法識別或尚未支援解析'}, status=400)
@@ -116,6 +105,12 @@ def parse_schedule_view(request):
             print("--- Handling PREVIEW action (Exact Match Only) ---")
             logger.info("Handling PREVIEW action (Exact Match Only)")
             preview_data = []
+            try:
+                # 一次查詢載入該館所有啟用中的美容師，之後在記憶體中比對 (名字優先，其次別名)
+                name_index = HallAnimalIndex.load(selected_hall)
+            except Exception as e:
+                logger.error(f"Error loading animals for hall '{selected_hall.name}'", exc_info=True)
+                name_index = None
             for block in parsed_blocks:
                 if not block or not block.get('name'):
                     print("Skipping invalid block:", block)
@@ -125,24 +120,18 @@ def parse_schedule_view(request):
                 match_status = "not_found" # 預設未找到
                 matched_animal_id = None
                 matched_animal_info = None
+                matched_by = None
                 possible_matches = [] # *** 不再需要提供任何建議 ***
 
                 search_name = block['name']
+                logger.debug(f"Matching '{search_name}' (name, then alias) within Hall '{selected_hall.name}'")
 
-                print(f"  Matching '{search_name}' strictly (exact name) within Hall '{selected_hall.name}'...")
-                logger.debug(f"Matching '{search_name}' strictly (exact name) within Hall '{selected_hall.name}'")
-
-                try:
-                    # 1. 精確匹配 (名字 + 所選館別) - 這是唯一會產生匹配的條件
-                    exact_match = Animal.objects.filter(
-                        name__iexact=search_name, # 忽略大小寫
-                        hall=selected_hall,       # 關鍵：限制在所選館別
-                        is_active=True
-                    ).first()
-
+                if name_index is None:
+                    match_status = "error" # 載入索引失敗
+                else:
+                    exact_match, matched_by = name_index.match(search_name)
                     if exact_match:
-                        print(f"    Found exact match: ID {exact_match.id}")
-                        logger.debug(f"Found exact match within hall: ID {exact_match.id} for name '{search_name}'")
+                        logger.debug(f"Found match by {matched_by} within hall: ID {exact_match.id} for name '{search_name}'")
                         match_status = "matched_exact"
                         matched_animal_id = exact_match.id
                         matched_animal_info = {
@@ -152,20 +141,7 @@ def parse_schedule_view(request):
                             'fee': exact_match.fee
                         }
                     else:
-                        # 如果精確匹配失敗，直接標記為 not_found
-                        match_status = "not_found"
-                        print("    No exact match found within the selected hall.")
-                        logger.debug(f"No exact match found for name '{search_name}' within hall '{selected_hall.name}'")
-                        # *** 不再進行別名查詢，也不提供同館其他美容師作為關聯選項 ***
-                        possible_matches = [] # 確保為空
-
-                    # --- *** 所有別名匹配、多重匹配的邏輯已完全移除 *** ---
-
-                except Exception as e:
-                     print(f"!!! Error during matching for name '{search_name}': {e}")
-                     logger.error(f"Error matching name '{search_name}'", exc_info=True)
-                     traceback.print_exc()
-                     match_status = "error" # 標記為錯誤狀態
+                        logger.debug(f"No match found for name '{search_name}' within hall '{selected_hall.name}'")
 
                 # 添加到預覽數據列表
                 preview_data.append({
@@ -173,12 +149,13 @@ def parse_schedule_view(request):
                     'status': match_status,          # 只會是 matched_exact, not_found, 或 error
                     'matched_animal_id': matched_animal_id,
                     'matched_animal_info': matched_animal_info,
+                    'matched_by': matched_by,        # 'name' / 'alias' / None
                     'possible_matches': possible_matches # 永遠是空列表
                 })
 
             print("--- Preview data generated (Exact Match Only) ---")
             logger.info("Preview data generated successfully (Exact Match Only).")
-            return JsonResponse({'preview_data': preview_data})
+            return JsonResponse({'preview_data': preview_data, 'detected_format': detected_format})
 
         # =================================
         # --- 處理儲存 (action == 'save') ---
@@ -210,6 +187,8 @@ def parse_schedule_view(request):
                 print("Entering transaction...")
                 logger.info("Entering transaction for saving schedule.")
                 with transaction.atomic():
+                    # 一次查詢載入該館美容師索引，新增檢查與後續費用更新都在記憶體中完成
+                    name_index = HallAnimalIndex.load(selected_hall)
                     items_to_process_later = []
                     new_animal_temp_map = {}
 
@@ -225,18 +204,14 @@ def parse_schedule_view(request):
                                 logger.warning(f"Skipping add_new at index {index}: No name.")
                                 continue
 
-                            # 嚴格檢查同名+同館是否存在
-                            if Animal.objects.filter(name=new_name, hall=selected_hall, is_active=True).exists():
-                                print(f"    Skipping add: '{new_name}' already exists in hall '{selected_hall.name}'. Attempting to use existing.")
-                                logger.warning(f"Skipping add_new: '{new_name}' already exists in hall '{selected_hall.name}'. Will try to use existing.")
-                                try:
-                                    existing = Animal.objects.get(name=new_name, hall=selected_hall, is_active=True)
-                                    item['animal_id'] = existing.id
-                                    item['operation'] = 'use_existing' # 改為使用現有
-                                    items_to_process_later.append(item)
-                                except Animal.DoesNotExist:
-                                     logger.error(f"Inconsistency: '{new_name}' exists check passed but get() failed.")
-                                     continue
+                            # 檢查同館是否已有同名 (或別名相同) 的美容師，改用現有記錄
+                            existing, matched_by = name_index.match(new_name)
+                            if existing:
+                                print(f"    Skipping add: '{new_name}' already exists in hall '{selected_hall.name}'. Using existing.")
+                                logger.warning(f"Skipping add_new: '{new_name}' already exists (by {matched_by}) in hall '{selected_hall.name}' as ID {existing.id}.")
+                                item['animal_id'] = existing.id
+                                item['operation'] = 'use_existing' # 改為使用現有
+                                items_to_process_later.append(item)
                                 continue
 
                             # 創建新記錄 (alias_suggestion 仍可利用)
@@ -254,6 +229,7 @@ def parse_schedule_view(request):
                                     is_active=True, order=999, aliases=aliases_list
                                 )
                                 animals_created_count += 1
+                                name_index.add(new_animal) # 同一批次中重複的名字會對到這筆
                                 print(f"    Created Animal ID: {new_animal.id} for name '{new_name}'")
                                 logger.info(f"Created Animal ID: {new_animal.id} for name '{new_name}' in hall '{selected_hall.name}'")
                                 item['animal_id'] = new_animal.id
@@ -320,7 +296,11 @@ def parse_schedule_view(request):
                              continue
 
                     # --- 批量更新費用 --- (別名更新邏輯幾乎無用武之地)
-                    animals_to_update = {animal.id: animal for animal in Animal.objects.filter(id__in=list(valid_final_animal_ids))}
+                    animals_to_update = {a_id: name_index.by_id[a_id] for a_id in valid_final_animal_ids if a_id in name_index.by_id}
+                    # 不在索引中的 ID (例如其他館別或已停用) 才另外查詢
+                    missing_ids = valid_final_animal_ids - animals_to_update.keys()
+                    if missing_ids:
+                        animals_to_update.update({animal.id: animal for animal in Animal.objects.filter(id__in=list(missing_ids))})
                     logger.debug(f"Found {len(animals_to_update)} animals for potential fee update.")
 
                     for animal_id, animal_instance in animals_to_update.items():
@@ -342,42 +322,21 @@ def parse_schedule_view(request):
                             except Exception as save_err:
                                 logger.error(f"Error saving updates for Animal ID {animal_id}", exc_info=True)
 
-                    # --- 第三步: 清除舊班表 ---
-                    print(f"Deleting old schedules for hall ID {selected_hall.id}...")
-                    logger.info(f"Deleting old schedules for hall ID {selected_hall.id} ({selected_hall.name})...")
-                    try:
-                        deleted_count, _ = DailySchedule.objects.filter(hall=selected_hall).delete()
-                        print(f"  Deleted {deleted_count} old records.")
-                        logger.info(f"Deleted {deleted_count} old DailySchedule records for hall '{selected_hall.name}'.")
-                    except Exception as del_err:
-                        logger.error(f"Error deleting old schedules for Hall {selected_hall.id}", exc_info=True)
-                        raise
-
-                    # --- 第四步: 批量創建新班表 ---
-                    print("Creating new schedules...")
-                    logger.info("Creating new DailySchedule records...")
-                    schedule_objects = []
+                    # --- 第三步: 與現有班表比對，只寫入有變動的資料列 ---
                     final_valid_set = set(animals_to_update.keys()) # 使用實際獲取到的動物ID
+                    slots_by_animal = {} # animal_id -> 時段 (同一美容師只取第一筆，unique_together: hall + animal)
                     for info in final_schedule_inputs:
-                        if info['animal_id'] in final_valid_set:
-                             schedule_objects.append(
-                                 DailySchedule(
-                                     hall=selected_hall, animal_id=info['animal_id'],
-                                     time_slots=info['slots'] if info['slots'] is not None else ""
-                                 )
-                             )
+                        if info['animal_id'] in slots_by_animal:
+                            logger.warning(f"Skipping duplicate schedule entry for Animal ID {info['animal_id']}.")
+                        elif info['animal_id'] in final_valid_set:
+                            slots_by_animal[info['animal_id']] = info['slots'] if info['slots'] is not None else ""
                         else:
-                             logger.warning(f"Skipping schedule creation for Animal ID {info['animal_id']} as it was not in the final valid set.")
-
-                    if schedule_objects:
-                        try:
-                            DailySchedule.objects.bulk_create(schedule_objects)
-                            schedules_created_count = len(schedule_objects)
-                            print(f"  Successfully created {schedules_created_count} new schedule records.")
-                            logger.info(f"Bulk created {schedules_created_count} new DailySchedule records for hall '{selected_hall.name}'.")
-                        except Exception as bulk_err:
-                            logger.error("Error bulk creating DailySchedule records", exc_info=True)
-                            raise
+                            logger.warning(f"Skipping schedule creation for Animal ID {info['animal_id']} as it was not in the final valid set.")
+
+                    schedule_diff = DailySchedule.sync_hall(selected_hall, slots_by_animal)
+                    schedules_created_count = len(slots_by_animal)
+                    print(f"  Schedule diff for hall '{selected_hall.name}': {schedule_diff!r}")
+                    logger.info(f"Synced DailySchedule for hall '{selected_hall.name}': {schedule_diff!r}")
 
                 # --- 事務成功提交 ---
                 print("Transaction committed successfully.")
@@ -385,7 +344,10 @@ def parse_schedule_view(request):
                 # 更新返回消息，移除別名更新計數
                 return JsonResponse({
                     'success': True,
-                    'message': f'班表已儲存。新增美容師: {animals_created_count}, 更新費用: {updated_fee_count_actual}, 總計更新班表: {schedules_created_count} 筆。'
+                    'detected_format': detected_format,
+                    'diff': schedule_diff.as_dict(),
+                    'message': f'班表已儲存。新增美容師: {animals_created_count}, 更新費用: {updated_fee_count_actual}, 總計班表: {schedules_created_count} 筆 '
+                               f'(新增 {len(schedule_diff.created)}、變更 {len(schedule_diff.updated)}、移除 {len(schedule_diff.deleted)})。'
                 })
 
             except Exception as e:
@@ -402,4 +364,38 @@ def parse_schedule_view(request):
         logger.warning(f"Unsupported HTTP method '{request.method}' received for parse_schedule_view.")
         return HttpResponseBadRequest("不支持的請求方法")
 
+# ==================================
+# --- 多館別批次匯入 (上傳 zip / tar 壓縮檔) ---
+# ==================================
+# 網頁請求在多執行緒的伺服器中處理：fork 會複製其他執行緒持有的鎖，改用 spawn 並只開少數幾個解析行程
+BULK_IMPORT_VIEW_WORKERS = 2
+
+@staff_member_required
+@require_POST
+def bulk_import_view(request):
+    """
+    上傳含多個館別班表 (*.txt) 的壓縮檔，一次匯入所有館別的今日班表。
+    與 import_schedules 指令共用 bulk_import 模組；回傳每館的統計報告。
+    """
+    archive = request.FILES.get('archive')
+    if not archive: return JsonResponse({'error': '請上傳班表壓縮檔 (archive)'}, status=400)
+    flag = lambda name: request.POST.get(name) in ('1', 'true', 'on')
+    format_override = request.POST.get('format_type') or None
+    if format_override and format_override != 'auto' and not get_format(format_override):
+        return JsonResponse({'error': f'未知的班表格式: {format_override}'}, status=400)
+    try:
+        files = read_archive(archive, name=archive.name)
+        report = run_bulk_import(
+            files, workers=BULK_IMPORT_VIEW_WORKERS, mp_context=multiprocessing.get_context('spawn'),
+            create_missing=flag('create_missing'), update_fee=flag('update_fee'),
+            dry_run=flag('dry_run'), format_override=format_override,
+        )
+    except BulkImportError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except Exception as e:
+        logger.error("Error during bulk schedule import", exc_info=True)
+        return JsonResponse({'error': f'批次匯入時發生錯誤: {e}'}, status=500)
+    logger.info(f"Bulk schedule import by {request.user}: {report['totals']}")
+    return JsonResponse(report, status=200 if report['halls'] or not report['errors'] else 400)
+
 # --- views.py 文件結束 ---
\ No newline at end of file